@@ -0,0 +1,198 @@
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+from financial_utils import (
+    get_analyst_ratings,
+    get_current_prices,
+    get_final_analysis,
+    get_industry_analysis,
+    get_sentiment_analysis,
+    get_stock_data,
+)
+
+
+class StageError(Exception):
+    """某个分析阶段失败，记录失败的阶段名称和原始异常。"""
+
+    def __init__(self, ticker, stage, error):
+        super().__init__(f"{ticker}: {stage} failed: {error!r}")
+        self.ticker = ticker
+        self.stage = stage
+        self.error = error
+
+
+class AnalysisPipeline:
+    """
+    并发执行 main.py 的逐股票分析流程。
+
+    每个股票的阶段依赖关系::
+
+        get_stock_data ──> get_sentiment_analysis ─┐
+        get_analyst_ratings ───────────────────────┼──> get_final_analysis
+        get_industry_analysis ─────────────────────┘
+
+    所有股票分析完成后，用一次批量请求（get_current_prices）获取当前价格。
+    没有依赖关系的阶段同时执行，多个股票也同时分析。所有网络请求都在同一个
+    线程池中执行，``max_requests`` 限制同时进行的请求数；``max_tickers`` 限制
+    同时处于分析中的股票数。
+
+    Args:
+        years (int): 历史数据的年数。
+        max_tickers (int): 同时分析的股票数量。
+        max_requests (int): 同时进行的网络/LLM 请求数量。
+        checkpoint (RunCheckpoint): 可选，保存每个阶段的结果；已完成的阶段
+            直接读取检查点，不再重新执行。
+    """
+
+    def __init__(self, years=1, max_tickers=4, max_requests=8, checkpoint=None):
+        self.years = years
+        self.max_tickers = max_tickers
+        self.max_requests = max_requests
+        self.checkpoint = checkpoint
+
+    def _stage(self, pool, ticker, stage, func, *args, required=False):
+        # required=True 用于 LLM 阶段：ask_AI 失败时返回 None 而不是抛出异常
+        if self.checkpoint is not None:
+            future = pool.submit(self.checkpoint.call, ticker, stage, func, *args)
+        else:
+            future = pool.submit(func, *args)
+
+        def result():
+            try:
+                value = future.result()
+            except Exception as e:
+                raise StageError(ticker, stage, e) from e
+            if required and value is None:
+                raise StageError(ticker, stage, ValueError("LLM request returned no result"))
+            return value
+
+        return result
+
+    def analyze_ticker(self, pool, ticker):
+        """分析单个股票，返回包含各阶段结果的字典。任一必需阶段失败时抛出 StageError。"""
+        started = time.perf_counter()
+        stock_data = self._stage(
+            pool, ticker, "get_stock_data", get_stock_data, ticker, self.years
+        )
+        analyst_ratings = self._stage(
+            pool, ticker, "get_analyst_ratings", get_analyst_ratings, ticker
+        )
+        industry_analysis = self._stage(
+            pool,
+            ticker,
+            "get_industry_analysis",
+            get_industry_analysis,
+            ticker,
+            required=True,
+        )
+
+        hist_data, balance_sheet, financials, news = stock_data()
+        sentiment_analysis = self._stage(
+            pool,
+            ticker,
+            "get_sentiment_analysis",
+            get_sentiment_analysis,
+            ticker,
+            news,
+            required=True,
+        )()
+        final_analysis = self._stage(
+            pool,
+            ticker,
+            "get_final_analysis",
+            get_final_analysis,
+            ticker,
+            {},
+            sentiment_analysis,
+            analyst_ratings(),
+            industry_analysis(),
+            required=True,
+        )()
+
+        result = {
+            "ticker": ticker,
+            "hist_data": hist_data,
+            "balance_sheet": balance_sheet,
+            "financials": financials,
+            "news": news,
+            "sentiment_analysis": sentiment_analysis,
+            "final_analysis": final_analysis,
+            "price": None,
+            "errors": {},
+        }
+        result["seconds"] = time.perf_counter() - started
+        return result
+
+    def _prices(self, tickers):
+        # 有检查点的价格直接读取，其余的用一次批量请求获取
+        if self.checkpoint is None:
+            return get_current_prices(tickers)
+        prices = {
+            ticker: self.checkpoint.load(ticker, "price")
+            for ticker in tickers
+            if self.checkpoint.has(ticker, "price")
+        }
+        missing = [ticker for ticker in tickers if ticker not in prices]
+        if missing:
+            fetched = get_current_prices(missing)
+            for ticker, price in fetched.items():
+                self.checkpoint.save(ticker, "price", price)
+            prices.update(fetched)
+        return prices
+
+    def run(self, tickers):
+        """
+        并发分析所有股票。
+
+        Returns:
+            dict: analyses（{ticker: 最终分析}，供 rank_companies 使用）、
+            prices（{ticker: 当前价格}）、results（每个股票的完整结果）、
+            failures（{ticker: StageError}）。
+        """
+        analyses, prices, results, failures = {}, {}, {}, {}
+        with ThreadPoolExecutor(
+            self.max_requests, thread_name_prefix="stage"
+        ) as stage_pool, ThreadPoolExecutor(
+            self.max_tickers, thread_name_prefix="ticker"
+        ) as ticker_pool:
+            futures = {
+                ticker: ticker_pool.submit(self.analyze_ticker, stage_pool, ticker)
+                for ticker in tickers
+            }
+            for ticker, future in futures.items():
+                try:
+                    result = future.result()
+                except StageError as e:
+                    failures[ticker] = e
+                    continue
+                except Exception as e:
+                    # 不应该发生：analyze_ticker 自身的错误也按失败记录，不丢弃
+                    traceback.print_exc()
+                    failures[ticker] = StageError(ticker, "analyze_ticker", e)
+                    continue
+                results[ticker] = result
+                analyses[ticker] = result["final_analysis"]
+
+        # 当前价格只用于排名展示，获取失败时记录错误但保留分析结果
+        if results:
+            try:
+                prices = self._prices(list(results))
+            except Exception as e:
+                prices = {}
+                for result in results.values():
+                    result["errors"]["get_current_prices"] = e
+        for ticker, result in results.items():
+            result["price"] = prices.get(ticker)
+            if result["price"] is None and not result["errors"]:
+                result["errors"]["get_current_prices"] = ValueError(
+                    f"No price data available for {ticker}"
+                )
+            for stage, error in result["errors"].items():
+                print(f"{ticker}: {stage} failed: {error!r}")
+        return {
+            "analyses": analyses,
+            "prices": prices,
+            "results": results,
+            "failures": failures,
+        }
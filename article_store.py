@@ -0,0 +1,197 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+import requests
+from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+
+import metrics
+
+ARTICLE_ERROR_TEXT = "Error retrieving article text."
+
+
+def extract_article_text(content):
+    soup = BeautifulSoup(content, "html.parser")
+    return " ".join([p.get_text() for p in soup.find_all("p")])
+
+
+class ArticleStore:
+    """
+    已抽取正文的磁盘存储，每篇文章一个 JSON 文件（文件名是 URL 的哈希）。
+
+    除了正文，还保存 ETag / Last-Modified，用于下次的条件请求。
+    """
+
+    def __init__(self, root="article_cache"):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, url):
+        digest = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        return os.path.join(self.root, digest + ".json")
+
+    def load(self, url):
+        try:
+            with open(self._path(url), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def save(self, url, text, etag=None, last_modified=None):
+        record = {
+            "url": url,
+            "text": text,
+            "etag": etag,
+            "last_modified": last_modified,
+            "checked": time.time(),
+        }
+        path = self._path(url)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(record, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+        return record
+
+
+class ArticleFetcher:
+    """
+    并发、去重的文章下载器。
+
+    - 同一个 URL 在一次运行中只下载、解析一次，并发请求同一个 URL 会共享同一个结果；
+    - 所有下载在线程池中并发执行，同一个网站同时最多 ``per_host`` 个请求，每个请求有超时；
+    - 正文保存在 ArticleStore 中，``revalidate_after`` 秒内直接使用；过期后带上
+      If-None-Match / If-Modified-Since 发送条件请求，服务器返回 304 时不再重新解析。
+
+    Args:
+        store (ArticleStore): 磁盘存储。
+        max_workers (int): 同时进行的下载数。
+        per_host (int): 每个网站同时进行的下载数。
+        timeout (float): 每个请求的超时时间（秒）。
+        revalidate_after (float): 已保存的正文多久之后需要重新验证（秒）。
+    """
+
+    def __init__(
+        self,
+        store=None,
+        max_workers=16,
+        per_host=2,
+        timeout=10,
+        revalidate_after=3600,
+    ):
+        self.store = store or ArticleStore()
+        self.per_host = per_host
+        self.timeout = timeout
+        self.revalidate_after = revalidate_after
+        self._pool = ThreadPoolExecutor(max_workers, thread_name_prefix="article")
+        self._session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=max_workers, pool_maxsize=per_host
+        )
+        self._session.mount("https://", adapter)
+        self._session.mount("http://", adapter)
+        self._lock = threading.Lock()
+        self._futures = {}
+        self._host_limits = {}
+
+    def _host_limit(self, url):
+        host = urlsplit(url).netloc
+        with self._lock:
+            if host not in self._host_limits:
+                self._host_limits[host] = threading.Semaphore(self.per_host)
+            return self._host_limits[host]
+
+    def _download(self, url):
+        record = self.store.load(url)
+        if record and time.time() - record["checked"] < self.revalidate_after:
+            metrics.count("article_fetch_total", result="cached")
+            return record["text"]
+        with metrics.span("article_fetch"):
+            return self._revalidate(url, record)
+
+    def _revalidate(self, url, record):
+        headers = {}
+        if record:
+            if record.get("etag"):
+                headers["If-None-Match"] = record["etag"]
+            if record.get("last_modified"):
+                headers["If-Modified-Since"] = record["last_modified"]
+        try:
+            with self._host_limit(url):
+                response = self._session.get(url, headers=headers, timeout=self.timeout)
+        except requests.exceptions.RequestException:
+            # 网络失败时退回到已保存的正文
+            metrics.count("article_fetch_total", result="error")
+            return record["text"] if record else ARTICLE_ERROR_TEXT
+
+        metrics.count("article_bytes_total", len(response.content))
+        if response.status_code == 304 and record:
+            metrics.count("article_fetch_total", result="not_modified")
+            self.store.save(
+                url, record["text"], record.get("etag"), record.get("last_modified")
+            )
+            return record["text"]
+        if not response.ok:
+            metrics.count("article_fetch_total", result="error")
+            return record["text"] if record else ARTICLE_ERROR_TEXT
+        try:
+            text = extract_article_text(response.content)
+        except Exception:
+            metrics.count("article_fetch_total", result="error")
+            return ARTICLE_ERROR_TEXT
+        metrics.count("article_fetch_total", result="downloaded")
+        self.store.save(
+            url,
+            text,
+            response.headers.get("ETag"),
+            response.headers.get("Last-Modified"),
+        )
+        return text
+
+    def submit(self, url):
+        """
+        返回该 URL 的 Future；同一个 URL 正在下载时不会重复提交。
+
+        下载完成后从表中移除，之后再请求同一个 URL 由磁盘上的 ArticleStore 返回。
+        """
+        with self._lock:
+            future = self._futures.get(url)
+            if future is not None:
+                return future
+            future = self._pool.submit(self._download, url)
+            self._futures[url] = future
+        # 在锁外注册：已经完成的 Future 会立即在当前线程调用回调
+        future.add_done_callback(lambda done: self._forget(url, done))
+        return future
+
+    def _forget(self, url, future):
+        with self._lock:
+            if self._futures.get(url) is future:
+                del self._futures[url]
+
+    def fetch(self, url):
+        return self.submit(url).result()
+
+    def fetch_many(self, urls):
+        """并发下载一组 URL，返回 {url: 正文}。"""
+        futures = {url: self.submit(url) for url in dict.fromkeys(urls)}
+        return {url: future.result() for url, future in futures.items()}
+
+
+_default_fetcher = None
+_default_fetcher_lock = threading.Lock()
+
+
+def get_article_fetcher():
+    """进程内共享的下载器，存储目录可用环境变量 ARTICLE_CACHE_DIR 指定。"""
+    global _default_fetcher
+    if _default_fetcher is None:
+        with _default_fetcher_lock:
+            if _default_fetcher is None:
+                store = ArticleStore(os.getenv("ARTICLE_CACHE_DIR", "article_cache"))
+                _default_fetcher = ArticleFetcher(store)
+    return _default_fetcher
@@ -1,59 +1,455 @@
+import asyncio
+import json
 import os
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
 import requests
 from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+
+import metrics
+from llm_cache import completion_key, get_llm_cache
+from prompt_builder import estimate_tokens
+from rate_limiter import get_rate_limiter
 
 load_dotenv()
 
+# 需要重试的状态码：限流和服务端临时错误
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
 
-def ask_AI(
-    system_prompt,
-    messages,
-    max_tokens=2000,
-    temperature=0.5,
-):
-    # 从环境变量读取 API 密钥和请求地址
-    api_key = os.getenv("API_KEY")
-    api_url = os.getenv("API_URL", "https://api.openai.com/v1/chat/completions")
-    api_model = os.getenv("API_MODEL", "gpt-4")
+_config = None
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_config():
+    """读取一次 API 配置（环境变量），之后的调用复用同一份配置。"""
+    global _config
+    if _config is None:
+        _config = {
+            "api_key": os.getenv("API_KEY"),
+            "api_url": os.getenv(
+                "API_URL", "https://api.openai.com/v1/chat/completions"
+            ),
+            "api_model": os.getenv("API_MODEL", "gpt-4"),
+            # (连接超时, 读取超时)，单位秒
+            "timeout": (
+                float(os.getenv("API_CONNECT_TIMEOUT", "10")),
+                float(os.getenv("API_READ_TIMEOUT", "300")),
+            ),
+            "max_retries": int(os.getenv("API_MAX_RETRIES", "5")),
+            "pool_size": int(os.getenv("API_POOL_SIZE", "16")),
+        }
+    return _config
+
+
+def get_session():
+    """共享的 requests.Session，复用 keep-alive 连接，可在多个线程中同时使用。"""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                pool_size = get_config()["pool_size"]
+                session = requests.Session()
+                # pool_block=True：连接数达到上限时等待空闲连接，而不是临时新建再丢弃
+                adapter = HTTPAdapter(
+                    pool_connections=pool_size, pool_maxsize=pool_size, pool_block=True
+                )
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _session = session
+    return _session
+
+
+def _retry_after_seconds(response):
+    # Retry-After 可以是秒数，也可以是 HTTP 日期
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+def _backoff_seconds(attempt, base=1.0, cap=60.0):
+    # 指数退避加随机抖动，避免多个请求同时重试
+    return min(cap, base * 2**attempt) * random.uniform(0.5, 1.0)
 
+
+def post_with_retry(url, headers, data, timeout=None, max_retries=None, **kwargs):
+    """
+    用共享连接池发送 POST 请求，遇到 429/5xx 或网络错误时按指数退避重试。
+
+    服务器返回 Retry-After 时按它的要求等待。重试次数用完后返回最后一次的响应
+    （或抛出最后一次的网络异常）。
+    """
+    config = get_config()
+    timeout = timeout or config["timeout"]
+    max_retries = config["max_retries"] if max_retries is None else max_retries
+    session = get_session()
+
+    for attempt in range(max_retries + 1):
+        try:
+            response = session.post(
+                url, headers=headers, json=data, timeout=timeout, **kwargs
+            )
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+            if attempt == max_retries:
+                raise
+            delay = _backoff_seconds(attempt)
+            print(f"HTTP request failed ({e}), retrying in {delay:.1f}s")
+            time.sleep(delay)
+            continue
+
+        if response.status_code not in RETRY_STATUS_CODES or attempt == max_retries:
+            return response
+        delay = _retry_after_seconds(response)
+        if delay is None:
+            delay = _backoff_seconds(attempt)
+        print(f"HTTP {response.status_code}, retrying in {delay:.1f}s")
+        response.close()
+        time.sleep(delay)
+
+
+def _record_usage(model, usage):
+    # 记录接口返回的 token 用量
+    if not usage:
+        return
+    for kind in ("prompt_tokens", "completion_tokens"):
+        if usage.get(kind):
+            metrics.count(f"llm_{kind}_total", usage[kind], model=model)
+
+
+def _reserve_rate_limit(model, system_prompt, messages, max_tokens):
+    """
+    在发送请求前按 RPM/TPM 限额排队（见 rate_limiter.py），返回预留的 token 数。
+
+    token 数按提示词长度估算，再加上 max_tokens（回复最多这么长）。
+    """
+    limiter = get_rate_limiter()
+    if limiter is None:
+        return 0
+    tokens = estimate_tokens(system_prompt) + estimate_tokens(messages) + max_tokens
+    return limiter.acquire(model, tokens)
+
+
+def _settle_rate_limit(model, reserved, usage):
+    # 按接口返回的实际用量退还多预留的 token
+    limiter = get_rate_limiter()
+    if limiter is not None and reserved and usage and usage.get("total_tokens"):
+        limiter.settle(model, reserved, usage["total_tokens"])
+
+
+def _build_request(system_prompt, messages, max_tokens, temperature, model, stream):
+    api_key = get_config()["api_key"]
     if not api_key:
-        raise ValueError(
-            "API key not found. Please set the ANTHROPIC_API_KEY environment variable."
-        )
+        raise ValueError("API key not found. Please set the API_KEY environment variable.")
 
     headers = {
         "Authorization": "Bearer " + api_key,
         "Content-Type": "application/json",
     }
     data = {
-        "model": api_model,
+        "model": model,
         "max_tokens": max_tokens,
         "temperature": temperature,
         "messages": [
             {"role": "system", "content": system_prompt},
             {"role": "user", "content": messages},
         ],
-        "stream": False,
+        "stream": stream,
     }
+    if stream:
+        # 让服务在最后一个事件中返回 usage，用于按实际用量结算限速额度
+        data["stream_options"] = {"include_usage": True}
+    return headers, data
+
+
+def ask_AI(
+    system_prompt,
+    messages,
+    max_tokens=2000,
+    temperature=0.5,
+    model=None,
+    use_cache=True,
+    cache_ttl=None,
+    on_token=None,
+):
+    """
+    调用 OpenAI 兼容的 chat completions 接口，返回回复文本，失败时返回 None。
+
+    相同的 (model, system_prompt, messages, temperature, max_tokens) 会命中本地缓存
+    （见 llm_cache.py）。``use_cache=False`` 跳过缓存强制重新请求，
+    ``cache_ttl`` 可以为这次调用指定更短或更长的有效期（秒）。
+    传入 ``on_token`` 时以流式方式请求，每收到一段文本就调用 ``on_token(text)``，
+    最后仍然返回完整的回复。
+    """
+    if on_token is not None:
+        stream = ask_AI_stream(
+            system_prompt, messages, max_tokens, temperature, model, use_cache, cache_ttl
+        )
+        for token in stream:
+            on_token(token)
+        return stream.text
+
+    config = get_config()
+    model = model or config["api_model"]
+
+    cache = get_llm_cache() if use_cache else None
+    if cache is not None:
+        cache_key = completion_key(
+            model, system_prompt, messages, temperature, max_tokens
+        )
+        cached = cache.get(cache_key, ttl=cache_ttl)
+        if cached is not None:
+            metrics.count("llm_cache_hits_total", model=model)
+            return cached
+
+    headers, data = _build_request(
+        system_prompt, messages, max_tokens, temperature, model, stream=False
+    )
+    reserved = _reserve_rate_limit(model, system_prompt, messages, max_tokens)
+    prompt_tokens = estimate_tokens(system_prompt) + estimate_tokens(messages)
     try:
-        response = requests.post(api_url, headers=headers, json=data)
+        with metrics.span("llm_request", model=model, stream=False):
+            response = post_with_retry(config["api_url"], headers, data)
     except requests.exceptions.RequestException as e:
         print(f"HTTP request failed: {e}")
+        _settle_rate_limit(model, reserved, {"total_tokens": prompt_tokens})
         return None
     try:
         response_json = response.json()
-        print("response_json", response_json)
     except ValueError:
         print("Failed to parse JSON response")
         print("Response content:", response.text)
+        _settle_rate_limit(model, reserved, {"total_tokens": prompt_tokens})
         return None
 
     if "choices" not in response_json or len(response_json["choices"]) == 0:
         print("Unexpected API response format")
         print("Response JSON:", response_json)
+        _settle_rate_limit(model, reserved, {"total_tokens": prompt_tokens})
         return None
 
-    return response_json["choices"][0]["message"]["content"]
+    _record_usage(model, response_json.get("usage"))
+    _settle_rate_limit(model, reserved, response_json.get("usage"))
+    content = response_json["choices"][0]["message"]["content"]
+    if cache is not None and content is not None:
+        cache.put(cache_key, content)
+    return content
+
+
+class CompletionStream:
+    """
+    流式回复：迭代时按到达顺序产出文本片段，迭代结束后 ``text`` 是完整回复。
+
+    请求失败或返回格式不对时不产出任何片段，``text`` 为 None；读到一半网络中断时
+    停止迭代，``text`` 同样为 None（已经产出的片段不会被缓存）。
+
+    流结束（读完、出错或 ``close``）时按实际用量结算限速器预留的 token：
+    服务返回了 ``usage`` 就用它，否则按提示词和已收到的文本估算。
+    """
+
+    def __init__(
+        self,
+        response=None,
+        text=None,
+        on_complete=None,
+        model=None,
+        reserved=0,
+        prompt_tokens=0,
+    ):
+        self._response = response
+        self._on_complete = on_complete
+        self._model = model
+        self._reserved = reserved
+        self._prompt_tokens = prompt_tokens
+        self.usage = None
+        self.text = text
+        self._consumed = response is None
+
+    def __iter__(self):
+        if self._consumed:
+            # 缓存命中（或已经读完）：一次性产出完整文本
+            if self.text:
+                yield self.text
+            return
+        self._consumed = True
+        chunks = []
+        started = time.perf_counter()
+        try:
+            for token in self._iter_tokens():
+                chunks.append(token)
+                yield token
+        except requests.exceptions.RequestException as e:
+            # 包括 ChunkedEncodingError：与非流式请求失败一样返回 None
+            print(f"Stream interrupted: {e}")
+            return
+        finally:
+            self._response.close()
+            self._settle("".join(chunks))
+            metrics.observe(
+                "llm_stream_seconds", time.perf_counter() - started, model=self._model
+            )
+        self.text = "".join(chunks)
+        if self._on_complete is not None:
+            self._on_complete(self.text)
+
+    def _iter_tokens(self):
+        # Server-Sent Events：每个事件是一行 "data: {json}"，以 "data: [DONE]" 结束。
+        # 按字节读取再用 UTF-8 解码：text/event-stream 没有 charset 时 requests
+        # 会按 ISO-8859-1 解码，中文等非 ASCII 文本会变成乱码
+        for raw_line in self._response.iter_lines():
+            line = raw_line.decode("utf-8")
+            if not line or not line.startswith("data:"):
+                continue
+            payload = line[len("data:") :].strip()
+            if payload == "[DONE]":
+                break
+            try:
+                chunk = json.loads(payload)
+            except ValueError:
+                print("Failed to parse stream chunk:", payload)
+                continue
+            # 请求了 include_usage 时，服务在最后一个事件中附带 usage
+            if chunk.get("usage"):
+                self.usage = chunk["usage"]
+            _record_usage(self._model, chunk.get("usage"))
+            choices = chunk.get("choices") or []
+            if not choices:
+                continue
+            content = (choices[0].get("delta") or {}).get("content")
+            if content:
+                yield content
+
+    def _settle(self, received):
+        if not self._reserved:
+            return
+        usage = self.usage or {
+            "total_tokens": self._prompt_tokens + estimate_tokens(received)
+        }
+        _settle_rate_limit(self._model, self._reserved, usage)
+        self._reserved = 0
+
+    def close(self):
+        """不再读取时关闭连接并结算限速额度（已经读完时什么也不做）。"""
+        if self._consumed:
+            return
+        self._consumed = True
+        self._response.close()
+        self._settle("")
+
+    def read(self):
+        """读完整个流并返回完整回复。"""
+        for _ in self:
+            pass
+        return self.text
+
+
+def ask_AI_stream(
+    system_prompt,
+    messages,
+    max_tokens=2000,
+    temperature=0.5,
+    model=None,
+    use_cache=True,
+    cache_ttl=None,
+):
+    """
+    以流式方式调用 ``ask_AI``，返回 CompletionStream。
+
+    用法::
+
+        stream = ask_AI_stream(system_prompt, messages)
+        for token in stream:
+            print(token, end="", flush=True)
+        full_text = stream.text
+    """
+    config = get_config()
+    model = model or config["api_model"]
+
+    cache = get_llm_cache() if use_cache else None
+    on_complete = None
+    if cache is not None:
+        cache_key = completion_key(
+            model, system_prompt, messages, temperature, max_tokens
+        )
+        cached = cache.get(cache_key, ttl=cache_ttl)
+        if cached is not None:
+            metrics.count("llm_cache_hits_total", model=model)
+            return CompletionStream(text=cached)
+
+        def on_complete(text):
+            if text:
+                cache.put(cache_key, text)
+
+    headers, data = _build_request(
+        system_prompt, messages, max_tokens, temperature, model, stream=True
+    )
+    reserved = _reserve_rate_limit(model, system_prompt, messages, max_tokens)
+    prompt_tokens = estimate_tokens(system_prompt) + estimate_tokens(messages)
+    try:
+        # 流式请求的 span 只到收到响应头为止，读取正文的时间记在 llm_stream_seconds
+        with metrics.span("llm_request", model=model, stream=True):
+            response = post_with_retry(config["api_url"], headers, data, stream=True)
+    except requests.exceptions.RequestException as e:
+        print(f"HTTP request failed: {e}")
+        _settle_rate_limit(model, reserved, {"total_tokens": prompt_tokens})
+        return CompletionStream()
+    if not response.ok:
+        print(f"HTTP {response.status_code}")
+        print("Response content:", response.text)
+        response.close()
+        _settle_rate_limit(model, reserved, {"total_tokens": prompt_tokens})
+        return CompletionStream()
+    return CompletionStream(
+        response,
+        on_complete=on_complete,
+        model=model,
+        reserved=reserved,
+        prompt_tokens=prompt_tokens,
+    )
+
+
+async def ask_AI_async(
+    system_prompt,
+    messages,
+    max_tokens=2000,
+    temperature=0.5,
+    model=None,
+    use_cache=True,
+    cache_ttl=None,
+    on_token=None,
+):
+    """
+    ``ask_AI`` 的异步版本，参数相同。
+
+    请求在线程中执行并复用同一个连接池，多个协程可以同时发起请求；
+    并发数超过连接池大小（API_POOL_SIZE）时会排队等待空闲连接。
+    """
+    return await asyncio.to_thread(
+        ask_AI,
+        system_prompt,
+        messages,
+        max_tokens,
+        temperature,
+        model,
+        use_cache,
+        cache_ttl,
+        on_token,
+    )
 
 
 # 示例用法
@@ -0,0 +1,98 @@
+import sys
+
+import numpy as np
+
+from indicator_utils import (
+    SIGNAL_CODES,
+    add_indicators,
+    generate_signal_codes,
+    leverage_suggestion,
+)
+
+
+def run_backtest(data, principal=10, risk_ratio=0.1, fee_rate=0.0, codes=None):
+    """
+    向量化回测：按每根K线的信号调整仓位，计算收益、回撤和交易次数。
+
+    规则与实盘循环一致：buy 开多、sell 开空，杠杆取自 ``leverage_suggestion``；
+    hold 保持上一根K线的仓位。信号在当根收盘价成交，仓位承担下一根K线的涨跌。
+    权益跌到 0 视为爆仓，之后保持为 0。
+
+    Args:
+        data (pd.DataFrame): 至少包含 'close'、'MA'、'MACD'、'Signal' 列（见 ``add_indicators``）。
+        principal (float): 本金。
+        risk_ratio (float): 传给 ``leverage_suggestion`` 的风险比例。
+        fee_rate (float): 按名义仓位变化收取的手续费率，例如 0.0004。
+        codes (np.ndarray): 预先计算好的信号编码，默认由 ``generate_signal_codes`` 计算。
+
+    Returns:
+        dict: final_equity、pnl、return、max_drawdown、trades、bars 以及权益曲线 equity。
+    """
+    close = np.asarray(data["close"], dtype=np.float64)
+    if codes is None:
+        codes = generate_signal_codes(data)
+
+    long_leverage = leverage_suggestion(principal, "buy", risk_ratio)
+    short_leverage = leverage_suggestion(principal, "sell", risk_ratio)
+    targets = np.where(
+        codes == SIGNAL_CODES["buy"],
+        long_leverage,
+        np.where(codes == SIGNAL_CODES["sell"], -short_leverage, 0.0),
+    )
+
+    # hold 沿用最近一次 buy/sell 的仓位：向前填充最近一个非 hold 信号的位置
+    last_signal = np.where(codes != SIGNAL_CODES["hold"], np.arange(len(codes)), 0)
+    np.maximum.accumulate(last_signal, out=last_signal)
+    position = np.where(
+        codes[last_signal] != SIGNAL_CODES["hold"], targets[last_signal], 0.0
+    )
+
+    returns = np.zeros(len(close))
+    returns[1:] = close[1:] / close[:-1] - 1
+    position_change = np.abs(np.diff(position, prepend=0.0))
+
+    # 第 t 根K线的收益由第 t-1 根收盘时的仓位承担
+    growth = np.ones(len(close))
+    growth[1:] = 1 + position[:-1] * returns[1:]
+    growth -= position_change * fee_rate
+    np.maximum(growth, 0.0, out=growth)
+    equity = principal * np.cumprod(growth)
+
+    peak = np.maximum.accumulate(equity)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        drawdown = np.where(peak > 0, 1 - equity / peak, 0.0)
+
+    final_equity = float(equity[-1]) if len(equity) else float(principal)
+    return {
+        "final_equity": final_equity,
+        "pnl": final_equity - principal,
+        "return": final_equity / principal - 1,
+        "max_drawdown": float(drawdown.max()) if len(drawdown) else 0.0,
+        "trades": int(np.count_nonzero(position_change)),
+        "bars": len(close),
+        "equity": equity,
+    }
+
+
+# 示例用法：python backtest.py BTC/USDT 1m 2024-01-01
+# K线来自本地缓存（candle_store），缺失的部分会先从交易所回补
+if __name__ == "__main__":
+    import time
+
+    import ccxt
+
+    from candle_store import backfill_crypto_data
+
+    ticker = sys.argv[1] if len(sys.argv) > 1 else "BTC/USDT"
+    timeframe = sys.argv[2] if len(sys.argv) > 2 else "1m"
+    start = sys.argv[3] if len(sys.argv) > 3 else "2024-01-01"
+
+    crypto_data = backfill_crypto_data(ccxt.binance(), ticker, timeframe, start)
+    started = time.perf_counter()
+    result = run_backtest(add_indicators(crypto_data))
+    elapsed = time.perf_counter() - started
+
+    result.pop("equity")
+    print(f"Backtest of {ticker} {timeframe} ({result['bars']} bars, {elapsed:.2f}s):")
+    for key, value in result.items():
+        print(f"  {key}: {value}")
@@ -0,0 +1,300 @@
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from analysis_pipeline import StageError
+from ask_AI import ask_AI
+from financial_utils import (
+    get_analyst_ratings,
+    get_article_texts,
+    get_current_prices,
+    get_stock_data,
+)
+from prompt_builder import DEFAULT_PROMPT_TOKENS, PromptBuilder
+from ticker_data import get_ticker_data
+
+# 每个批次包含的股票数（1 表示不合并，main.py 使用逐股票的 AnalysisPipeline），
+# 以及每个股票在回复中可以使用的 token 数
+DEFAULT_BATCH_SIZE = int(os.getenv("ANALYSIS_BATCH_SIZE", "1"))
+TOKENS_PER_ITEM = int(os.getenv("ANALYSIS_BATCH_ITEM_TOKENS", "700"))
+
+_BATCH_INSTRUCTIONS = (
+    "Analyze each of the {count} items below independently. Respond with nothing "
+    "but a single JSON object whose keys are exactly these item keys: {keys}. "
+    "Each value must be a string containing the full analysis for that item."
+)
+
+
+def parse_batch_response(text, keys):
+    """
+    从回复中解析 JSON 对象，返回 {key: 分析文本}。
+
+    只保留要求的键，并且值必须是非空字符串；缺失或格式不对的键不出现在结果中，
+    由调用方重试。回复外面包着 ```json 代码块或多余文字时也能解析。
+    """
+    if not text:
+        return {}
+    start, end = text.find("{"), text.rfind("}")
+    if start < 0 or end < start:
+        return {}
+    try:
+        data = json.loads(text[start : end + 1])
+    except ValueError:
+        return {}
+    if not isinstance(data, dict):
+        return {}
+    return {
+        key: value.strip()
+        for key, value in data.items()
+        if key in keys and isinstance(value, str) and value.strip()
+    }
+
+
+def ask_AI_batch(
+    system_prompt,
+    items,
+    batch_size=DEFAULT_BATCH_SIZE,
+    tokens_per_item=TOKENS_PER_ITEM,
+    max_attempts=3,
+    max_workers=4,
+):
+    """
+    把多个独立的请求合并成少数几次 LLM 调用。
+
+    ``items`` 是 {key: 该项的提示词}。每批最多 ``batch_size`` 项，要求模型返回
+    以 key 为键的 JSON 对象；解析失败或缺失的项单独组成新的批次重试（不使用缓存），
+    最多 ``max_attempts`` 轮。多个批次并发请求。
+
+    Returns:
+        dict: {key: 分析文本}，重试后仍然失败的项为 None。
+    """
+    results = {}
+    pending = list(items)
+    for attempt in range(max_attempts):
+        if not pending:
+            break
+        batches = [pending[i : i + batch_size] for i in range(0, len(pending), batch_size)]
+
+        def run(keys):
+            sections = "\n\n".join(f"=== {key} ===\n{items[key]}" for key in keys)
+            instructions = _BATCH_INSTRUCTIONS.format(
+                count=len(keys), keys=json.dumps(keys)
+            )
+            response_text = ask_AI(
+                system_prompt,
+                f"{instructions}\n\n{sections}\n\n----\n\n{instructions}",
+                max_tokens=tokens_per_item * len(keys),
+                # 重试时跳过缓存，否则会拿到同一个解析失败的回复
+                use_cache=attempt == 0,
+            )
+            return parse_batch_response(response_text, keys)
+
+        with ThreadPoolExecutor(max_workers, thread_name_prefix="batch") as pool:
+            for parsed in pool.map(run, batches):
+                results.update(parsed)
+        pending = [key for key in pending if key not in results]
+        if pending:
+            print(f"Batch attempt {attempt + 1}: retrying {', '.join(pending)}")
+    for key in pending:
+        results[key] = None
+    return results
+
+
+def batch_sentiment_analysis(news_by_ticker, batch_size=DEFAULT_BATCH_SIZE):
+    """批量版 ``get_sentiment_analysis``：{ticker: news} -> {ticker: 情绪分析}。"""
+    system_prompt = "You are a sentiment analysis assistant. For each ticker, analyze the sentiment of its news articles and provide a summary of the overall sentiment and any notable changes over time. Be measured and discerning. You are a skeptical investor."
+
+    article_texts = get_article_texts(
+        [article for news in news_by_ticker.values() for article in news]
+    )
+    # 每个批次共享提示词预算
+    item_budget = max(500, DEFAULT_PROMPT_TOKENS // batch_size)
+    items = {}
+    for ticker, news in news_by_ticker.items():
+        articles = []
+        for article in news:
+            timestamp = datetime.fromtimestamp(article["providerPublishTime"]).strftime(
+                "%Y-%m-%d"
+            )
+            articles.append(
+                (
+                    f"Date: {timestamp}\nTitle: {article['title']}",
+                    article_texts[article["link"]],
+                )
+            )
+        builder = PromptBuilder(max_tokens=item_budget)
+        builder.add_articles(f"News articles for {ticker}", articles)
+        items[ticker] = builder.build()
+    return ask_AI_batch(system_prompt, items, batch_size)
+
+
+def batch_industry_analysis(tickers, batch_size=DEFAULT_BATCH_SIZE, errors=None):
+    """
+    批量版 ``get_industry_analysis``：每个 (industry, sector) 只分析一次，
+    返回 {ticker: 行业分析}。
+
+    查不到行业信息的股票结果为 None；传入 ``errors`` 字典时把对应的异常记录到其中。
+    """
+    system_prompt = "You are an industry analysis assistant. For each industry and sector, provide an analysis including trends, growth prospects, regulatory changes, and competitive landscape. Be measured and discerning. Truly think about the positives and negatives. Be sure of your analysis. You are a skeptical investor."
+
+    pairs = {}
+    for ticker in tickers:
+        try:
+            info = get_ticker_data(ticker).info
+            pairs[ticker] = (info["industry"], info["sector"])
+        except Exception as e:
+            print(f"{ticker}: industry lookup failed: {e!r}")
+            if errors is not None:
+                errors[ticker] = e
+    keys = {pair: f"{pair[0]} / {pair[1]}" for pair in pairs.values()}
+    items = {
+        key: f"Provide an analysis of the {industry} industry and {sector} sector."
+        for (industry, sector), key in keys.items()
+    }
+    analyses = ask_AI_batch(system_prompt, items, batch_size)
+    return {
+        ticker: analyses[keys[pairs[ticker]]] if ticker in pairs else None
+        for ticker in tickers
+    }
+
+
+def batch_final_analysis(inputs, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    批量版 ``get_final_analysis``。``inputs`` 是
+    {ticker: (comparisons, sentiment_analysis, analyst_ratings, industry_analysis)}。
+    """
+    system_prompt = "You are a financial analyst providing final investment recommendations for several stocks based on the given data and analyses. Treat each stock independently. Be measured and discerning. Truly think about the positives and negatives of each stock. Be sure of your analysis. You are a skeptical investor."
+
+    items = {
+        ticker: f"Ticker: {ticker}\n\nComparative Analysis:\n{json.dumps(comparisons, indent=2)}\n\nSentiment Analysis:\n{sentiment_analysis}\n\nAnalyst Ratings:\n{analyst_ratings}\n\nIndustry Analysis:\n{industry_analysis}\n\nProvide a comprehensive investment analysis and recommendation for {ticker}. Consider the company's financial strength, growth prospects, competitive position, and potential risks. Give a clear buy, hold, or sell recommendation with supporting rationale."
+        for ticker, (
+            comparisons,
+            sentiment_analysis,
+            analyst_ratings,
+            industry_analysis,
+        ) in inputs.items()
+    }
+    return ask_AI_batch(system_prompt, items, batch_size)
+
+
+def _checkpointed(checkpoint, stage, tickers, compute):
+    # 已有检查点的股票直接读取，只对剩下的股票批量计算
+    if checkpoint is None:
+        return compute(tickers)
+    results = {
+        ticker: checkpoint.load(ticker, stage)
+        for ticker in tickers
+        if checkpoint.has(ticker, stage)
+    }
+    missing = [ticker for ticker in tickers if ticker not in results]
+    if missing:
+        for ticker, value in compute(missing).items():
+            if value is not None:
+                checkpoint.save(ticker, stage, value)
+            results[ticker] = value
+    return results
+
+
+def run_batched(tickers, years=1, batch_size=DEFAULT_BATCH_SIZE, max_requests=8, checkpoint=None):
+    """
+    批量模式的分析流程，结果格式与 ``AnalysisPipeline.run`` 相同。
+
+    行情数据和分析师评级按股票并发获取；情绪、行业和最终分析每 ``batch_size``
+    个股票合并为一次 LLM 请求；当前价格一次批量获取。与 AnalysisPipeline 一样，
+    没有行业分析的股票记为失败，不进入最终分析。多个股票共用一次请求，
+    所以结果中没有每个股票的耗时（``seconds``）。
+    """
+    failures, results = {}, {}
+
+    def fetch_all(stage, func, *args):
+        # 按股票并发获取，失败的股票记录到 failures
+        def compute(pending):
+            fetched = {}
+            with ThreadPoolExecutor(max_requests, thread_name_prefix="fetch") as pool:
+                futures = {ticker: pool.submit(func, ticker, *args) for ticker in pending}
+                for ticker, future in futures.items():
+                    try:
+                        fetched[ticker] = future.result()
+                    except Exception as e:
+                        failures[ticker] = StageError(ticker, stage, e)
+            return fetched
+
+        return _checkpointed(checkpoint, stage, tickers, compute)
+
+    # 检查点的阶段名称与 AnalysisPipeline 一致，两种模式可以共用同一个运行目录
+    stock_data = fetch_all("get_stock_data", get_stock_data, years)
+    ratings = fetch_all("get_analyst_ratings", get_analyst_ratings)
+    tickers = [ticker for ticker in tickers if ticker not in failures]
+
+    sentiments = _checkpointed(
+        checkpoint,
+        "get_sentiment_analysis",
+        tickers,
+        lambda pending: batch_sentiment_analysis(
+            {ticker: stock_data[ticker][3] for ticker in pending}, batch_size
+        ),
+    )
+    industry_errors = {}
+    industries = _checkpointed(
+        checkpoint,
+        "get_industry_analysis",
+        tickers,
+        lambda pending: batch_industry_analysis(pending, batch_size, industry_errors),
+    )
+    for ticker in tickers:
+        if industries[ticker] is None:
+            failures[ticker] = StageError(
+                ticker,
+                "get_industry_analysis",
+                industry_errors.get(ticker)
+                or ValueError("no valid analysis in the batched response"),
+            )
+    tickers = [ticker for ticker in tickers if ticker not in failures]
+
+    finals = _checkpointed(
+        checkpoint,
+        "get_final_analysis",
+        tickers,
+        lambda pending: batch_final_analysis(
+            {
+                ticker: ({}, sentiments[ticker], ratings[ticker], industries[ticker])
+                for ticker in pending
+            },
+            batch_size,
+        ),
+    )
+    try:
+        prices = get_current_prices(tickers)
+    except Exception as e:
+        print(f"get_current_prices failed: {e!r}")
+        prices = {}
+
+    analyses = {}
+    for ticker in tickers:
+        if finals[ticker] is None:
+            failures[ticker] = StageError(
+                ticker,
+                "get_final_analysis",
+                ValueError("no valid analysis in the batched response"),
+            )
+            continue
+        hist_data, balance_sheet, financials, news = stock_data[ticker]
+        analyses[ticker] = finals[ticker]
+        results[ticker] = {
+            "ticker": ticker,
+            "hist_data": hist_data,
+            "balance_sheet": balance_sheet,
+            "financials": financials,
+            "news": news,
+            "sentiment_analysis": sentiments[ticker],
+            "final_analysis": finals[ticker],
+            "price": prices.get(ticker),
+            "errors": {},
+        }
+    return {
+        "analyses": analyses,
+        "prices": {ticker: prices[ticker] for ticker in analyses if ticker in prices},
+        "results": results,
+        "failures": failures,
+    }
@@ -0,0 +1,160 @@
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+# 无界面环境：必须在导入 pyplot（以及 stock_chart）之前选择 Agg 后端
+import matplotlib
+
+matplotlib.use("Agg")
+
+import matplotlib.dates as mdates
+import matplotlib.pyplot as plt
+import numpy as np
+from matplotlib.collections import PolyCollection
+
+from stock_chart import (
+    calculate_bollinger_bands,
+    calculate_moving_average,
+    get_stock_data,
+)
+
+
+class StockChartTemplate:
+    """
+    可复用的股票图表模板，样式与 ``plot_stock_data`` 相同。
+
+    Figure、坐标轴、折线和图例只创建一次，每个股票只替换数据、标题和坐标范围后保存，
+    省去了为每张图重新搭建 Figure 的开销。
+    """
+
+    def __init__(self, ma_window=20, bb_window=20, figsize=(14, 7)):
+        self.ma_window = ma_window
+        self.bb_window = bb_window
+        self.fig, self.ax = plt.subplots(figsize=figsize)
+        ax = self.ax
+        self.band = PolyCollection([], color="gray", alpha=0.3)
+        ax.add_collection(self.band)
+        (self.close_line,) = ax.plot([], [], label="Close Price", color="black")
+        (self.ma_line,) = ax.plot([], [], label=f"MA {ma_window}", color="blue")
+        (self.upper_line,) = ax.plot(
+            [], [], label="Upper Bollinger Band", color="red"
+        )
+        (self.lower_line,) = ax.plot(
+            [], [], label="Lower Bollinger Band", color="green"
+        )
+        ax.xaxis_date()
+        ax.set_xlabel("Date")
+        ax.set_ylabel("Price")
+        ax.legend(loc="best")
+
+    def render(self, data, ticker, path):
+        x = mdates.date2num(data.index.values)
+        close = data["Close"].to_numpy(dtype=float)
+        ma = calculate_moving_average(data, self.ma_window).to_numpy()
+        upper, lower = calculate_bollinger_bands(data, self.bb_window)
+        upper, lower = upper.to_numpy(), lower.to_numpy()
+
+        self.close_line.set_data(x, close)
+        self.ma_line.set_data(x, ma)
+        self.upper_line.set_data(x, upper)
+        self.lower_line.set_data(x, lower)
+        valid = ~(np.isnan(upper) | np.isnan(lower))
+        if valid.any():
+            polygon = np.concatenate(
+                [
+                    np.column_stack([x[valid], upper[valid]]),
+                    np.column_stack([x[valid], lower[valid]])[::-1],
+                ]
+            )
+            self.band.set_verts([polygon])
+        else:
+            self.band.set_verts([])
+
+        self.ax.set_title(f"{ticker} Price Chart with MA and Bollinger Bands")
+        self.ax.relim()
+        self.ax.autoscale_view()
+        self.fig.savefig(path)
+
+
+# 每个工作进程复用一个模板
+_template = None
+
+
+def _init_worker(ma_window, bb_window):
+    global _template
+    _template = StockChartTemplate(ma_window, bb_window)
+
+
+def _render_one(ticker, start, end, output_dir, fmt):
+    result = {"ticker": ticker, "path": None, "fetch_seconds": None, "render_seconds": None}
+    try:
+        started = time.perf_counter()
+        data = get_stock_data(ticker, start, end)
+        result["fetch_seconds"] = time.perf_counter() - started
+        if data is None or data.empty:
+            raise ValueError("No price data returned.")
+
+        started = time.perf_counter()
+        path = os.path.join(output_dir, f"{ticker}.{fmt}")
+        _template.render(data, ticker, path)
+        result["render_seconds"] = time.perf_counter() - started
+        result["path"] = path
+    except Exception as e:
+        result["error"] = str(e)
+    return result
+
+
+def render_charts(
+    tickers,
+    start,
+    end,
+    output_dir="charts",
+    fmt="png",
+    processes=None,
+    ma_window=20,
+    bb_window=20,
+):
+    """
+    在进程池中为一批股票生成 PNG/SVG 图表，返回每张图的结果（按完成顺序）。
+
+    每个结果包含 ticker、path、fetch_seconds（获取数据耗时）、render_seconds（渲染耗时），
+    失败时还有 error。
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    results = []
+    with ProcessPoolExecutor(
+        max_workers=processes,
+        initializer=_init_worker,
+        initargs=(ma_window, bb_window),
+    ) as pool:
+        futures = [
+            pool.submit(_render_one, ticker, start, end, output_dir, fmt)
+            for ticker in tickers
+        ]
+        for future in as_completed(futures):
+            result = future.result()
+            results.append(result)
+            if "error" in result:
+                print(f"{result['ticker']}: failed ({result['error']})")
+            else:
+                print(
+                    f"{result['ticker']}: fetch {result['fetch_seconds']:.2f}s, "
+                    f"render {result['render_seconds']:.2f}s -> {result['path']}"
+                )
+    return results
+
+
+# 示例用法：python batch_charts.py AAPL MSFT NVDA
+if __name__ == "__main__":
+    tickers = sys.argv[1:] or ["AAPL", "MSFT", "GOOGL", "AMZN", "NVDA"]
+    start_date = "2022-01-01"  # 开始日期
+    end_date = "2024-05-04"  # 结束日期
+
+    started = time.perf_counter()
+    results = render_charts(tickers, start_date, end_date)
+    rendered = [r for r in results if "error" not in r]
+    print(
+        f"\nRendered {len(rendered)}/{len(results)} charts in "
+        f"{time.perf_counter() - started:.2f}s"
+    )
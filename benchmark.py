@@ -0,0 +1,581 @@
+import argparse
+import json
+import os
+import pickle
+import tempfile
+import threading
+import time
+import tracemalloc
+import zlib
+from contextlib import contextmanager
+from datetime import datetime
+
+import matplotlib
+
+# 基准测试不打开窗口，图表用 Agg 后端渲染
+matplotlib.use("Agg")
+
+import numpy as np
+import pandas as pd
+import yfinance as yf
+
+from mock_llm_server import MockLLMServer
+
+FIXTURE_DIR = "benchmark_fixtures"
+
+# 合成数据使用的行业，多个股票共享同一个 (industry, sector)，和真实的行业分析一样
+_INDUSTRIES = (
+    ("Semiconductors", "Technology"),
+    ("Software—Infrastructure", "Technology"),
+    ("Internet Content & Information", "Communication Services"),
+    ("Consumer Electronics", "Technology"),
+)
+
+_STATEMENT_ROWS = (
+    "Total Revenue",
+    "Gross Profit",
+    "Operating Income",
+    "EBITDA",
+    "Net Income",
+    "Total Assets",
+    "Total Liabilities Net Minority Interest",
+    "Stockholders Equity",
+    "Total Debt",
+    "Cash And Cash Equivalents",
+) + tuple(f"Other Line Item {i}" for i in range(30))
+
+
+# ---------------------------------------------------------------- 数据样本
+
+
+def _price_walk(rng, n, start_price):
+    returns = rng.normal(0.0003, 0.02, n)
+    close = start_price * np.exp(np.cumsum(returns))
+    open_ = close * (1 + rng.normal(0, 0.005, n))
+    high = np.maximum(open_, close) * (1 + rng.uniform(0, 0.01, n))
+    low = np.minimum(open_, close) * (1 - rng.uniform(0, 0.01, n))
+    volume = rng.integers(1_000_000, 50_000_000, n).astype(float)
+    return open_, high, low, close, volume
+
+
+def synthetic_fixture(symbol, days=400, seed=None):
+    """生成一个股票的合成数据样本，格式与 yfinance 返回的一致。"""
+    rng = np.random.default_rng(zlib.crc32(symbol.encode()) if seed is None else seed)
+    index = pd.bdate_range(end=datetime.now().date(), periods=days, tz="America/New_York")
+    open_, high, low, close, volume = _price_walk(rng, days, rng.uniform(20, 500))
+    history = pd.DataFrame(
+        {
+            "Open": open_,
+            "High": high,
+            "Low": low,
+            "Close": close,
+            "Volume": volume,
+            "Dividends": 0.0,
+            "Stock Splits": 0.0,
+        },
+        index=index.rename("Date"),
+    )
+
+    periods = pd.to_datetime(
+        [f"{datetime.now().year - i}-12-31" for i in range(1, 5)]
+    )
+
+    def statement():
+        values = rng.uniform(1e8, 5e11, (len(_STATEMENT_ROWS), len(periods)))
+        return pd.DataFrame(values, index=list(_STATEMENT_ROWS), columns=periods)
+
+    now = int(time.time())
+    industry, sector = _INDUSTRIES[int(rng.integers(len(_INDUSTRIES)))]
+    return {
+        "info": {"symbol": symbol, "industry": industry, "sector": sector},
+        "history": history,
+        "balance_sheet": statement(),
+        "financials": statement(),
+        "news": [
+            {
+                "title": f"{symbol} headline {i}",
+                "link": f"/article/{symbol}-{i}",
+                "providerPublishTime": now - i * 86400,
+            }
+            for i in range(5)
+        ],
+        "recommendations": pd.DataFrame(
+            {
+                "Firm": ["Firm A", "Firm B"],
+                "To Grade": ["Buy", "Hold"],
+                "Action": ["main", "up"],
+            }
+        ),
+    }
+
+
+def record_fixture(symbol, root=FIXTURE_DIR):
+    """从 yfinance 录制一个股票的真实数据样本，保存到 ``root/<symbol>.pkl``。"""
+    stock = yf.Ticker(symbol)
+    news = []
+    for i, item in enumerate(stock.news or []):
+        content = item.get("content") or {}
+        news.append(
+            {
+                "title": item.get("title") or content.get("title", ""),
+                # 文章链接改为指向模拟服务，基准测试不访问外部网站
+                "link": f"/article/{symbol}-{i}",
+                "providerPublishTime": item.get("providerPublishTime", int(time.time())),
+            }
+        )
+    info = stock.info
+    fixture = {
+        "info": {key: info.get(key) for key in ("symbol", "industry", "sector")},
+        "history": stock.history(period="2y"),
+        "balance_sheet": stock.balance_sheet,
+        "financials": stock.financials,
+        "news": news,
+        "recommendations": stock.recommendations,
+    }
+    os.makedirs(root, exist_ok=True)
+    with open(os.path.join(root, f"{symbol}.pkl"), "wb") as f:
+        pickle.dump(fixture, f)
+    return fixture
+
+
+def record_crypto_fixture(exchange, ticker="BTC/USDT", timeframe="1m", limit=1000, root=FIXTURE_DIR):
+    """从交易所录制一段 OHLCV 数据，保存到 ``root/crypto.pkl``。"""
+    ohlcv = exchange.fetch_ohlcv(ticker, timeframe=timeframe, limit=limit)
+    os.makedirs(root, exist_ok=True)
+    with open(os.path.join(root, "crypto.pkl"), "wb") as f:
+        pickle.dump(ohlcv, f)
+    return ohlcv
+
+
+def load_fixtures(n, root=FIXTURE_DIR):
+    """返回 n 个股票的数据样本：先用已录制的样本，不够时用合成数据补足。"""
+    fixtures = {}
+    if os.path.isdir(root):
+        for name in sorted(os.listdir(root)):
+            if name.endswith(".pkl") and name != "crypto.pkl" and len(fixtures) < n:
+                with open(os.path.join(root, name), "rb") as f:
+                    fixtures[name[: -len(".pkl")]] = pickle.load(f)
+    i = 0
+    while len(fixtures) < n:
+        symbol = f"SYN{i:04d}"
+        fixtures.setdefault(symbol, synthetic_fixture(symbol, seed=i))
+        i += 1
+    return fixtures
+
+
+def load_crypto_fixture(n, root=FIXTURE_DIR, timeframe_ms=60_000):
+    """返回至少 n 根 OHLCV K线：优先使用录制的数据，不够时用合成数据补足。"""
+    path = os.path.join(root, "crypto.pkl")
+    rows = []
+    if os.path.exists(path):
+        with open(path, "rb") as f:
+            rows = [list(row) for row in pickle.load(f)]
+    if len(rows) < n:
+        rng = np.random.default_rng(0)
+        count = n - len(rows)
+        open_, high, low, close, volume = _price_walk(rng, count, 60000.0)
+        start = int(time.time() * 1000) // timeframe_ms * timeframe_ms - n * timeframe_ms
+        if rows:
+            start = rows[-1][0] + timeframe_ms
+        rows += [
+            [start + i * timeframe_ms, open_[i], high[i], low[i], close[i], volume[i]]
+            for i in range(count)
+        ]
+    return rows
+
+
+# ---------------------------------------------------------------- 行情接口替身
+
+
+class FixtureTicker:
+    """用数据样本代替 ``yf.Ticker``，接口相同但不访问网络。"""
+
+    def __init__(self, fixture, article_base_url):
+        self._fixture = fixture
+        self.info = fixture["info"]
+        self.balance_sheet = fixture["balance_sheet"]
+        self.financials = fixture["financials"]
+        self.recommendations = fixture["recommendations"]
+        self.news = [
+            dict(article, link=article_base_url + article["link"])
+            for article in fixture["news"]
+        ]
+
+    def history(self, start=None, end=None, period=None, interval=None, **kwargs):
+        history = self._fixture["history"]
+        if period is not None:
+            return history.tail(1)
+        dates = history.index.date
+        mask = np.ones(len(history), dtype=bool)
+        if start is not None:
+            mask &= dates >= pd.Timestamp(start).date()
+        if end is not None:
+            mask &= dates < pd.Timestamp(end).date()
+        return history[mask]
+
+
+def _fixture_download(fixtures):
+    def download(tickers, group_by="column", **kwargs):
+        if isinstance(tickers, str):
+            tickers = tickers.split()
+        frames = {
+            ticker: fixtures[ticker]["history"].tail(30)
+            for ticker in tickers
+            if ticker in fixtures
+        }
+        if not frames:
+            return pd.DataFrame()
+        data = pd.concat(frames, axis=1)
+        if group_by == "ticker":
+            return data
+        # 与 yfinance 默认一致：列为 (字段, 股票)
+        return data.swaplevel(axis=1).sort_index(axis=1, level=0, sort_remaining=False)
+
+    return download
+
+
+@contextmanager
+def fixture_market_data(fixtures, article_base_url):
+    """在上下文中让 yfinance 的 Ticker 和 download 返回数据样本。"""
+    original = yf.Ticker, yf.download
+    yf.Ticker = lambda symbol, *args, **kwargs: FixtureTicker(
+        fixtures[symbol], article_base_url
+    )
+    yf.download = _fixture_download(fixtures)
+    try:
+        yield
+    finally:
+        yf.Ticker, yf.download = original
+
+
+class FixtureExchange:
+    """
+    用 OHLCV 样本代替 ccxt 交易所。每次 ``fetch_ohlcv`` 时间前进一根K线，
+    和实时行情一样返回从 ``since`` 开始到当前时刻的K线。
+    """
+
+    def __init__(self, rows, start):
+        self.rows = rows
+        self.cursor = start
+
+    def fetch_ohlcv(self, symbol, timeframe="1m", since=None, limit=None):
+        self.cursor = min(self.cursor + 1, len(self.rows))
+        available = self.rows[: self.cursor]
+        if since is not None:
+            return [row for row in available if row[0] >= since]
+        return available[-(limit or 500) :]
+
+
+# ---------------------------------------------------------------- 计时
+
+
+class StageTimer:
+    """按阶段收集耗时，计算分位数。可以在多个线程中同时记录。"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = {}
+
+    def record(self, stage, seconds):
+        with self._lock:
+            self.samples.setdefault(stage, []).append(seconds)
+
+    @contextmanager
+    def span(self, stage):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - started)
+
+    def wrap(self, stage, func):
+        def timed(*args, **kwargs):
+            with self.span(stage):
+                return func(*args, **kwargs)
+
+        return timed
+
+    def summary(self):
+        table = {}
+        for stage, samples in self.samples.items():
+            values = np.array(samples) * 1000
+            table[stage] = {
+                "count": len(values),
+                "p50_ms": float(np.percentile(values, 50)),
+                "p90_ms": float(np.percentile(values, 90)),
+                "p99_ms": float(np.percentile(values, 99)),
+                "max_ms": float(values.max()),
+            }
+        return table
+
+
+def _peak_rss_mb():
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    # Linux 上 ru_maxrss 的单位是 KB
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+@contextmanager
+def _measure(result, trace_memory=True):
+    """
+    记录墙钟时间和内存峰值。
+
+    ``trace_memory=True`` 时用 tracemalloc 统计 Python 内存分配峰值，但它会明显
+    拖慢分配密集的代码（例如 matplotlib 绘图）；为 False 时改为报告进程的
+    峰值 RSS（整个进程生命周期内的最大值）。
+    """
+    if trace_memory:
+        tracemalloc.start()
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        result["wall_seconds"] = time.perf_counter() - started
+        if trace_memory:
+            result["peak_memory_mb"] = tracemalloc.get_traced_memory()[1] / 2**20
+            result["memory_source"] = "tracemalloc"
+            tracemalloc.stop()
+        else:
+            result["peak_memory_mb"] = _peak_rss_mb()
+            result["memory_source"] = "rss"
+
+
+# ---------------------------------------------------------------- 场景
+
+
+def _reset_run_state(workdir):
+    # 每个场景相当于一次全新的运行：清空进程内的共享状态，缓存文件放在新的临时目录
+    import article_store
+    import financial_utils
+    import price_cache
+    from ticker_data import reset_ticker_data
+
+    reset_ticker_data()
+    financial_utils._industry_analyses.clear()
+    financial_utils._quote_cache.clear()
+    article_store._default_fetcher = None
+    os.environ["ARTICLE_CACHE_DIR"] = os.path.join(workdir, "articles")
+    price_cache._default_cache = price_cache.PriceHistoryCache(
+        os.path.join(workdir, "prices.sqlite")
+    )
+
+
+def run_pipeline_scenario(
+    n,
+    server,
+    max_tickers=4,
+    max_requests=8,
+    fixture_dir=FIXTURE_DIR,
+    trace_memory=True,
+    batch_size=1,
+):
+    """
+    用数据样本和模拟 LLM 服务跑一次 main.py 的完整流程（分析 n 个股票并排名）。
+    ``batch_size`` 大于 1 时使用批量模式（batch_analysis.run_batched）。
+
+    Returns:
+        dict: 墙钟时间、内存峰值、每个阶段的耗时分位数、LLM 请求数和失败数。
+    """
+    import analysis_pipeline
+    import batch_analysis
+    import financial_utils
+
+    fixtures = load_fixtures(n, fixture_dir)
+    tickers = list(fixtures)
+    timer = StageTimer()
+    if batch_size > 1:
+        module = batch_analysis
+        stages = (
+            "get_stock_data",
+            "get_analyst_ratings",
+            "batch_sentiment_analysis",
+            "batch_industry_analysis",
+            "batch_final_analysis",
+            "get_current_prices",
+        )
+        scenario = f"pipeline-{n}-batch{batch_size}"
+    else:
+        module = analysis_pipeline
+        stages = (
+            "get_stock_data",
+            "get_analyst_ratings",
+            "get_industry_analysis",
+            "get_sentiment_analysis",
+            "get_final_analysis",
+            "get_current_prices",
+        )
+        scenario = f"pipeline-{n}"
+    originals = {stage: getattr(module, stage) for stage in stages}
+    requests_before = server.requests
+    result = {"scenario": scenario, "tickers": n}
+
+    with tempfile.TemporaryDirectory() as workdir, fixture_market_data(
+        fixtures, server.base_url
+    ):
+        _reset_run_state(workdir)
+        for stage, func in originals.items():
+            setattr(module, stage, timer.wrap(stage, func))
+        try:
+            with _measure(result, trace_memory):
+                if batch_size > 1:
+                    run = batch_analysis.run_batched(
+                        tickers, 1, batch_size, max_requests=max_requests
+                    )
+                else:
+                    pipeline = analysis_pipeline.AnalysisPipeline(
+                        1, max_tickers=max_tickers, max_requests=max_requests
+                    )
+                    run = pipeline.run(tickers)
+                with timer.span("rank_companies"):
+                    financial_utils.rank_companies(
+                        "Benchmark", run["analyses"], run["prices"]
+                    )
+        finally:
+            for stage, func in originals.items():
+                setattr(module, stage, func)
+
+    result["failures"] = len(run["failures"])
+    result["llm_requests"] = server.requests - requests_before
+    result["stages"] = timer.summary()
+    return result
+
+
+def run_crypto_scenario(
+    iterations=200, limit=500, render=True, fixture_dir=FIXTURE_DIR, trace_memory=True
+):
+    """
+    用 OHLCV 样本跑 crypto_chart.py 的数据循环：获取新K线、增量计算指标和信号、
+    复制快照、刷新图表，每次循环前进一根K线。
+    """
+    from chart_renderer import LiveChartRenderer, take_snapshot
+    from crypto_chart import get_crypto_data
+    from crypto_poller import SymbolPipeline
+    from candle_buffer import OHLCV_COLUMNS
+
+    rows = load_crypto_fixture(limit + iterations, fixture_dir)
+    exchange = FixtureExchange(rows, start=limit - 1)
+    ticker = "BTC/USDT"
+    timer = StageTimer()
+    result = {"scenario": f"crypto-{iterations}", "iterations": iterations}
+
+    with _measure(result, trace_memory):
+        data = get_crypto_data(exchange, ticker, limit=limit)
+        pipeline = SymbolPipeline(ticker, capacity=limit)
+        pipeline.process(data[list(OHLCV_COLUMNS)].itertuples())
+        renderer = LiveChartRenderer(ticker) if render else None
+        for _ in range(iterations):
+            with timer.span("get_crypto_data"):
+                new_data = get_crypto_data(exchange, ticker, since=pipeline.since)
+            with timer.span("indicators"):
+                pipeline.process(new_data[list(OHLCV_COLUMNS)].itertuples())
+                signal_info = pipeline.signal_info()
+            if renderer is not None:
+                with timer.span("snapshot"):
+                    snapshot = take_snapshot(pipeline.candles)
+                with timer.span("chart_update"):
+                    renderer.update(snapshot, signal_info)
+
+    result["stages"] = timer.summary()
+    return result
+
+
+def print_report(result):
+    print(f"\n== {result['scenario']} ==")
+    print(
+        f"wall time: {result['wall_seconds']:.2f}s, "
+        f"peak memory: {result['peak_memory_mb'] or 0:.1f} MB ({result['memory_source']})"
+    )
+    if "llm_requests" in result:
+        print(f"LLM requests: {result['llm_requests']}, failures: {result['failures']}")
+    table = pd.DataFrame(result["stages"]).T
+    print(table.round(2).to_string())
+
+
+def _configure_environment(server):
+    # 必须在导入 ask_AI / price_cache 之前设置：它们在第一次使用时读取配置
+    os.environ["API_KEY"] = "benchmark"
+    os.environ["API_URL"] = server.url
+    os.environ["LLM_CACHE_DISABLED"] = "1"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark the analysis pipeline and crypto loop against local stand-ins"
+    )
+    parser.add_argument("--scenarios", type=int, nargs="*", default=[5, 50, 500])
+    parser.add_argument("--crypto-iterations", type=int, default=200)
+    parser.add_argument("--no-render", action="store_true", help="skip chart updates")
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--token-rate", type=float, default=2000)
+    parser.add_argument("--completion-tokens", type=int, default=200)
+    parser.add_argument("--max-tickers", type=int, default=4)
+    parser.add_argument("--max-requests", type=int, default=8)
+    parser.add_argument(
+        "--batch-size", type=int, default=1, help="tickers per LLM request (batched mode)"
+    )
+    parser.add_argument(
+        "--no-tracemalloc",
+        action="store_true",
+        help="report peak RSS instead of tracing allocations (less timing overhead)",
+    )
+    parser.add_argument("--fixtures", default=FIXTURE_DIR)
+    parser.add_argument("--record", nargs="*", help="record yfinance fixtures for these tickers")
+    parser.add_argument("--record-crypto", action="store_true", help="record a Binance OHLCV fixture")
+    parser.add_argument("--json", help="append results as JSON lines to this file")
+    parser.add_argument(
+        "--metrics", help="export instrumentation metrics (.prom or JSON lines) to this file"
+    )
+    args = parser.parse_args()
+
+    if args.record:
+        for symbol in args.record:
+            record_fixture(symbol, args.fixtures)
+            print(f"Recorded fixture for {symbol}")
+    if args.record_crypto:
+        import ccxt
+
+        record_crypto_fixture(ccxt.binance(), root=args.fixtures)
+        print("Recorded crypto fixture")
+
+    with MockLLMServer(
+        latency=args.latency,
+        token_rate=args.token_rate,
+        completion_tokens=args.completion_tokens,
+    ) as server:
+        _configure_environment(server)
+        results = [
+            run_pipeline_scenario(
+                n,
+                server,
+                args.max_tickers,
+                args.max_requests,
+                args.fixtures,
+                trace_memory=not args.no_tracemalloc,
+                batch_size=args.batch_size,
+            )
+            for n in args.scenarios
+        ]
+    if args.crypto_iterations:
+        results.append(
+            run_crypto_scenario(
+                args.crypto_iterations,
+                render=not args.no_render,
+                fixture_dir=args.fixtures,
+                trace_memory=not args.no_tracemalloc,
+            )
+        )
+
+    for result in results:
+        print_report(result)
+    if args.json:
+        with open(args.json, "a", encoding="utf-8") as f:
+            for result in results:
+                record = dict(result, timestamp=datetime.now().isoformat())
+                f.write(json.dumps(record) + "\n")
+    if args.metrics:
+        import metrics
+
+        metrics.export_metrics(args.metrics)
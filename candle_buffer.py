@@ -0,0 +1,139 @@
+import numpy as np
+
+# K线基础列，与 get_crypto_data 返回的 DataFrame 列名一致
+OHLCV_COLUMNS = ("open", "high", "low", "close", "volume")
+# 指标列，与 crypto_chart / StreamingIndicators 使用的列名一致
+INDICATOR_COLUMNS = ("MA", "Upper Band", "Lower Band", "MACD", "Signal", "MACD_Hist")
+
+
+class CandleBuffer:
+    """
+    固定容量、基于 NumPy 数组的K线环形缓冲区。
+
+    每一列预先分配 ``2 * capacity`` 个元素，每个值同时写入 ``i`` 和 ``i + capacity``
+    两个位置（镜像环形缓冲），这样最近 ``capacity`` 根K线在内存中始终是连续的，
+    ``buffer["close"]`` 等访问直接返回底层数组的视图，不需要复制或拼接。
+
+    - ``append`` / ``upsert`` 都是 O(1)，缓冲区写满后自动丢弃最旧的K线；
+    - ``upsert`` 遇到与最后一根K线相同的时间戳时原地更新（K线尚未收盘时会不断变化）；
+    - 返回的视图只在下一次写入之前有效，需要长期保存请自行 ``copy()``。
+
+    Args:
+        capacity (int): 最多保留的K线数量。
+        columns (tuple): 除时间戳外需要保存的列，默认是 OHLCV 加上指标列。
+    """
+
+    def __init__(self, capacity, columns=OHLCV_COLUMNS + INDICATOR_COLUMNS):
+        if capacity < 1:
+            raise ValueError("capacity must be a positive integer.")
+        self.capacity = capacity
+        self.columns = tuple(columns)
+        self._timestamps = np.zeros(2 * capacity, dtype="datetime64[ms]")
+        self._data = {
+            column: np.full(2 * capacity, np.nan, dtype=np.float64)
+            for column in self.columns
+        }
+        self._start = 0
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def __contains__(self, column):
+        return column == "timestamp" or column in self._data
+
+    def __getitem__(self, column):
+        """返回某一列最近 ``len(self)`` 个值的零拷贝视图。"""
+        if column == "timestamp":
+            return self.timestamps
+        return self._data[column][self._start : self._start + self._size]
+
+    @property
+    def timestamps(self):
+        return self._timestamps[self._start : self._start + self._size]
+
+    @property
+    def last_timestamp(self):
+        if self._size == 0:
+            return None
+        return self._timestamps[self._start + self._size - 1]
+
+    def _write(self, slot, timestamp, values):
+        mirror = slot + self.capacity
+        if timestamp is not None:
+            self._timestamps[slot] = self._timestamps[mirror] = timestamp
+        for column, value in values.items():
+            array = self._data[column]
+            array[slot] = array[mirror] = value
+
+    def append(self, timestamp, **values):
+        """追加一根新K线，未给出的列填 NaN。"""
+        timestamp = np.datetime64(timestamp, "ms")
+        last = self.last_timestamp
+        if last is not None and timestamp <= last:
+            raise ValueError(
+                f"Candle at {timestamp} is not newer than the last candle at {last}."
+            )
+        unknown = set(values) - set(self._data)
+        if unknown:
+            raise KeyError(f"Unknown columns: {sorted(unknown)}")
+
+        row = dict.fromkeys(self.columns, np.nan)
+        row.update(values)
+        if self._size < self.capacity:
+            slot = (self._start + self._size) % self.capacity
+            self._size += 1
+        else:
+            # 已满：覆盖最旧的一根，窗口整体后移一位
+            slot = self._start
+            self._start = (self._start + 1) % self.capacity
+        self._write(slot, timestamp, row)
+
+    def update_last(self, **values):
+        """原地更新最后一根K线的部分列。"""
+        if self._size == 0:
+            raise IndexError("update_last on an empty CandleBuffer.")
+        unknown = set(values) - set(self._data)
+        if unknown:
+            raise KeyError(f"Unknown columns: {sorted(unknown)}")
+        slot = (self._start + self._size - 1) % self.capacity
+        self._write(slot, None, values)
+
+    def upsert(self, timestamp, **values):
+        """
+        时间戳与最后一根K线相同则原地更新，否则追加。
+
+        Returns:
+            bool: 追加了新K线返回 True，更新了最后一根返回 False。
+        """
+        timestamp = np.datetime64(timestamp, "ms")
+        if self._size and timestamp == self.last_timestamp:
+            self.update_last(**values)
+            return False
+        self.append(timestamp, **values)
+        return True
+
+    def extend(self, frame):
+        """
+        批量写入一个以时间戳为索引的 DataFrame（例如 get_crypto_data 的返回值）。
+
+        只写入缓冲区中已有的列，超出容量的部分只保留最新的 ``capacity`` 根。
+        """
+        frame = frame.iloc[-self.capacity :]
+        columns = [column for column in self.columns if column in frame.columns]
+        timestamps = frame.index.values.astype("datetime64[ms]")
+        for i, timestamp in enumerate(timestamps):
+            self.upsert(
+                timestamp,
+                **{column: frame[column].iat[i] for column in columns},
+            )
+
+    def to_frame(self):
+        """复制一份 DataFrame，便于调试或持久化。"""
+        import pandas as pd
+
+        frame = pd.DataFrame(
+            {column: self[column].copy() for column in self.columns},
+            index=pd.DatetimeIndex(self.timestamps.copy(), name="timestamp"),
+        )
+        return frame
@@ -0,0 +1,277 @@
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+# 每根K线在磁盘上的记录格式（小端，定长），文件只追加、读取时用 memmap
+CANDLE_DTYPE = np.dtype(
+    [
+        ("timestamp", "<i8"),
+        ("open", "<f8"),
+        ("high", "<f8"),
+        ("low", "<f8"),
+        ("close", "<f8"),
+        ("volume", "<f8"),
+    ]
+)
+
+_TIMEFRAME_UNITS_MS = {
+    "s": 1000,
+    "m": 60 * 1000,
+    "h": 60 * 60 * 1000,
+    "d": 24 * 60 * 60 * 1000,
+    "w": 7 * 24 * 60 * 60 * 1000,
+}
+
+
+def timeframe_to_ms(timeframe):
+    """把 '1m'、'4h'、'1d' 这类 ccxt 周期字符串转换成毫秒。"""
+    amount, unit = timeframe[:-1], timeframe[-1]
+    if unit not in _TIMEFRAME_UNITS_MS or not amount.isdigit():
+        raise ValueError(f"Unsupported timeframe: {timeframe}")
+    return int(amount) * _TIMEFRAME_UNITS_MS[unit]
+
+
+def to_milliseconds(value):
+    """毫秒时间戳、datetime 或日期字符串统一转换成 UTC 毫秒时间戳。"""
+    if value is None:
+        return None
+    if isinstance(value, (int, np.integer)):
+        return int(value)
+    timestamp = pd.Timestamp(value)
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.tz_localize("UTC")
+    return int(timestamp.timestamp() * 1000)
+
+
+def _is_sorted(timestamps):
+    # 严格递增：没有乱序也没有重复
+    return not np.any(np.diff(timestamps) <= 0)
+
+
+def _merge_intervals(intervals):
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+
+class CandleStore:
+    """
+    本地K线缓存，按 交易所/交易对/周期 分文件保存。
+
+    每个键对应两个文件：
+
+    - ``<timeframe>.bin``：只追加的定长记录（见 ``CANDLE_DTYPE``），读取时 memmap；
+    - ``<timeframe>.json``：已经从交易所拉取过的时间区间 ``[start, end)``（毫秒）。
+
+    记录已覆盖区间而不是只看K线时间戳，这样交易所本身就缺失的K线（停机维护等）
+    不会在每次运行时被重复请求。补齐中间缺口时记录可能乱序写入，
+    ``read`` 会按时间戳排序并去重，``compact`` 把文件重写成有序的
+    （``backfill_crypto_data`` 结束时会调用，之后的读取都是零拷贝）。
+    """
+
+    def __init__(self, root="candle_cache"):
+        self.root = root
+
+    def _base_path(self, exchange_id, symbol, timeframe):
+        safe_symbol = symbol.replace("/", "-").replace(":", "_")
+        return os.path.join(self.root, exchange_id, safe_symbol, timeframe)
+
+    def data_path(self, exchange_id, symbol, timeframe):
+        return self._base_path(exchange_id, symbol, timeframe) + ".bin"
+
+    def _meta_path(self, exchange_id, symbol, timeframe):
+        return self._base_path(exchange_id, symbol, timeframe) + ".json"
+
+    def covered(self, exchange_id, symbol, timeframe):
+        """返回已覆盖的时间区间列表 [[start, end), ...]（毫秒，已合并排序）。"""
+        path = self._meta_path(exchange_id, symbol, timeframe)
+        if not os.path.exists(path):
+            return []
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)["covered"]
+
+    def mark_covered(self, exchange_id, symbol, timeframe, start, end):
+        if end <= start:
+            return
+        intervals = self.covered(exchange_id, symbol, timeframe)
+        intervals = _merge_intervals(intervals + [[start, end]])
+        path = self._meta_path(exchange_id, symbol, timeframe)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"covered": intervals}, f)
+        os.replace(tmp_path, path)
+
+    def missing(self, exchange_id, symbol, timeframe, start, end):
+        """返回 [start, end) 中尚未覆盖的区间列表。"""
+        gaps = []
+        cursor = start
+        for covered_start, covered_end in self.covered(exchange_id, symbol, timeframe):
+            if covered_end <= cursor:
+                continue
+            if covered_start >= end:
+                break
+            if covered_start > cursor:
+                gaps.append((cursor, covered_start))
+            cursor = max(cursor, covered_end)
+        if cursor < end:
+            gaps.append((cursor, end))
+        return gaps
+
+    def append(self, exchange_id, symbol, timeframe, ohlcv):
+        """
+        把 ccxt 格式的K线行 ``[timestamp, open, high, low, close, volume]`` 追加到文件。
+
+        交易所可能对没有成交的K线返回 None（例如成交量），写入时转换为 NaN。
+        """
+        if not len(ohlcv):
+            return 0
+        records = np.array(
+            [tuple(np.nan if value is None else value for value in row) for row in ohlcv],
+            dtype=CANDLE_DTYPE,
+        )
+        path = self.data_path(exchange_id, symbol, timeframe)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "ab") as f:
+            f.write(records.tobytes())
+        return len(records)
+
+    def read(self, exchange_id, symbol, timeframe, start=None, end=None):
+        """
+        读取 [start, end) 之间的K线，返回按时间戳排序、去重后的结构化数组。
+
+        文件本身已有序时直接返回 memmap 的切片（零拷贝）。
+        """
+        path = self.data_path(exchange_id, symbol, timeframe)
+        if not os.path.exists(path) or os.path.getsize(path) == 0:
+            return np.empty(0, dtype=CANDLE_DTYPE)
+        records = np.memmap(path, dtype=CANDLE_DTYPE, mode="r")
+        timestamps = records["timestamp"]
+        if not _is_sorted(timestamps):
+            # 有乱序或重复：同一时间戳保留最后写入的一条
+            order = np.argsort(timestamps, kind="stable")
+            records = records[order]
+            timestamps = records["timestamp"]
+            keep = np.append(timestamps[1:] != timestamps[:-1], True)
+            records = records[keep]
+            timestamps = records["timestamp"]
+        lo = 0 if start is None else np.searchsorted(timestamps, start, "left")
+        hi = len(records) if end is None else np.searchsorted(timestamps, end, "left")
+        return records[lo:hi]
+
+    def compact(self, exchange_id, symbol, timeframe):
+        """把数据文件重写为有序、无重复的形式，已经有序时什么也不做。"""
+        path = self.data_path(exchange_id, symbol, timeframe)
+        if not os.path.exists(path) or os.path.getsize(path) == 0:
+            return
+        if _is_sorted(np.memmap(path, dtype=CANDLE_DTYPE, mode="r")["timestamp"]):
+            return
+        records = np.array(self.read(exchange_id, symbol, timeframe))
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(records.tobytes())
+        os.replace(tmp_path, path)
+
+    def to_frame(self, exchange_id, symbol, timeframe, start=None, end=None):
+        """读取为与 get_crypto_data 相同格式的 DataFrame。"""
+        records = self.read(exchange_id, symbol, timeframe, start, end)
+        data = pd.DataFrame(
+            {name: np.asarray(records[name]) for name in CANDLE_DTYPE.names}
+        )
+        data["timestamp"] = pd.to_datetime(data["timestamp"], unit="ms")
+        data.set_index("timestamp", inplace=True)
+        return data
+
+
+def fetch_ohlcv_range(exchange, ticker, timeframe, start, end, page_limit=1000):
+    """
+    分页调用 ``fetch_ohlcv``，逐页返回 [start, end) 之间的K线。
+
+    Yields:
+        (list, int): 一页K线，以及这一页已经覆盖到的时间（毫秒，不含）。
+    """
+    step = timeframe_to_ms(timeframe)
+    cursor = start
+    while cursor < end:
+        ohlcv = exchange.fetch_ohlcv(
+            ticker, timeframe=timeframe, since=cursor, limit=page_limit
+        )
+        page = [row for row in ohlcv or [] if cursor <= row[0] < end]
+        if not page:
+            # 这段时间交易所没有数据（例如交易对尚未上线），视为已覆盖
+            yield [], end
+            return
+        next_cursor = page[-1][0] + step
+        yield page, min(next_cursor, end)
+        cursor = next_cursor
+
+
+def backfill_crypto_data(
+    exchange,
+    ticker,
+    timeframe="1m",
+    start=None,
+    end=None,
+    store=None,
+    page_limit=1000,
+):
+    """
+    批量回补历史K线到本地缓存，只请求缓存中缺失的区间，返回 [start, end) 的 DataFrame。
+
+    Args:
+        exchange: ccxt 交易所对象（同步版本）。
+        ticker (str): 交易对，例如 "BTC/USDT"。
+        timeframe (str): K线周期。
+        start: 起始时间（毫秒时间戳、datetime 或 "2024-01-01" 这样的字符串）。
+        end: 结束时间（不含），默认到当前尚未收盘的K线之前。
+        store (CandleStore): 本地缓存，默认使用 ./candle_cache。
+        page_limit (int): 每页请求的K线数量。
+    """
+    store = store or CandleStore()
+    exchange_id = getattr(exchange, "id", None) or type(exchange).__name__
+    step = timeframe_to_ms(timeframe)
+    start = to_milliseconds(start)
+    end = to_milliseconds(end)
+    if end is None:
+        end = int(time.time() * 1000) // step * step
+    if start is None:
+        raise ValueError("start is required for a backfill.")
+    start = start // step * step
+
+    for gap_start, gap_end in store.missing(exchange_id, ticker, timeframe, start, end):
+        try:
+            for page, covered_until in fetch_ohlcv_range(
+                exchange, ticker, timeframe, gap_start, gap_end, page_limit
+            ):
+                # 每页写完立刻记录覆盖区间，中断后重跑会从断点继续
+                store.append(exchange_id, ticker, timeframe, page)
+                store.mark_covered(
+                    exchange_id, ticker, timeframe, gap_start, covered_until
+                )
+        except Exception as e:
+            print(f"Error backfilling {ticker} {timeframe}: {e}")
+            break
+
+    # 补齐中间缺口后文件可能乱序，重写一次，避免之后每次读取都要排序
+    store.compact(exchange_id, ticker, timeframe)
+    return store.to_frame(exchange_id, ticker, timeframe, start, end)
+
+
+# 示例用法：python candle_store.py BTC/USDT 1m 2024-01-01
+if __name__ == "__main__":
+    import ccxt
+
+    ticker = sys.argv[1] if len(sys.argv) > 1 else "BTC/USDT"
+    timeframe = sys.argv[2] if len(sys.argv) > 2 else "1m"
+    start = sys.argv[3] if len(sys.argv) > 3 else "2024-01-01"
+
+    data = backfill_crypto_data(ccxt.binance(), ticker, timeframe, start)
+    print(data)
@@ -0,0 +1,256 @@
+import threading
+
+import matplotlib.dates as mdates
+import matplotlib.pyplot as plt
+import numpy as np
+from matplotlib.collections import PolyCollection
+
+import metrics
+
+# 渲染需要的列，快照时只复制这些列
+CHART_COLUMNS = ("close", "MA", "Upper Band", "Lower Band", "MACD", "Signal", "MACD_Hist")
+
+
+def take_snapshot(data):
+    """
+    复制一份绘图需要的数据，交给渲染线程使用。
+
+    CandleBuffer 返回的是底层数组的视图，下一次写入就会变化，所以跨线程传递前需要复制；
+    500 根K线的复制开销可以忽略。
+    """
+    if hasattr(data, "timestamps"):
+        timestamps = np.array(data.timestamps)
+    else:
+        timestamps = np.array(data.index.values)
+    snapshot = {column: np.array(data[column], dtype=np.float64) for column in CHART_COLUMNS}
+    snapshot["timestamp"] = timestamps
+    return snapshot
+
+
+class LatestSnapshot:
+    """
+    只保留最新一份数据的单槽“队列”。
+
+    数据循环调用 ``put`` 永远不会阻塞；渲染跟不上时旧的快照直接被覆盖，
+    渲染慢不会拖慢信号生成。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self._item = None
+
+    def put(self, item):
+        with self._lock:
+            self._item = item
+            self._ready.set()
+
+    def get(self, timeout=None):
+        """等待并取出最新的数据，超时返回 None。"""
+        if not self._ready.wait(timeout):
+            return None
+        with self._lock:
+            item, self._item = self._item, None
+            self._ready.clear()
+        return item
+
+
+class LiveChartRenderer:
+    """
+    用 blitting 增量刷新的实时K线图（价格 + 布林带 + MACD）。
+
+    所有会变化的图元（折线、布林带填充、MACD 柱、文字）都设置为 ``animated``，
+    只在坐标轴范围变化时（例如出现新K线、窗口滚动）才完整重绘一次并缓存背景，
+    其余时候（例如最后一根K线的价格更新）只恢复背景并重画这些图元。
+    K线数量变化时布林带填充和 MACD 柱会整体重建顶点，支持窗口增长和滚动。
+    """
+
+    def __init__(self, ticker, ma_window=20, figsize=(14, 10)):
+        self.fig, (self.ax1, self.ax2) = plt.subplots(
+            2, 1, figsize=figsize, gridspec_kw={"height_ratios": [2, 1], "hspace": 0.4}
+        )
+        ax1, ax2 = self.ax1, self.ax2
+
+        self.lines = {}
+        (self.lines["close_price"],) = ax1.plot(
+            [], [], label="Close Price", color="black", animated=True
+        )
+        (self.lines["ma"],) = ax1.plot(
+            [], [], label=f"MA {ma_window}", color="blue", animated=True
+        )
+        (self.lines["upper_band"],) = ax1.plot(
+            [], [], label="Upper Bollinger Band", color="red", animated=True
+        )
+        (self.lines["lower_band"],) = ax1.plot(
+            [], [], label="Lower Bollinger Band", color="green", animated=True
+        )
+        self.band = PolyCollection([], color="gray", alpha=0.3, animated=True)
+        ax1.add_collection(self.band)
+        ax1.set_title(f"{ticker} Price Chart with MA and Bollinger Bands")
+        ax1.set_xlabel("Time")
+        ax1.set_ylabel("Price")
+        ax1.legend(loc="best")
+        ax1.xaxis_date()
+
+        (self.lines["macd"],) = ax2.plot(
+            [], [], label="MACD", color="blue", animated=True
+        )
+        (self.lines["signal"],) = ax2.plot(
+            [], [], label="Signal Line", color="red", animated=True
+        )
+        self.hist = PolyCollection(
+            [], color="gray", label="MACD Histogram", animated=True
+        )
+        ax2.add_collection(self.hist)
+        ax2.set_title("MACD")
+        ax2.set_xlabel("Time")
+        ax2.legend(loc="best")
+        ax2.xaxis_date()
+
+        # 文字只创建一次，之后只更新内容
+        text_style = dict(
+            transform=ax1.transAxes,
+            fontsize=12,
+            verticalalignment="top",
+            bbox=dict(facecolor="white", alpha=0.5),  # 添加背景框以提高可见性
+            animated=True,
+        )
+        self.texts = [ax1.text(0.02, y, "", **text_style) for y in (0.95, 0.90, 0.85)]
+
+        plt.subplots_adjust(left=0.1, right=0.9, top=0.9, bottom=0.1, hspace=0.4)
+        self._background = None
+        self._limits = None
+        self.fig.canvas.mpl_connect("draw_event", self._on_draw)
+
+    @property
+    def _animated_artists(self):
+        # 填充区域先画，避免盖住折线
+        return [self.band, self.hist, *self.lines.values(), *self.texts]
+
+    def show(self):
+        plt.show(block=False)
+        self.fig.canvas.draw()
+
+    def _on_draw(self, event):
+        # 完整重绘（包括窗口缩放）之后重新缓存背景，并补画动态图元
+        self._background = self.fig.canvas.copy_from_bbox(self.fig.bbox)
+        for artist in self._animated_artists:
+            self.fig.draw_artist(artist)
+
+    @staticmethod
+    def _padded(low, high, pad=0.05):
+        span = (high - low) or abs(high) or 1.0
+        return low - span * pad, high + span * pad
+
+    def _needs_relimit(self, limits):
+        if self._limits is None:
+            return True
+        (x0, x1), (y0, y1), (h0, h1) = limits
+        (old_x0, old_x1), (old_y0, old_y1), (old_h0, old_h1) = self._limits
+        # y 轴带有余量，只有数据超出当前范围时才调整，避免每次更新都完整重绘
+        return (
+            (x0, x1) != (old_x0, old_x1)
+            or y0 < old_y0
+            or y1 > old_y1
+            or h0 < old_h0
+            or h1 > old_h1
+        )
+
+    @metrics.timed("chart_update", renderer="blit")
+    def update(self, snapshot, signal_info):
+        x = mdates.date2num(snapshot["timestamp"])
+        if len(x) == 0:
+            return
+        close = snapshot["close"]
+        upper, lower = snapshot["Upper Band"], snapshot["Lower Band"]
+        macd_hist = snapshot["MACD_Hist"]
+
+        self.lines["close_price"].set_data(x, close)
+        self.lines["ma"].set_data(x, snapshot["MA"])
+        self.lines["upper_band"].set_data(x, upper)
+        self.lines["lower_band"].set_data(x, lower)
+        self.lines["macd"].set_data(x, snapshot["MACD"])
+        self.lines["signal"].set_data(x, snapshot["Signal"])
+
+        # 布林带填充：上轨正序 + 下轨倒序组成一个多边形
+        valid = ~(np.isnan(upper) | np.isnan(lower))
+        if valid.any():
+            polygon = np.concatenate(
+                [
+                    np.column_stack([x[valid], upper[valid]]),
+                    np.column_stack([x[valid], lower[valid]])[::-1],
+                ]
+            )
+            self.band.set_verts([polygon])
+        else:
+            self.band.set_verts([])
+
+        # MACD 柱：每根K线一个矩形，K线数量变化时顶点数组随之变化
+        width = 0.8 * (np.median(np.diff(x)) if len(x) > 1 else 1 / 1440)
+        heights = np.nan_to_num(macd_hist)
+        left, right = x - width / 2, x + width / 2
+        zeros = np.zeros_like(x)
+        bars = np.stack(
+            [
+                np.column_stack([left, zeros]),
+                np.column_stack([left, heights]),
+                np.column_stack([right, heights]),
+                np.column_stack([right, zeros]),
+            ],
+            axis=1,
+        )
+        self.hist.set_verts(bars)
+
+        # K线不足 2 根时没有信号（signal_info 为 None），保留原来的文字
+        if signal_info is not None:
+            self.texts[0].set_text(f"Signal: {signal_info['signal']}")
+            self.texts[1].set_text(f"Current Price: {signal_info['current_price']}")
+            self.texts[2].set_text(
+                f"Leverage: {signal_info['leverage']}x"
+                if signal_info["signal"] in ["buy", "sell"]
+                else ""
+            )
+
+        price_values = np.concatenate([close, upper, lower])
+        macd_values = np.concatenate(
+            [snapshot["MACD"], snapshot["Signal"], macd_hist, [0.0]]
+        )
+        limits = (
+            (x[0] - width, x[-1] + width),
+            (np.nanmin(price_values), np.nanmax(price_values)),
+            (np.nanmin(macd_values), np.nanmax(macd_values)),
+        )
+        canvas = self.fig.canvas
+        if self._background is None or self._needs_relimit(limits):
+            (x0, x1), (y0, y1), (h0, h1) = limits
+            self.ax1.set_xlim(x0, x1)
+            self.ax2.set_xlim(x0, x1)
+            self.ax1.set_ylim(*self._padded(y0, y1))
+            self.ax2.set_ylim(*self._padded(h0, h1))
+            self._limits = (
+                (x0, x1),
+                self.ax1.get_ylim(),
+                self.ax2.get_ylim(),
+            )
+            # 完整重绘会触发 _on_draw，重新缓存背景并画出动态图元
+            canvas.draw()
+        else:
+            canvas.restore_region(self._background)
+            for artist in self._animated_artists:
+                self.fig.draw_artist(artist)
+            canvas.blit(self.fig.bbox)
+        canvas.flush_events()
+
+    def run(self, source, stop_event, poll_interval=0.1):
+        """
+        在主线程中运行渲染循环，直到 ``stop_event`` 被设置或窗口被关闭。
+
+        ``source`` 是 LatestSnapshot，其中的元素为 ``(snapshot, signal_info)``。
+        """
+        self.show()
+        while not stop_event.is_set() and plt.fignum_exists(self.fig.number):
+            item = source.get(timeout=poll_interval)
+            if item is not None:
+                self.update(*item)
+            # 处理窗口事件，保持界面可以响应
+            self.fig.canvas.start_event_loop(0.01)
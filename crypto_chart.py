@@ -1,17 +1,12 @@
-from indicator_utils import (
-    calculate_moving_average,
-    calculate_bollinger_bands,
-    calculate_macd,
-    generate_signals,
-    leverage_suggestion,
-)
+import metrics
+from candle_buffer import OHLCV_COLUMNS
+from crypto_poller import SymbolPipeline
+from chart_renderer import LatestSnapshot, LiveChartRenderer, take_snapshot
 
 try:
     import ccxt
     import pandas as pd
-    import matplotlib.pyplot as plt
-    from datetime import datetime
-    import time
+    import threading
 except ImportError as e:
     print(f"Import Error: {e}")
     import subprocess
@@ -25,10 +20,11 @@ except ImportError as e:
 # 获取加密货币数据
 def get_crypto_data(exchange, ticker, timeframe="1m", limit=500, since=None):
     try:
-        if since:
-            ohlcv = exchange.fetch_ohlcv(ticker, timeframe=timeframe, since=since)
-        else:
-            ohlcv = exchange.fetch_ohlcv(ticker, timeframe=timeframe, limit=limit)
+        with metrics.span("ccxt_fetch_ohlcv", symbol=ticker):
+            if since:
+                ohlcv = exchange.fetch_ohlcv(ticker, timeframe=timeframe, since=since)
+            else:
+                ohlcv = exchange.fetch_ohlcv(ticker, timeframe=timeframe, limit=limit)
         if ohlcv:
             data = pd.DataFrame(
                 ohlcv, columns=["timestamp", "open", "high", "low", "close", "volume"]
@@ -41,119 +37,6 @@ def get_crypto_data(exchange, ticker, timeframe="1m", limit=500, since=None):
         return None
 
 
-# 绘制图表
-def plot_crypto_data(data, ticker, ax1, ax2, lines, signal_info):
-    # 清除旧的文本注释
-    ax1.texts.clear()
-
-    # 更新价格和布林带数据
-    lines["close_price"].set_data(data.index.values, data["close"].values)
-    lines["ma"].set_data(data.index.values, data["MA"].values)
-    lines["upper_band"].set_data(data.index.values, data["Upper Band"].values)
-    lines["lower_band"].set_data(data.index.values, data["Lower Band"].values)
-    ax1.set_xlim(data.index.values.min(), data.index.values.max())
-    ax1.set_ylim(data["close"].values.min(), data["close"].values.max())
-
-    # 更新MACD数据
-    lines["macd"].set_data(data.index.values, data["MACD"].values)
-    lines["signal"].set_data(data.index.values, data["Signal"].values)
-    for rect, h in zip(lines["macd_hist"], data["MACD_Hist"].values):
-        rect.set_height(h)
-    ax2.set_xlim(data.index.values.min(), data.index.values.max())
-    ax2.set_ylim(data["MACD_Hist"].values.min(), data["MACD_Hist"].values.max())
-
-    # 重绘图表
-    plt.draw()
-    plt.pause(1)
-
-    # 显示交易信号、止盈止损点和杠杆建议
-    ax1.text(
-        0.02,
-        0.95,
-        f"Signal: {signal_info['signal']}",
-        transform=ax1.transAxes,
-        fontsize=12,
-        verticalalignment="top",
-        bbox=dict(facecolor="white", alpha=0.5),  # 添加背景框以提高可见性
-    )
-    ax1.text(
-        0.02,
-        0.90,
-        f"Current Price: {signal_info['current_price']}",
-        transform=ax1.transAxes,
-        fontsize=12,
-        verticalalignment="top",
-        bbox=dict(facecolor="white", alpha=0.5),  # 添加背景框以提高可见性
-    )
-    if signal_info["signal"] in ["buy", "sell"]:
-        ax1.text(
-            0.02,
-            0.85,
-            f"Leverage: {signal_info['leverage']}x",
-            transform=ax1.transAxes,
-            fontsize=12,
-            verticalalignment="top",
-            bbox=dict(facecolor="white", alpha=0.5),  # 添加背景框以提高可见性
-        )
-
-
-def initialize_plot(data, ticker):
-    fig, (ax1, ax2) = plt.subplots(
-        2, 1, figsize=(14, 10), gridspec_kw={"height_ratios": [2, 1], "hspace": 0.4}
-    )
-
-    lines = {}
-    (lines["close_price"],) = ax1.plot(
-        data.index.values, data["close"].values, label="Close Price", color="black"
-    )
-    (lines["ma"],) = ax1.plot(
-        data.index.values, data["MA"].values, label=f"MA 20", color="blue"
-    )
-    (lines["upper_band"],) = ax1.plot(
-        data.index.values,
-        data["Upper Band"].values,
-        label="Upper Bollinger Band",
-        color="red",
-    )
-    (lines["lower_band"],) = ax1.plot(
-        data.index.values,
-        data["Lower Band"].values,
-        label="Lower Bollinger Band",
-        color="green",
-    )
-    ax1.fill_between(
-        data.index.values,
-        data["Upper Band"].values,
-        data["Lower Band"].values,
-        color="gray",
-        alpha=0.3,
-    )
-    ax1.set_title(f"{ticker} Price Chart with MA and Bollinger Bands")
-    ax1.set_xlabel("Time")
-    ax1.set_ylabel("Price")
-    ax1.legend(loc="best")
-
-    (lines["macd"],) = ax2.plot(
-        data.index.values, data["MACD"].values, label="MACD", color="blue"
-    )
-    (lines["signal"],) = ax2.plot(
-        data.index.values, data["Signal"].values, label="Signal Line", color="red"
-    )
-    lines["macd_hist"] = ax2.bar(
-        data.index.values,
-        data["MACD_Hist"].values,
-        label="MACD Histogram",
-        color="gray",
-    )
-    ax2.set_title("MACD")
-    ax2.set_xlabel("Time")
-    ax2.legend(loc="best")
-
-    plt.subplots_adjust(left=0.1, right=0.9, top=0.9, bottom=0.1, hspace=0.4)
-    plt.show()
-    return fig, ax1, ax2, lines
-
-
 # 主函数
 if __name__ == "__main__":
     exchange = ccxt.binance()  # 使用Binance交易所
@@ -162,80 +45,81 @@ if __name__ == "__main__":
     limit = 500  # 500
     principal = 10  # 本金金额（USD）
     should_plot = True  # 控制是否绘制图表
-
-    if should_plot:
-        plt.ion()  # 开启交互模式
-
-    # 初始绘图
+    # 指标窗口，可以用 param_sweep.py 搜索合适的取值
+    indicator_windows = {
+        "ma_window": 20,
+        "bb_window": 20,
+        "short_window": 12,
+        "long_window": 26,
+        "signal_window": 9,
+    }
+
+    # 初始数据
     crypto_data = get_crypto_data(exchange, ticker, timeframe, limit)
     if crypto_data is not None:
-        crypto_data["MA"] = calculate_moving_average(crypto_data, 20)
-        upper_band, lower_band = calculate_bollinger_bands(crypto_data, 20)
-        crypto_data["Upper Band"] = upper_band
-        crypto_data["Lower Band"] = lower_band
-        crypto_data["MACD"], crypto_data["Signal"], crypto_data["MACD_Hist"] = (
-            calculate_macd(crypto_data)
+        # 单个交易对的流水线：固定容量的K线缓冲区 + 流式指标（MA、布林带、MACD），
+        # 用历史数据初始化后每根新K线只做 O(1) 的增量更新
+        pipeline = SymbolPipeline(
+            ticker, capacity=limit, principal=principal, **indicator_windows
         )
-
-        if should_plot:
-            fig, ax1, ax2, lines = initialize_plot(crypto_data, ticker)
-
-        while True:
-            try:
-                # 获取加密货币数据，为了避免获取重复数据，加一毫秒
-                last_timestamp = int(crypto_data.index[-1].timestamp() * 1000) + 1
-                new_crypto_data = get_crypto_data(
-                    exchange, ticker, timeframe="1m", since=last_timestamp
+        pipeline.process(crypto_data[list(OHLCV_COLUMNS)].itertuples())
+        candles = pipeline.candles
+
+        # 图表在主线程渲染，数据循环在后台线程运行，二者通过只保留最新数据的单槽传递，
+        # 渲染再慢也不会推迟信号生成
+        chart_feed = LatestSnapshot()
+        stop_event = threading.Event()
+
+        def poll():
+            # 从最后一根K线开始获取，最后一根（可能尚未收盘）会被原地更新
+            new_crypto_data = get_crypto_data(
+                exchange, ticker, timeframe=timeframe, since=pipeline.since
+            )
+            if new_crypto_data is None or new_crypto_data.empty:
+                return
+            pipeline.process(new_crypto_data[list(OHLCV_COLUMNS)].itertuples())
+
+            # 生成交易信号
+            signal_info = pipeline.signal_info()
+            if should_plot:
+                chart_feed.put((take_snapshot(candles), signal_info))
+            elif signal_info is not None:
+                # 不画图时输出交易信号、当前价格和杠杆建议
+                print(
+                    f"{ticker} signal: {signal_info['signal']}, "
+                    f"price: {signal_info['current_price']}, "
+                    f"leverage: {signal_info['leverage']}x"
                 )
-                if new_crypto_data is not None and not new_crypto_data.empty:
-                    # 合并新数据到现有数据
-                    crypto_data = pd.concat([crypto_data, new_crypto_data])
-                    crypto_data = crypto_data[
-                        ~crypto_data.index.duplicated(keep="last")
-                    ]  # 移除重复数据
 
-                    # 计算指标，只计算新数据部分
-                    new_indices = new_crypto_data.index
-                    crypto_data.loc[new_indices, "MA"] = calculate_moving_average(
-                        crypto_data, 20
-                    ).loc[new_indices]
-                    upper_band, lower_band = calculate_bollinger_bands(crypto_data, 20)
-                    crypto_data.loc[new_indices, "Upper Band"] = upper_band.loc[
-                        new_indices
-                    ]
-                    crypto_data.loc[new_indices, "Lower Band"] = lower_band.loc[
-                        new_indices
-                    ]
-                    macd, signal, macd_hist = calculate_macd(crypto_data)
-                    crypto_data.loc[new_indices, "MACD"] = macd.loc[new_indices]
-                    crypto_data.loc[new_indices, "Signal"] = signal.loc[new_indices]
-                    crypto_data.loc[new_indices, "MACD_Hist"] = macd_hist.loc[
-                        new_indices
-                    ]
+        def data_loop():
+            failures = 0
+            while not stop_event.is_set():
+                try:
+                    poll()
+                    failures = 0
+                except Exception as e:
+                    # 出错时线程不退出，按指数退避重试，图表保持上一次的数据
+                    failures += 1
+                    print(f"Error in data loop ({failures} in a row): {e!r}")
+                # 每分钟更新一次数据，连续出错时最多等 10 分钟
+                stop_event.wait(min(600, 60 * 2 ** max(0, failures - 1)))
 
-                    # 生成交易信号
-                    signal = generate_signals(crypto_data)
-                    leverage = leverage_suggestion(principal, signal)
-                    current_price = crypto_data["close"].iloc[-1]  # 获取当前价格
-
-                    # 输出交易信号、止盈止损点和杠杆建议
-                    signal_info = {
-                        "signal": signal,
-                        "leverage": leverage,
-                        "current_price": current_price,  # 添加当前价格
-                    }
-                    print("signal_info", signal_info)
-
-                    # 更新图表
-                    if should_plot:
-                        plot_crypto_data(
-                            crypto_data, ticker, ax1, ax2, lines, signal_info
-                        )
-
-                # 每分钟更新一次数据
-                time.sleep(60)
-            except KeyboardInterrupt:
-                print("Program interrupted.")
-                break
+        if should_plot:
+            chart_feed.put((take_snapshot(candles), pipeline.signal_info()))
+        data_thread = threading.Thread(target=data_loop, daemon=True)
+        data_thread.start()
+        try:
+            if should_plot:
+                renderer = LiveChartRenderer(ticker, indicator_windows["ma_window"])
+                renderer.run(chart_feed, stop_event)
+            else:
+                while data_thread.is_alive():
+                    data_thread.join(timeout=1)
+        except KeyboardInterrupt:
+            print("Program interrupted.")
+        finally:
+            stop_event.set()
+            # 设置了 METRICS_EXPORT 时导出本次运行的耗时统计
+            metrics.export_metrics()
     else:
         print("Failed to fetch initial data.")
@@ -0,0 +1,247 @@
+import asyncio
+import inspect
+import sys
+
+import numpy as np
+
+import metrics
+from candle_buffer import CandleBuffer
+from indicator_utils import StreamingIndicators, generate_signals, leverage_suggestion
+
+
+class TokenBucket:
+    """
+    asyncio 令牌桶，多个协程共享同一个交易所的请求频率限制。
+
+    Args:
+        rate (float): 每秒补充的令牌数。
+        capacity (float): 桶容量，即允许的最大突发请求数。
+    """
+
+    def __init__(self, rate, capacity=1):
+        if rate <= 0:
+            raise ValueError("rate must be positive.")
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = None
+        # asyncio.Lock 按先来先得唤醒等待者，保证排队公平
+        self._lock = asyncio.Lock()
+
+    @classmethod
+    def for_exchange(cls, exchange, burst=1):
+        """按 ccxt 的 ``rateLimit``（两次请求之间的毫秒数）创建令牌桶。"""
+        rate_limit = getattr(exchange, "rateLimit", None) or 1000
+        return cls(rate=1000 / rate_limit, capacity=burst)
+
+    def _refill(self, now):
+        if self._updated is not None:
+            elapsed = now - self._updated
+            self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+        self._updated = now
+
+    async def acquire(self, tokens=1):
+        loop = asyncio.get_running_loop()
+        async with self._lock:
+            self._refill(loop.time())
+            if self._tokens < tokens:
+                await asyncio.sleep((tokens - self._tokens) / self.rate)
+                self._refill(loop.time())
+            self._tokens -= tokens
+
+
+class SymbolPipeline:
+    """
+    单个交易对的指标/信号流水线：K线缓冲区 + 流式指标 + 交易信号。
+
+    ``process`` 接收 ``(timestamp, open, high, low, close, volume)`` 形式的行，
+    既可以是 ccxt ``fetch_ohlcv`` 的原始结果（毫秒时间戳），
+    也可以是 ``get_crypto_data`` 返回的 DataFrame 的 ``itertuples()``。
+    """
+
+    def __init__(self, symbol, capacity=500, principal=10, **indicator_windows):
+        self.symbol = symbol
+        self.principal = principal
+        self.candles = CandleBuffer(capacity)
+        self.indicators = StreamingIndicators(**indicator_windows)
+
+    @property
+    def since(self):
+        """下一次请求的起始时间（毫秒），从最后一根K线开始以便更新未收盘的K线。"""
+        if self.candles.last_timestamp is None:
+            return None
+        return int(self.candles.last_timestamp.astype("int64"))
+
+    def process(self, rows):
+        """写入新K线并更新指标，返回本次追加或更新的K线数量。"""
+        with metrics.span("indicator", function="SymbolPipeline.process"):
+            return self._process(rows)
+
+    def _process(self, rows):
+        changed = 0
+        for timestamp, open_, high, low, close, volume in rows:
+            timestamp = np.datetime64(timestamp, "ms")
+            last = self.candles.last_timestamp
+            if last is not None and timestamp == last:
+                values = self.indicators.revise(close)
+            elif last is None or timestamp > last:
+                values = self.indicators.update(close)
+            else:
+                continue
+            self.candles.upsert(
+                timestamp,
+                open=open_,
+                high=high,
+                low=low,
+                close=close,
+                volume=volume,
+                **values,
+            )
+            changed += 1
+        return changed
+
+    def signal_info(self):
+        if len(self.candles) < 2:
+            return None
+        signal = generate_signals(self.candles)
+        return {
+            "signal": signal,
+            "leverage": leverage_suggestion(self.principal, signal),
+            "current_price": self.candles["close"][-1],
+        }
+
+
+class CryptoPoller:
+    """
+    并发轮询多个交易对的K线，并把新数据送入各自的 SymbolPipeline。
+
+    ``exchange`` 可以是 ``ccxt.async_support`` 中的交易所对象，也可以是任何提供
+    ``async fetch_ohlcv(symbol, timeframe=..., since=..., limit=...)`` 的对象
+    （便于用本地的假交易所测试）。所有请求共享同一个令牌桶限速。
+
+    Args:
+        exchange: 异步交易所对象。
+        symbols (list): 交易对列表，例如 ["BTC/USDT", "ETH/USDT"]。
+        timeframe (str): K线周期。
+        limit (int): 初始化时每个交易对获取的K线数量，同时也是缓冲区容量。
+        interval (float): 两轮轮询之间的秒数。
+        bucket (TokenBucket): 共享令牌桶，默认按交易所的 rateLimit 创建。
+        on_signal (callable): 每个交易对有新K线时调用 ``on_signal(symbol, signal_info)``，
+            可以是普通函数或协程函数。
+        backoff (float): 请求失败后暂停该交易对的初始秒数，连续失败时翻倍。
+        max_backoff (float): 暂停时间的上限（秒）。
+    """
+
+    def __init__(
+        self,
+        exchange,
+        symbols,
+        timeframe="1m",
+        limit=500,
+        interval=60,
+        bucket=None,
+        on_signal=None,
+        principal=10,
+        backoff=1.0,
+        max_backoff=300.0,
+    ):
+        self.exchange = exchange
+        self.timeframe = timeframe
+        self.limit = limit
+        self.interval = interval
+        self.bucket = bucket or TokenBucket.for_exchange(exchange)
+        self.on_signal = on_signal
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        # 连续失败次数，以及暂停到什么时候（事件循环时间）
+        self._failures = {}
+        self._retry_at = {}
+        self.pipelines = {
+            symbol: SymbolPipeline(symbol, capacity=limit, principal=principal)
+            for symbol in symbols
+        }
+
+    async def fetch_ohlcv(self, symbol, since=None):
+        await self.bucket.acquire()
+        try:
+            with metrics.span("ccxt_fetch_ohlcv", symbol=symbol):
+                if since:
+                    ohlcv = await self.exchange.fetch_ohlcv(
+                        symbol, timeframe=self.timeframe, since=since
+                    )
+                else:
+                    ohlcv = await self.exchange.fetch_ohlcv(
+                        symbol, timeframe=self.timeframe, limit=self.limit
+                    )
+        except Exception as e:
+            # 失败的交易对按指数退避暂停，不占用其他交易对的请求额度
+            failures = self._failures.get(symbol, 0) + 1
+            delay = min(self.max_backoff, self.backoff * 2 ** (failures - 1))
+            self._failures[symbol] = failures
+            self._retry_at[symbol] = asyncio.get_running_loop().time() + delay
+            print(f"Error fetching data for {symbol}: {e} (retrying in {delay:.1f}s)")
+            return None
+        self._failures.pop(symbol, None)
+        self._retry_at.pop(symbol, None)
+        return ohlcv
+
+    def backing_off(self, symbol):
+        """该交易对是否还在失败后的暂停期内。"""
+        retry_at = self._retry_at.get(symbol)
+        return retry_at is not None and asyncio.get_running_loop().time() < retry_at
+
+    async def _poll_symbol(self, pipeline):
+        if self.backing_off(pipeline.symbol):
+            return None
+        ohlcv = await self.fetch_ohlcv(pipeline.symbol, since=pipeline.since)
+        if not ohlcv or not pipeline.process(ohlcv):
+            return None
+        signal_info = pipeline.signal_info()
+        if signal_info is not None and self.on_signal is not None:
+            result = self.on_signal(pipeline.symbol, signal_info)
+            if inspect.isawaitable(result):
+                await result
+        return signal_info
+
+    async def poll_once(self):
+        """对所有交易对并发请求一轮，返回 {symbol: signal_info}（没有新数据的为 None）。"""
+        pipelines = list(self.pipelines.values())
+        results = await asyncio.gather(*(self._poll_symbol(p) for p in pipelines))
+        return {p.symbol: result for p, result in zip(pipelines, results)}
+
+    async def run(self, iterations=None):
+        """持续轮询；``iterations`` 为 None 时一直运行直到任务被取消。"""
+        count = 0
+        while iterations is None or count < iterations:
+            started = asyncio.get_running_loop().time()
+            await self.poll_once()
+            count += 1
+            if iterations is not None and count >= iterations:
+                break
+            elapsed = asyncio.get_running_loop().time() - started
+            await asyncio.sleep(max(0.0, self.interval - elapsed))
+
+
+def _print_signal(symbol, signal_info):
+    print(symbol, "signal_info", signal_info)
+
+
+async def _main(symbols):
+    import ccxt.async_support as ccxt_async
+
+    # 由共享令牌桶负责限速，关闭 ccxt 自带的逐实例限速
+    exchange = ccxt_async.binance({"enableRateLimit": False})
+    try:
+        poller = CryptoPoller(exchange, symbols, on_signal=_print_signal)
+        await poller.run()
+    finally:
+        await exchange.close()
+
+
+# 主函数
+if __name__ == "__main__":
+    symbols = sys.argv[1:] or ["BTC/USDT", "ETH/USDT"]
+    try:
+        asyncio.run(_main(symbols))
+    except KeyboardInterrupt:
+        print("Program interrupted.")
@@ -1,35 +1,51 @@
 from ask_AI import ask_AI
+from article_store import get_article_fetcher
+from price_cache import cached_price_history
+from prompt_builder import PromptBuilder
+from ticker_data import get_ticker_data
+import metrics
 
+import pandas as pd
 import yfinance as yf
 from datetime import datetime, timedelta
-import requests
-from bs4 import BeautifulSoup
+from concurrent.futures import Future
 import ast
 import json
+import os
+import threading
+import time
 
 
+@metrics.timed("get_article_text")
 def get_article_text(url):
-    try:
-        response = requests.get(url)
-        soup = BeautifulSoup(response.content, "html.parser")
-        article_text = " ".join([p.get_text() for p in soup.find_all("p")])
-        return article_text
-    except:
-        return "Error retrieving article text."
+    # Downloaded once per run and stored on disk; see article_store.py
+    return get_article_fetcher().fetch(url)
 
 
-def get_comps_analysis(ticker, hist_data, balance_sheet, financials, news):
-    system_prompt = f"You are a financial analyst assistant. Analyze the given data for {ticker} and suggest a few comparable companies to consider. Do so in a Python-parseable list."
+def get_article_texts(news):
+    # Fetch all article links concurrently, returning {url: text}
+    return get_article_fetcher().fetch_many(article["link"] for article in news)
 
-    news_text = ""
 
-    for article in news:
-        article_text = get_article_text(article["link"])
-        news_text = (
-            news_text + f"\n\n---\n\nTitle: {article['title']}\nText: {article_text}"
-        )
+def get_comps_analysis(ticker, hist_data, balance_sheet, financials, news):
+    system_prompt = f"You are a financial analyst assistant. Analyze the given data for {ticker} and suggest a few comparable companies to consider. Do so in a Python-parseable list."
 
-    messages = f"Historical price data:\n{hist_data.tail().to_string()}\n\nBalance Sheet:\n{balance_sheet.to_string()}\n\nFinancial Statements:\n{financials.to_string()}\n\nNews articles:\n{news_text.strip()}\n\n----\n\nNow, suggest a few comparable companies to consider, in a Python-parseable list. Return nothing but the list. Make sure the companies are in the form of their tickers."
+    article_texts = get_article_texts(news)
+    articles = [
+        (f"Title: {article['title']}", article_texts[article["link"]])
+        for article in news
+    ]
+
+    # Frames and articles are trimmed to fit the prompt token budget
+    builder = PromptBuilder()
+    builder.add_table("Historical price data", hist_data.tail())
+    builder.add_frame("Balance Sheet", balance_sheet)
+    builder.add_frame("Financial Statements", financials)
+    builder.add_articles("News articles", articles)
+    builder.add_fixed(
+        "----\n\nNow, suggest a few comparable companies to consider, in a Python-parseable list. Return nothing but the list. Make sure the companies are in the form of their tickers."
+    )
+    messages = builder.build()
 
     response_text = ask_AI(system_prompt, messages)
     return ast.literal_eval(response_text)
@@ -38,7 +54,17 @@ def get_comps_analysis(ticker, hist_data, balance_sheet, financials, news):
 def compare_companies(main_ticker, main_data, comp_ticker, comp_data):
     system_prompt = f"You are a financial analyst assistant. Compare the data of {main_ticker} against {comp_ticker} and provide a detailed comparison, like a world-class analyst would. Be measured and discerning. Truly think about the positives and negatives of each company. Be sure of your analysis. You are a skeptical investor."
 
-    messages = f"Data for {main_ticker}:\n\nHistorical price data:\n{main_data['hist_data'].tail().to_string()}\n\nBalance Sheet:\n{main_data['balance_sheet'].to_string()}\n\nFinancial Statements:\n{main_data['financials'].to_string()}\n\n----\n\nData for {comp_ticker}:\n\nHistorical price data:\n{comp_data['hist_data'].tail().to_string()}\n\nBalance Sheet:\n{comp_data['balance_sheet'].to_string()}\n\nFinancial Statements:\n{comp_data['financials'].to_string()}\n\n----\n\nNow, provide a detailed comparison of {main_ticker} against {comp_ticker}. Explain your thinking very clearly."
+    builder = PromptBuilder()
+    for ticker, data in ((main_ticker, main_data), (comp_ticker, comp_data)):
+        builder.add_fixed(f"Data for {ticker}:")
+        builder.add_table("Historical price data", data["hist_data"].tail())
+        builder.add_frame("Balance Sheet", data["balance_sheet"])
+        builder.add_frame("Financial Statements", data["financials"])
+        builder.add_fixed("----")
+    builder.add_fixed(
+        f"Now, provide a detailed comparison of {main_ticker} against {comp_ticker}. Explain your thinking very clearly."
+    )
+    messages = builder.build()
 
     response_text = ask_AI(system_prompt, messages, max_tokens=3000)
     return response_text
@@ -47,43 +73,88 @@ def compare_companies(main_ticker, main_data, comp_ticker, comp_data):
 def get_sentiment_analysis(ticker, news):
     system_prompt = f"You are a sentiment analysis assistant. Analyze the sentiment of the given news articles for {ticker} and provide a summary of the overall sentiment and any notable changes over time. Be measured and discerning. You are a skeptical investor."
 
-    news_text = ""
+    article_texts = get_article_texts(news)
+    articles = []
     for article in news:
-        article_text = get_article_text(article["link"])
         timestamp = datetime.fromtimestamp(article["providerPublishTime"]).strftime(
             "%Y-%m-%d"
         )
-        news_text += f"\n\n---\n\nDate: {timestamp}\nTitle: {article['title']}\nText: {article_text}"
+        articles.append(
+            (f"Date: {timestamp}\nTitle: {article['title']}", article_texts[article["link"]])
+        )
 
-    messages = f"News articles for {ticker}:\n{news_text}\n\n----\n\nProvide a summary of the overall sentiment and any notable changes over time."
+    builder = PromptBuilder()
+    builder.add_articles(f"News articles for {ticker}", articles)
+    builder.add_fixed(
+        "----\n\nProvide a summary of the overall sentiment and any notable changes over time."
+    )
+    messages = builder.build()
 
     response_text = ask_AI(system_prompt, messages)
     return response_text
 
 
-def get_industry_analysis(ticker):
-    stock = yf.Ticker(ticker)
-    industry = stock.info["industry"]
-    sector = stock.info["sector"]
+# Industry analyses depend only on (industry, sector), so tickers sharing a
+# pair share one completion per run: {(industry, sector): Future}
+_industry_analyses = {}
+_industry_lock = threading.Lock()
+
+# How long a persisted industry analysis stays fresh in the LLM cache (seconds)
+INDUSTRY_ANALYSIS_TTL = float(os.getenv("INDUSTRY_ANALYSIS_TTL", str(7 * 86400)))
+
 
+def _analyze_industry(industry, sector):
     system_prompt = f"You are an industry analysis assistant. Provide an analysis of the {industry} industry and {sector} sector, including trends, growth prospects, regulatory changes, and competitive landscape. Be measured and discerning. Truly think about the positives and negatives of the stock. Be sure of your analysis. You are a skeptical investor."
 
     messages = f"Provide an analysis of the {industry} industry and {sector} sector."
 
-    response_text = ask_AI(system_prompt, messages)
+    response_text = ask_AI(system_prompt, messages, cache_ttl=INDUSTRY_ANALYSIS_TTL)
+    return response_text
+
+
+def get_industry_analysis(ticker):
+    info = get_ticker_data(ticker).info
+    key = (info["industry"], info["sector"])
+
+    # Concurrent callers for the same pair wait on the first caller's request
+    with _industry_lock:
+        future = _industry_analyses.get(key)
+        owner = future is None
+        if owner:
+            future = Future()
+            _industry_analyses[key] = future
+    if not owner:
+        return future.result()
+
+    try:
+        response_text = _analyze_industry(*key)
+    except Exception as e:
+        with _industry_lock:
+            del _industry_analyses[key]
+        future.set_exception(e)
+        raise
+    if response_text is None:
+        # Don't memoize failures; the next caller retries
+        with _industry_lock:
+            del _industry_analyses[key]
+    future.set_result(response_text)
     return response_text
 
 
 def get_final_analysis(
-    ticker, comparisons, sentiment_analysis, analyst_ratings, industry_analysis
+    ticker,
+    comparisons,
+    sentiment_analysis,
+    analyst_ratings,
+    industry_analysis,
+    on_token=None,
 ):
     system_prompt = f"You are a financial analyst providing a final investment recommendation for {ticker} based on the given data and analyses. Be measured and discerning. Truly think about the positives and negatives of the stock. Be sure of your analysis. You are a skeptical investor."
 
     messages = f"Ticker: {ticker}\n\nComparative Analysis:\n{json.dumps(comparisons, indent=2)}\n\nSentiment Analysis:\n{sentiment_analysis}\n\nAnalyst Ratings:\n{analyst_ratings}\n\nIndustry Analysis:\n{industry_analysis}\n\nBased on the provided data and analyses, please provide a comprehensive investment analysis and recommendation for {ticker}. Consider the company's financial strength, growth prospects, competitive position, and potential risks. Provide a clear and concise recommendation on whether to buy, hold, or sell the stock, along with supporting rationale."
 
-    response_text = ask_AI(
-        system_prompt, messages, model="claude-3-opus-20240229", max_tokens=3000
-    )
+    # Pass on_token to stream the analysis as it is generated
+    response_text = ask_AI(system_prompt, messages, max_tokens=3000, on_token=on_token)
     return response_text
 
 
@@ -104,23 +175,25 @@ def generate_ticker_ideas(industry):
     return [ticker.strip() for ticker in ticker_list]
 
 
-def rank_companies(industry, analyses, prices):
-    system_prompt = f"You are a financial analyst providing a ranking of companies in the {industry} industry based on their investment potential. Be discerning and sharp. Truly think about whether a stock is valuable or not. You are a skeptical investor."
+def rank_companies(industry, analyses, prices, on_token=None, universe=None):
+    # Screened runs rank tickers from a universe file rather than one industry
+    group = f"the {universe} universe" if universe else f"the {industry} industry"
+    scope = f"Universe: {universe}" if universe else f"Industry: {industry}"
+    system_prompt = f"You are a financial analyst providing a ranking of companies in {group} based on their investment potential. Be discerning and sharp. Truly think about whether a stock is valuable or not. You are a skeptical investor."
 
     analysis_text = "\n\n".join(
         f"Ticker: {ticker}\nCurrent Price: {prices.get(ticker, 'N/A')}\nAnalysis:\n{analysis}"
         for ticker, analysis in analyses.items()
     )
 
-    messages = f"Industry: {industry}\n\nCompany Analyses:\n{analysis_text}\n\nBased on the provided analyses, please rank the companies from most attractive to least attractive for investment. Provide a brief rationale for your ranking. In each rationale, include the current price (if available) and a price target."
+    messages = f"{scope}\n\nCompany Analyses:\n{analysis_text}\n\nBased on the provided analyses, please rank the companies from most attractive to least attractive for investment. Provide a brief rationale for your ranking. In each rationale, include the current price (if available) and a price target."
 
-    response_text = ask_AI(system_prompt, messages, max_tokens=3000)
+    response_text = ask_AI(system_prompt, messages, max_tokens=3000, on_token=on_token)
     return response_text
 
 
 def get_analyst_ratings(ticker):
-    stock = yf.Ticker(ticker)
-    recommendations = stock.recommendations
+    recommendations = get_ticker_data(ticker).recommendations
     if recommendations is None or recommendations.empty:
         return "No analyst ratings available."
 
@@ -135,14 +208,24 @@ def get_analyst_ratings(ticker):
     return rating_summary
 
 
-def get_stock_data(ticker, years):
+def get_stock_data(ticker, years, use_cache=True):
     end_date = datetime.now().date()
     start_date = end_date - timedelta(days=years * 365)
 
-    stock = yf.Ticker(ticker)
-
-    # Retrieve historical price data
-    hist_data = stock.history(start=start_date, end=end_date)
+    # Shared per-run ticker data: each dataset is requested at most once
+    stock = get_ticker_data(ticker)
+
+    # Retrieve historical price data (only missing dates are downloaded when cached)
+    if use_cache:
+        hist_data = cached_price_history(
+            "history",
+            ticker,
+            start_date,
+            end_date,
+            lambda start, end: stock.history(start=start, end=end),
+        )
+    else:
+        hist_data = stock.history(start=start_date, end=end_date)
 
     # Retrieve balance sheet
     balance_sheet = stock.balance_sheet
@@ -156,10 +239,72 @@ def get_stock_data(ticker, years):
     return hist_data, balance_sheet, financials, news
 
 
+# Short-lived in-memory quote cache: {ticker: (price, fetched_at)}
+QUOTE_CACHE_TTL = float(os.getenv("QUOTE_CACHE_TTL", "60"))
+_quote_cache = {}
+_quote_lock = threading.Lock()
+
+
+def _last_closes(data, tickers):
+    # yf.download(group_by="column") returns (field, ticker) columns, but a
+    # single ticker may come back with flat field columns instead
+    if data is None or data.empty or "Close" not in data.columns.get_level_values(0):
+        return {}
+    closes = data["Close"]
+    if isinstance(closes, pd.Series):
+        if len(tickers) != 1:
+            return {}
+        closes = closes.to_frame(tickers[0])
+    prices = {}
+    for ticker in tickers:
+        if ticker not in closes.columns:
+            continue
+        values = closes[ticker].dropna()
+        if not values.empty:
+            prices[ticker] = float(values.iloc[-1])
+    return prices
+
+
+def get_current_prices(tickers, max_age=None):
+    """
+    Return {ticker: last price} for all tickers using one multi-symbol download.
+
+    Quotes fetched within the last ``max_age`` seconds (QUOTE_CACHE_TTL by
+    default) are served from memory. Tickers without price data are omitted.
+    """
+    max_age = QUOTE_CACHE_TTL if max_age is None else max_age
+    tickers = list(dict.fromkeys(tickers))
+    now = time.time()
+    with _quote_lock:
+        prices = {
+            ticker: _quote_cache[ticker][0]
+            for ticker in tickers
+            if ticker in _quote_cache and now - _quote_cache[ticker][1] <= max_age
+        }
+    missing = [ticker for ticker in tickers if ticker not in prices]
+    if missing:
+        with metrics.span("yfinance_request", dataset="download"):
+            data = yf.download(
+                missing,
+                period="1d",
+                interval="1m",
+                group_by="column",
+                progress=False,
+                threads=True,
+            )
+        fetched = _last_closes(data, missing)
+        with _quote_lock:
+            for ticker, price in fetched.items():
+                _quote_cache[ticker] = (price, now)
+        prices.update(fetched)
+    return prices
+
+
 def get_current_price(ticker):
-    stock = yf.Ticker(ticker)
-    data = stock.history(period="1d", interval="1m")
-    return data["Close"][-1]
+    prices = get_current_prices([ticker])
+    if ticker not in prices:
+        raise ValueError(f"No price data available for {ticker}")
+    return prices[ticker]
 
 # 示例用法
 if __name__ == "__main__":
@@ -0,0 +1,225 @@
+import os
+
+import numpy as np
+
+import metrics
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+# 设置 INDICATOR_KERNELS_NUMBA=0 可以在安装了 numba 时也使用纯 NumPy 版本
+USE_NUMBA = numba is not None and os.getenv("INDICATOR_KERNELS_NUMBA", "1") != "0"
+
+
+# 多个股票同时计算的指标内核。
+#
+# 输入是 (股票数 × 时间) 的二维数组（一维数组视为一个股票），每一行是一个股票
+# 按时间排列的收盘价，缺失值为 NaN（例如上市时间较短的股票前面补 NaN）。一次调用
+# 算出所有行的指标，结果和输入形状相同，与 indicator_utils 中 pandas 版本的数值一致：
+#
+# - 滚动窗口用分块的累积和相减计算，窗口内有 NaN 或未满时结果为 NaN（与 rolling 默认的
+#   min_periods=window 相同）；
+# - EMA 是递推滤波，与 ``ewm(span=..., adjust=False)`` 相同，包括中间缺失值的处理；
+#   安装了 numba 时递推部分用 JIT 编译。
+
+
+def _as_2d(values):
+    values = np.asarray(values, dtype=np.float64)
+    return values[np.newaxis, :] if values.ndim == 1 else values
+
+
+def _restore_shape(result, values):
+    return result[0] if np.ndim(values) == 1 else result
+
+
+def _window_sums(values, window, block=4096):
+    """
+    每个窗口的 (和, 平方和)，以及窗口不完整的位置掩码。
+
+    累积和按 ``block`` 列分块重新开始：每块（连同前面 ``window - 1`` 列）减去
+    块内均值后单独做累积和，避免长序列上累积和的量级不断增大，以及价格偏离
+    均值较远时 ``S2 - S1²/n`` 相减损失精度。返回的 ``offset`` 是每个位置所在
+    块的均值，和与平方和都相对于它计算。
+    """
+    missing = np.isnan(values)
+    length = values.shape[1]
+    sums = np.empty_like(values)
+    squares = np.empty_like(values)
+    offset = np.zeros_like(values)
+    for start in range(0, length, block):
+        stop = min(start + block, length)
+        lo = max(0, start - window + 1)
+        segment = values[:, lo:stop]
+        segment_missing = missing[:, lo:stop]
+        center = np.zeros((values.shape[0], 1))
+        has_data = ~segment_missing.all(axis=1)
+        center[has_data, 0] = np.nanmean(segment[has_data], axis=1)
+        centered = np.where(segment_missing, 0.0, segment - center)
+
+        skip = start - lo
+        for out, x in ((sums, centered), (squares, centered * centered)):
+            total = np.cumsum(x, axis=1)
+            total[:, window:] = total[:, window:] - total[:, :-window]
+            out[:, start:stop] = total[:, skip:]
+        offset[:, start:stop] = center
+
+    # 缺失值个数是整数，累积和是精确的，不需要分块
+    count = np.cumsum(missing, axis=1)
+    count[:, window:] = count[:, window:] - count[:, :-window]
+    invalid = count > 0
+    invalid[:, : window - 1] = True
+    return sums, squares, invalid, offset
+
+
+@metrics.timed("indicator", function="rolling_mean")
+def rolling_mean(values, window):
+    """每行的简单移动平均（SMA），对应 ``rolling(window).mean()``。"""
+    data = _as_2d(values)
+    sums, _, invalid, offset = _window_sums(data, window)
+    mean = sums / window + offset
+    mean[invalid] = np.nan
+    return _restore_shape(mean, values)
+
+
+@metrics.timed("indicator", function="rolling_std")
+def rolling_std(values, window, ddof=1):
+    """每行的滚动标准差，对应 ``rolling(window).std()``（默认样本标准差）。"""
+    data = _as_2d(values)
+    sums, squares, invalid, _ = _window_sums(data, window)
+    variance = (squares - sums * sums / window) / (window - ddof)
+    # 浮点误差可能让常数窗口的方差略小于 0
+    std = np.sqrt(np.maximum(variance, 0.0))
+    std[invalid] = np.nan
+    return _restore_shape(std, values)
+
+
+def bollinger_bands(values, window, num_std=2):
+    """布林带上下轨，对应 ``indicator_utils.calculate_bollinger_bands``。"""
+    mean = rolling_mean(values, window)
+    std = rolling_std(values, window)
+    return mean + std * num_std, mean - std * num_std
+
+
+def _ema_numpy(data, alpha):
+    # 按时间递推，每一步对所有行向量化计算
+    result = np.empty_like(data)
+    level = np.full(data.shape[0], np.nan)
+    # 旧值的权重：连续的有效值之间为 1 - alpha，遇到缺失值时继续衰减
+    weight = np.zeros(data.shape[0])
+    for t in range(data.shape[1]):
+        x = data[:, t]
+        started = ~np.isnan(level)
+        valid = ~np.isnan(x)
+        weight = np.where(started, weight * (1 - alpha), weight)
+        update = started & valid
+        level = np.where(
+            update, (weight * level + alpha * x) / (weight + alpha), level
+        )
+        first = ~started & valid
+        level = np.where(first, x, level)
+        weight = np.where(valid, 1.0, weight)
+        result[:, t] = level
+    return result
+
+
+def _ema_loop(data, alpha):
+    # 与 _ema_numpy 相同的递推，逐个元素计算，供 numba 编译
+    result = np.empty_like(data)
+    for i in range(data.shape[0]):
+        level = np.nan
+        weight = 0.0
+        for t in range(data.shape[1]):
+            x = data[i, t]
+            if level == level:  # 已经有初值（不是 NaN）
+                weight *= 1 - alpha
+                if x == x:
+                    level = (weight * level + alpha * x) / (weight + alpha)
+            elif x == x:
+                level = x
+            if x == x:
+                weight = 1.0
+            result[i, t] = level
+    return result
+
+
+if USE_NUMBA:
+    _ema_loop = numba.njit(cache=True)(_ema_loop)
+
+
+@metrics.timed("indicator", function="ema")
+def ema(values, span):
+    """每行的指数移动平均，对应 ``ewm(span=span, adjust=False).mean()``。"""
+    data = np.ascontiguousarray(_as_2d(values))
+    alpha = 2.0 / (span + 1)
+    result = _ema_loop(data, alpha) if USE_NUMBA else _ema_numpy(data, alpha)
+    return _restore_shape(result, values)
+
+
+def macd(values, short_window=12, long_window=26, signal_window=9):
+    """MACD 线、信号线和柱，对应 ``indicator_utils.calculate_macd``。"""
+    macd_line = ema(values, short_window) - ema(values, long_window)
+    signal = ema(macd_line, signal_window)
+    return macd_line, signal, macd_line - signal
+
+
+def compute_indicators(
+    values,
+    ma_window=20,
+    bb_window=20,
+    short_window=12,
+    long_window=26,
+    signal_window=9,
+):
+    """
+    一次算出所有行的 MA、布林带和 MACD。
+
+    Returns:
+        dict: 键与 ``indicator_utils.add_indicators`` 添加的列名相同，
+        值是与 ``values`` 形状相同的数组。
+    """
+    upper, lower = bollinger_bands(values, bb_window)
+    macd_line, signal, macd_hist = macd(values, short_window, long_window, signal_window)
+    return {
+        "MA": rolling_mean(values, ma_window),
+        "Upper Band": upper,
+        "Lower Band": lower,
+        "MACD": macd_line,
+        "Signal": signal,
+        "MACD_Hist": macd_hist,
+    }
+
+
+# 示例用法：python indicator_kernels.py [股票数] [长度]
+if __name__ == "__main__":
+    import sys
+    import time
+
+    import pandas as pd
+
+    from indicator_utils import add_indicators
+
+    symbols = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    length = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+
+    print(f"Numba: {'on' if USE_NUMBA else 'off'}")
+
+    rng = np.random.default_rng(1)
+    prices = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, (symbols, length)), axis=1))
+    compute_indicators(prices[:1])  # numba 首次调用时编译
+
+    started = time.perf_counter()
+    compute_indicators(prices)
+    kernel_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for row in prices:
+        add_indicators(pd.DataFrame({"close": row}))
+    pandas_seconds = time.perf_counter() - started
+
+    print(
+        f"{symbols} symbols x {length} candles: kernels {kernel_seconds * 1000:.1f}ms, "
+        f"pandas per symbol {pandas_seconds * 1000:.1f}ms "
+        f"({pandas_seconds / kernel_seconds:.0f}x)"
+    )
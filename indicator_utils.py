@@ -1,10 +1,20 @@
+import math
+from collections import deque
+
+import numpy as np
+
+import metrics
+
+
 # 计算移动平均线
+@metrics.timed("indicator", function="calculate_moving_average")
 def calculate_moving_average(data, window):
     if len(data) < window:
         raise ValueError("Data is not sufficient to calculate moving average.")
     return data["close"].rolling(window=window).mean()
 
 
+@metrics.timed("indicator", function="calculate_bollinger_bands")
 def calculate_bollinger_bands(data, window):
     """
     计算布林带（Bollinger Bands）。
@@ -27,6 +37,7 @@ def calculate_bollinger_bands(data, window):
 
 
 # 计算MACD 移动平均收敛/发散指标
+@metrics.timed("indicator", function="calculate_macd")
 def calculate_macd(data, short_window=12, long_window=26, signal_window=9):
     # 计算短期EMA
     short_ema = data["close"].ewm(span=short_window, adjust=False).mean()
@@ -42,15 +53,16 @@ def calculate_macd(data, short_window=12, long_window=26, signal_window=9):
 
 
 # 生成交易信号
+# data 可以是 DataFrame，也可以是 CandleBuffer 这类按列名返回数组的对象
+@metrics.timed("indicator", function="generate_signals")
 def generate_signals(data):
-    ma_condition = (
-        data["close"].iloc[-1] > data["MA"].iloc[-1]
-        and data["close"].iloc[-2] <= data["MA"].iloc[-2]
-    )
-    macd_condition = (
-        data["MACD"].iloc[-1] > data["Signal"].iloc[-1]
-        and data["MACD"].iloc[-2] <= data["Signal"].iloc[-2]
-    )
+    close = np.asarray(data["close"])
+    ma = np.asarray(data["MA"])
+    macd = np.asarray(data["MACD"])
+    signal = np.asarray(data["Signal"])
+
+    ma_condition = close[-1] > ma[-1] and close[-2] <= ma[-2]
+    macd_condition = macd[-1] > signal[-1] and macd[-2] <= signal[-2]
 
     if ma_condition and macd_condition:
         return "buy"
@@ -60,6 +72,65 @@ def generate_signals(data):
         return "hold"
 
 
+# 交易信号编码，向量化版本使用整数数组以便处理大量K线
+SIGNAL_CODES = {"sell": -1, "hold": 0, "buy": 1}
+_SIGNAL_NAMES = np.array(["sell", "hold", "buy"])
+
+
+def _crossed_above(value, reference):
+    # 当前K线 value > reference 且上一根 value <= reference，第一根K线没有上一根
+    crossed = np.zeros(len(value), dtype=bool)
+    crossed[1:] = (value[1:] > reference[1:]) & (value[:-1] <= reference[:-1])
+    return crossed
+
+
+@metrics.timed("indicator", function="generate_signal_codes")
+def generate_signal_codes(data):
+    """
+    一次性计算每根K线的交易信号，规则与 ``generate_signals`` 相同。
+
+    Returns:
+        np.ndarray: int8 数组，1 表示 buy，-1 表示 sell，0 表示 hold。
+        第一根K线没有前一根可比较，固定为 hold。
+    """
+    close = np.asarray(data["close"], dtype=np.float64)
+    ma = np.asarray(data["MA"], dtype=np.float64)
+    macd = np.asarray(data["MACD"], dtype=np.float64)
+    signal = np.asarray(data["Signal"], dtype=np.float64)
+
+    ma_condition = _crossed_above(close, ma)
+    macd_condition = _crossed_above(macd, signal)
+
+    codes = np.zeros(len(close), dtype=np.int8)
+    codes[ma_condition & macd_condition] = SIGNAL_CODES["buy"]
+    codes[~ma_condition & ~macd_condition] = SIGNAL_CODES["sell"]
+    codes[0] = SIGNAL_CODES["hold"]
+    return codes
+
+
+def generate_signals_vectorized(data):
+    """向量化版 ``generate_signals``，返回每根K线的 "buy"/"sell"/"hold" 字符串数组。"""
+    return _SIGNAL_NAMES[generate_signal_codes(data) + 1]
+
+
+def add_indicators(
+    data,
+    ma_window=20,
+    bb_window=20,
+    short_window=12,
+    long_window=26,
+    signal_window=9,
+):
+    """在 data 的副本上计算 MA、布林带和 MACD，列名与 crypto_chart 一致。"""
+    data = data.copy()
+    data["MA"] = calculate_moving_average(data, ma_window)
+    data["Upper Band"], data["Lower Band"] = calculate_bollinger_bands(data, bb_window)
+    data["MACD"], data["Signal"], data["MACD_Hist"] = calculate_macd(
+        data, short_window, long_window, signal_window
+    )
+    return data
+
+
 # 提供杠杆建议
 def leverage_suggestion(principal, signal, risk_ratio=0.1):
     """
@@ -92,3 +163,230 @@ def leverage_suggestion(principal, signal, risk_ratio=0.1):
 #         stop_loss = None
 #         take_profit = None
 #     return take_profit, stop_loss
+
+
+# ---------------------------------------------------------------------------
+# 流式指标：每根新K线 O(1) 更新，结果与上面的 pandas 版本一致
+# ---------------------------------------------------------------------------
+
+
+class StreamingSMA:
+    """
+    基于滑动窗口累加和的简单移动平均线，等价于 ``rolling(window).mean()``。
+
+    ``update`` 追加一根新K线的收盘价，``revise`` 修改最近一根（尚未收盘的）K线。
+    窗口未满时返回 NaN，与 pandas 的 ``min_periods=window`` 行为相同。
+    """
+
+    def __init__(self, window):
+        if window < 1:
+            raise ValueError("window must be a positive integer.")
+        self.window = window
+        self._values = deque()
+        self._sum = 0.0
+        self._updates = 0
+
+    def update(self, value):
+        value = float(value)
+        self._values.append(value)
+        self._sum += value
+        if len(self._values) > self.window:
+            self._sum -= self._values.popleft()
+        # 每滑过一个窗口重新求和一次，避免长时间运行后累加误差漂移（均摊 O(1)）
+        self._updates += 1
+        if self._updates % self.window == 0:
+            self._sum = math.fsum(self._values)
+        return self.value
+
+    def revise(self, value):
+        if not self._values:
+            return self.update(value)
+        value = float(value)
+        self._sum += value - self._values[-1]
+        self._values[-1] = value
+        return self.value
+
+    @property
+    def value(self):
+        if len(self._values) < self.window:
+            return math.nan
+        return self._sum / self.window
+
+
+class StreamingBollingerBands:
+    """
+    滑动窗口版 Welford 算法维护均值与方差，等价于 ``calculate_bollinger_bands``。
+
+    标准差使用样本标准差（ddof=1），与 ``rolling(window).std()`` 一致。
+    ``value`` 返回 (中轨, 上轨, 下轨)。
+    """
+
+    def __init__(self, window, num_std=2):
+        if window < 2:
+            raise ValueError("window must be at least 2 to compute a standard deviation.")
+        self.window = window
+        self.num_std = num_std
+        self._values = deque()
+        self._mean = 0.0
+        self._m2 = 0.0
+        self._updates = 0
+
+    def _add(self, value):
+        n = len(self._values)
+        delta = value - self._mean
+        self._mean += delta / n
+        self._m2 += delta * (value - self._mean)
+
+    def _replace(self, old, new):
+        # 窗口长度不变时，用新值替换旧值
+        old_mean = self._mean
+        self._mean += (new - old) / len(self._values)
+        self._m2 += (new - old) * (new - self._mean + old - old_mean)
+
+    def update(self, value):
+        value = float(value)
+        if len(self._values) < self.window:
+            self._values.append(value)
+            self._add(value)
+        else:
+            old = self._values.popleft()
+            self._values.append(value)
+            self._replace(old, value)
+        # 与 StreamingSMA 相同，定期重算以消除浮点误差累积
+        self._updates += 1
+        if self._updates % self.window == 0:
+            self._resync()
+        return self.value
+
+    def _resync(self):
+        n = len(self._values)
+        self._mean = math.fsum(self._values) / n
+        self._m2 = math.fsum((v - self._mean) ** 2 for v in self._values)
+
+    def revise(self, value):
+        if not self._values:
+            return self.update(value)
+        value = float(value)
+        old = self._values[-1]
+        self._values[-1] = value
+        self._replace(old, value)
+        return self.value
+
+    @property
+    def value(self):
+        if len(self._values) < self.window:
+            return math.nan, math.nan, math.nan
+        # 浮点误差可能让 m2 略小于 0
+        std = math.sqrt(max(self._m2, 0.0) / (self.window - 1))
+        return (
+            self._mean,
+            self._mean + std * self.num_std,
+            self._mean - std * self.num_std,
+        )
+
+
+class StreamingEMA:
+    """
+    携带状态的指数移动平均，等价于 ``ewm(span=span, adjust=False).mean()``。
+    """
+
+    def __init__(self, span):
+        if span < 1:
+            raise ValueError("span must be a positive number.")
+        self.span = span
+        self.alpha = 2 / (span + 1)
+        self._prev = None  # 最近一根K线之前的 EMA，用于 revise
+        self._value = None
+
+    def update(self, value):
+        value = float(value)
+        self._prev = self._value
+        if self._value is None:
+            self._value = value
+        else:
+            self._value = self._value + self.alpha * (value - self._value)
+        return self._value
+
+    def revise(self, value):
+        value = float(value)
+        if self._prev is None:
+            self._value = value
+        else:
+            self._value = self._prev + self.alpha * (value - self._prev)
+        return self._value
+
+    @property
+    def value(self):
+        return math.nan if self._value is None else self._value
+
+
+class StreamingMACD:
+    """
+    流式 MACD，等价于 ``calculate_macd``。``value`` 返回 (macd, signal, macd_hist)。
+    """
+
+    def __init__(self, short_window=12, long_window=26, signal_window=9):
+        self._short = StreamingEMA(short_window)
+        self._long = StreamingEMA(long_window)
+        self._signal = StreamingEMA(signal_window)
+
+    def update(self, value):
+        macd = self._short.update(value) - self._long.update(value)
+        signal = self._signal.update(macd)
+        return macd, signal, macd - signal
+
+    def revise(self, value):
+        macd = self._short.revise(value) - self._long.revise(value)
+        signal = self._signal.revise(macd)
+        return macd, signal, macd - signal
+
+    @property
+    def value(self):
+        macd = self._short.value - self._long.value
+        signal = self._signal.value
+        return macd, signal, macd - signal
+
+
+class StreamingIndicators:
+    """
+    把 MA、布林带和 MACD 组合在一起，按 crypto_chart 使用的列名输出。
+
+    用法::
+
+        indicators = StreamingIndicators()
+        indicators.warm_up(crypto_data["close"])  # 用历史数据初始化状态
+        row = indicators.update(new_close)        # 新K线
+        row = indicators.revise(new_close)        # 最近一根K线的收盘价发生变化
+    """
+
+    columns = ("MA", "Upper Band", "Lower Band", "MACD", "Signal", "MACD_Hist")
+
+    def __init__(
+        self,
+        ma_window=20,
+        bb_window=20,
+        short_window=12,
+        long_window=26,
+        signal_window=9,
+    ):
+        self._ma = StreamingSMA(ma_window)
+        self._bb = StreamingBollingerBands(bb_window)
+        self._macd = StreamingMACD(short_window, long_window, signal_window)
+
+    def _row(self, ma, bands, macd):
+        _, upper_band, lower_band = bands
+        return dict(zip(self.columns, (ma, upper_band, lower_band, *macd)))
+
+    def update(self, close):
+        return self._row(
+            self._ma.update(close), self._bb.update(close), self._macd.update(close)
+        )
+
+    def revise(self, close):
+        return self._row(
+            self._ma.revise(close), self._bb.revise(close), self._macd.revise(close)
+        )
+
+    def warm_up(self, closes):
+        """依次喂入历史收盘价，返回每根K线的指标行组成的列表。"""
+        return [self.update(close) for close in closes]
@@ -0,0 +1,125 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS completions (
+    key TEXT PRIMARY KEY,
+    response TEXT NOT NULL,
+    created REAL NOT NULL,
+    accessed REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS completions_accessed ON completions (accessed);
+"""
+
+
+def completion_key(model, system_prompt, messages, temperature, max_tokens):
+    """按请求内容计算缓存键：完全相同的请求得到相同的键。"""
+    payload = json.dumps(
+        {
+            "model": model,
+            "system_prompt": system_prompt,
+            "messages": messages,
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+        },
+        sort_keys=True,
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LLMCache:
+    """
+    基于 SQLite 的 LLM 回复缓存，按内容寻址，支持过期时间和 LRU 容量上限。
+
+    Args:
+        path (str): SQLite 文件路径。
+        ttl (float): 默认过期时间（秒），None 表示永不过期。
+        max_entries (int): 最多保存的条目数，超过时淘汰最久未被访问的条目。
+    """
+
+    def __init__(self, path="llm_cache.sqlite", ttl=None, max_entries=10000):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def get(self, key, ttl=None):
+        """返回未过期的缓存内容，没有命中返回 None。``ttl`` 覆盖默认过期时间。"""
+        ttl = self.ttl if ttl is None else ttl
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT response, created FROM completions WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            response, created = row
+            if ttl is not None and now - created > ttl:
+                return None
+            conn.execute(
+                "UPDATE completions SET accessed = ? WHERE key = ?", (now, key)
+            )
+        return response
+
+    def put(self, key, response):
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO completions VALUES (?, ?, ?, ?)",
+                (key, response, now, now),
+            )
+            # 超出容量时按最近访问时间淘汰
+            conn.execute(
+                "DELETE FROM completions WHERE key IN ("
+                "SELECT key FROM completions ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+    def clear(self):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM completions")
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_llm_cache():
+    """
+    按环境变量创建的默认缓存，设置 LLM_CACHE_DISABLED=1 时返回 None。
+
+    LLM_CACHE_PATH：缓存文件（默认 llm_cache.sqlite）；
+    LLM_CACHE_TTL：过期时间，单位秒（默认 86400，设为 0 表示永不过期）；
+    LLM_CACHE_MAX_ENTRIES：最多保存的条目数（默认 10000）。
+    """
+    global _default_cache
+    if os.getenv("LLM_CACHE_DISABLED", "").lower() in ("1", "true", "yes"):
+        return None
+    if _default_cache is None:
+        with _default_cache_lock:
+            if _default_cache is None:
+                ttl = float(os.getenv("LLM_CACHE_TTL", "86400"))
+                _default_cache = LLMCache(
+                    path=os.getenv("LLM_CACHE_PATH", "llm_cache.sqlite"),
+                    ttl=ttl or None,
+                    max_entries=int(os.getenv("LLM_CACHE_MAX_ENTRIES", "10000")),
+                )
+    return _default_cache
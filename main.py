@@ -1,49 +1,107 @@
+import os
+
+from analysis_pipeline import AnalysisPipeline
+from batch_analysis import DEFAULT_BATCH_SIZE, run_batched
 from financial_utils import (
-    get_stock_data,
-    get_sentiment_analysis,
-    get_industry_analysis,
-    get_final_analysis,
-    get_current_price,
     generate_ticker_ideas,
     rank_companies,
-    get_analyst_ratings,
 )
+import metrics
+from run_checkpoint import RUN_SCOPE, RunCheckpoint, resolve_run_id
+from screener import load_universe, screen
+from ticker_data import prefetch_ticker_data
 
 # User input
 # industry = input("Enter the industry to analyze: ")
 industry = "AI"
 years = 1  # int(input("Enter the number of years for analysis: "))
+# 同时分析的股票数量、同时进行的网络/LLM 请求数量
+max_tickers = int(os.getenv("ANALYSIS_MAX_TICKERS", "4"))
+max_requests = int(os.getenv("ANALYSIS_MAX_REQUESTS", "8"))
+# Set ANALYSIS_BATCH_SIZE > 1 to pack several tickers into each LLM request
+batch_size = DEFAULT_BATCH_SIZE
+# Set SCREEN_UNIVERSE to a file of tickers (one per line) to pre-screen a large
+# universe quantitatively and send only the SCREEN_TOP_K best to the LLM stages
+screen_universe = os.getenv("SCREEN_UNIVERSE")
+screen_top_k = int(os.getenv("SCREEN_TOP_K", "5"))
+# Screened runs are labelled by the universe file name instead of the industry
+universe_label = (
+    os.path.splitext(os.path.basename(screen_universe))[0] if screen_universe else None
+)
 
-# Generate ticker ideas for the industry
-tickers = generate_ticker_ideas(industry)
-print(f"\nTicker Ideas for {industry} Industry:")
-print(", ".join(tickers))
+# Stage results are checkpointed per run; rerun with the same run ID
+# (python main.py <run_id> or ANALYSIS_RUN_ID) to resume where it stopped
+checkpoint = RunCheckpoint(resolve_run_id())
+print(f"Run ID: {checkpoint.run_id} (checkpoints in {checkpoint.path})")
 
-# Perform analysis for each company
-analyses = {}
-prices = {}
-for ticker in tickers:
-    try:
-        print(f"\nAnalyzing {ticker}...")
-        hist_data, balance_sheet, financials, news = get_stock_data(ticker, years)
-        main_data = {
-            "hist_data": hist_data,
-            "balance_sheet": balance_sheet,
-            "financials": financials,
-            "news": news,
-        }
-        sentiment_analysis = get_sentiment_analysis(ticker, news)
-        analyst_ratings = get_analyst_ratings(ticker)
-        industry_analysis = get_industry_analysis(ticker)
-        final_analysis = get_final_analysis(
-            ticker, {}, sentiment_analysis, analyst_ratings, industry_analysis
+# Choose the tickers to analyze. Only a non-empty selection is checkpointed, so
+# a run that selected nothing (e.g. a failed download) selects again on rerun
+tickers_heading = f"Ticker Ideas for {industry} Industry"
+if screen_universe:
+    tickers_heading = f"Top {screen_top_k} Screened Tickers from {universe_label}"
+if checkpoint.has(RUN_SCOPE, "tickers"):
+    tickers = checkpoint.load(RUN_SCOPE, "tickers")
+elif screen_universe:
+    universe = load_universe(screen_universe)
+    screened = screen(universe, screen_top_k)
+    if screened.empty:
+        tickers = universe[:screen_top_k]
+        tickers_heading = (
+            f"Unscreened Tickers from {universe_label} (no ticker passed the screen)"
         )
-        analyses[ticker] = final_analysis
-        prices[ticker] = get_current_price(ticker)
-    except:
-        pass
-
-# Rank the companies based on their analyses
-ranking = rank_companies(industry, analyses, prices)
-print(f"\nRanking of Companies in the {industry} Industry:")
-print(ranking)
+    else:
+        print(f"\nTop {len(screened)} of {len(universe)} tickers after screening:")
+        print(screened.round(3).to_string())
+        tickers = list(screened.index)
+        checkpoint.save(RUN_SCOPE, "tickers", tickers)
+else:
+    # Generate ticker ideas for the industry
+    tickers = generate_ticker_ideas(industry) or []
+    if tickers:
+        checkpoint.save(RUN_SCOPE, "tickers", tickers)
+print(f"\n{tickers_heading}:")
+print(", ".join(tickers))
+
+# Load Yahoo data up front for tickers not finished in a previous attempt;
+# every analysis stage reuses it
+prefetch_ticker_data(
+    [ticker for ticker in tickers if not checkpoint.has(ticker, "get_final_analysis")]
+)
+
+# Perform analysis for all companies concurrently
+print(f"\nAnalyzing {', '.join(tickers)}...")
+if batch_size > 1:
+    run = run_batched(
+        tickers, years, batch_size, max_requests=max_requests, checkpoint=checkpoint
+    )
+else:
+    pipeline = AnalysisPipeline(
+        years, max_tickers=max_tickers, max_requests=max_requests, checkpoint=checkpoint
+    )
+    run = pipeline.run(tickers)
+analyses = run["analyses"]
+prices = run["prices"]
+
+for ticker, result in run["results"].items():
+    # Batched runs share requests across tickers, so they have no per-ticker time
+    if "seconds" in result:
+        print(f"{ticker}: analyzed in {result['seconds']:.1f}s")
+for ticker, error in run["failures"].items():
+    print(f"{ticker}: analysis failed in {error.stage}: {error.error!r}")
+
+# Rank the companies based on their analyses, printing the ranking as it streams in
+if universe_label:
+    print(f"\nRanking of Companies Screened from {universe_label}:")
+else:
+    print(f"\nRanking of Companies in the {industry} Industry:")
+ranking = rank_companies(
+    industry,
+    analyses,
+    prices,
+    on_token=lambda token: print(token, end="", flush=True),
+    universe=universe_label,
+)
+print()
+
+# Export timings and token counts when METRICS_EXPORT is set (.prom or JSON lines)
+metrics.export_metrics()
@@ -0,0 +1,210 @@
+import bisect
+import functools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# 延迟直方图的桶上界（秒），从指标计算的微秒级到 LLM 请求的分钟级
+LATENCY_BUCKETS = (
+    0.0001, 0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+    1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0,
+)
+
+
+class Histogram:
+    """Prometheus 风格的累积直方图：只保存每个桶的计数、总和和次数。"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # 最后一个是 +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q):
+        """按桶内线性插值估算分位数。"""
+        if self.count == 0:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            if seen + count >= rank and count:
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                upper = self.buckets[i] if i < len(self.buckets) else lower
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+        return self.buckets[-1]
+
+
+def _label_key(labels):
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in pairs) + "}"
+
+
+class MetricsRegistry:
+    """
+    进程内的指标注册表：计数器和延迟直方图，按名称和标签区分。
+
+    - ``span(name, **labels)``：上下文管理器，把耗时记入 ``<name>_seconds`` 直方图，
+      出现异常时另外累加 ``<name>_errors_total``；
+    - ``timed(name, **labels)``：同样功能的装饰器；
+    - ``count(name, value, **labels)``：累加计数器，例如 token 数、字节数；
+    - ``to_prometheus()`` / ``to_json_lines()``：导出为 Prometheus 文本格式或 JSON lines。
+
+    所有方法都可以在多个线程中同时调用。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+
+    def count(self, name, value=1, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(value)
+
+    @contextmanager
+    def span(self, name, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        except BaseException:
+            self.count(f"{name}_errors_total", **labels)
+            raise
+        finally:
+            self.observe(f"{name}_seconds", time.perf_counter() - started, **labels)
+
+    def timed(self, name, **labels):
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.span(name, **labels):
+                    return func(*args, **kwargs)
+
+            return wrapper
+
+        return decorator
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def to_prometheus(self):
+        """导出为 Prometheus 文本格式（text/plain; version=0.0.4）。"""
+        lines = []
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted(self._histograms.items(), key=lambda item: item[0])
+            for (name, labels), value in counters:
+                lines.append(f"# TYPE {name} counter")
+                lines.append(f"{name}{_format_labels(labels)} {value}")
+            for (name, labels), histogram in histograms:
+                lines.append(f"# TYPE {name} histogram")
+                cumulative = 0
+                for bound, count in zip(histogram.buckets + (float("inf"),), histogram.counts):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(
+                        f"{name}_bucket{_format_labels(labels, [('le', le)])} {cumulative}"
+                    )
+                lines.append(f"{name}_sum{_format_labels(labels)} {histogram.sum}")
+                lines.append(f"{name}_count{_format_labels(labels)} {histogram.count}")
+        # 同名的多组标签只需要一行 TYPE
+        deduped, seen = [], set()
+        for line in lines:
+            if line.startswith("# TYPE"):
+                if line in seen:
+                    continue
+                seen.add(line)
+            deduped.append(line)
+        return "\n".join(deduped) + "\n"
+
+    def to_json_lines(self):
+        """每个指标一行 JSON，直方图附带估算的 p50/p90/p99（秒）。"""
+        timestamp = time.time()
+        records = []
+        with self._lock:
+            for (name, labels), value in sorted(self._counters.items()):
+                records.append(
+                    {
+                        "timestamp": timestamp,
+                        "type": "counter",
+                        "name": name,
+                        "labels": dict(labels),
+                        "value": value,
+                    }
+                )
+            for (name, labels), histogram in sorted(
+                self._histograms.items(), key=lambda item: item[0]
+            ):
+                records.append(
+                    {
+                        "timestamp": timestamp,
+                        "type": "histogram",
+                        "name": name,
+                        "labels": dict(labels),
+                        "count": histogram.count,
+                        "sum": histogram.sum,
+                        "p50": histogram.quantile(0.5),
+                        "p90": histogram.quantile(0.9),
+                        "p99": histogram.quantile(0.99),
+                    }
+                )
+        return "".join(json.dumps(record) + "\n" for record in records)
+
+    def export(self, path):
+        """写出到文件：``.prom`` 后缀写 Prometheus 文本（覆盖），其他追加 JSON lines。"""
+        if path.endswith(".prom"):
+            tmp_path = path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(self.to_prometheus())
+            os.replace(tmp_path, path)
+        else:
+            with open(path, "a", encoding="utf-8") as f:
+                f.write(self.to_json_lines())
+
+
+registry = MetricsRegistry()
+
+# 模块级的便捷入口，都作用于默认的注册表
+span = registry.span
+timed = registry.timed
+count = registry.count
+observe = registry.observe
+
+
+def export_metrics(path=None):
+    """
+    导出默认注册表的指标。``path`` 默认取环境变量 METRICS_EXPORT，
+    两者都没有时什么也不做。
+    """
+    path = path or os.getenv("METRICS_EXPORT")
+    if path:
+        registry.export(path)
+    return path
@@ -0,0 +1,207 @@
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 批量请求（batch_analysis.py）要求以这些键返回 JSON 对象
+_BATCH_KEYS = re.compile(r"item keys: (\[.*?\])")
+
+# 生成回复时使用的词表
+_WORDS = (
+    "revenue margin growth guidance valuation demand supply risk outlook "
+    "competition regulation capital earnings momentum sector industry cash "
+    "debt investors analysts quarter market share pricing innovation"
+).split()
+
+
+class MockLLMServer:
+    """
+    本地的 OpenAI 兼容 chat completions 服务，用于压测和基准测试。
+
+    - ``POST /v1/chat/completions``：等待 ``latency`` 秒（首 token 延迟），再按
+      ``token_rate``（token/秒）生成 ``completion_tokens`` 个 token；支持
+      ``"stream": true`` 的 SSE 流式回复，非流式回复带有 ``usage``，流式请求带
+      ``stream_options.include_usage`` 时在最后一个事件中返回 ``usage``；
+    - ``GET /article/<name>``：返回一篇带 ETag 的 HTML 文章，供文章下载使用。
+
+    把 API_URL 指向 ``server.url`` 即可让 ask_AI 使用它。
+
+    Args:
+        host (str): 监听地址。
+        port (int): 端口，0 表示随机分配。
+        latency (float): 每个请求的固定延迟（秒）。
+        token_rate (float): 生成速度（token/秒），0 表示不限速。
+        completion_tokens (int): 每个回复的 token 数（不超过请求的 max_tokens）。
+    """
+
+    def __init__(
+        self, host="127.0.0.1", port=0, latency=0.05, token_rate=2000, completion_tokens=200
+    ):
+        self.latency = latency
+        self.token_rate = token_rate
+        self.completion_tokens = completion_tokens
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/v1/chat/completions"
+
+    @property
+    def base_url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        self._httpd.serve_forever()
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _tokens(self, count):
+        rng = random.Random(count)
+        return [rng.choice(_WORDS) + " " for _ in range(count)]
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send(self, status, body, content_type, headers=None):
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                if not self.path.startswith("/article/"):
+                    self._send(404, b"not found", "text/plain")
+                    return
+                name = self.path[len("/article/") :]
+                etag = f'"{name}"'
+                if self.headers.get("If-None-Match") == etag:
+                    self.send_response(304)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                paragraphs = "".join(
+                    f"<p>{''.join(server._tokens(60 + i)).strip()}.</p>" for i in range(8)
+                )
+                body = f"<html><body><h1>{name}</h1>{paragraphs}</body></html>"
+                self._send(200, body.encode("utf-8"), "text/html", {"ETag": etag})
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                try:
+                    request = json.loads(self.rfile.read(length) or b"{}")
+                except ValueError:
+                    self._send(400, b'{"error": "invalid JSON"}', "application/json")
+                    return
+                with server._lock:
+                    server.requests += 1
+
+                prompt = "".join(
+                    str(message.get("content", "")) for message in request.get("messages", [])
+                )
+                count = min(server.completion_tokens, int(request.get("max_tokens") or 2000))
+                tokens = server._tokens(count)
+                batch_keys = _BATCH_KEYS.search(prompt)
+                if batch_keys:
+                    # 批量请求：把生成的文本平均分给每个键，返回 JSON 对象
+                    keys = json.loads(batch_keys.group(1))
+                    share = max(1, count // len(keys))
+                    answers = {
+                        key: "".join(tokens[i * share : (i + 1) * share])
+                        for i, key in enumerate(keys)
+                    }
+                    tokens = [json.dumps(answers)]
+                delay = count / server.token_rate if server.token_rate else 0.0
+                usage = {
+                    "prompt_tokens": (len(prompt) + 3) // 4,
+                    "completion_tokens": count,
+                    "total_tokens": (len(prompt) + 3) // 4 + count,
+                }
+                time.sleep(server.latency)
+
+                if request.get("stream"):
+                    self.send_response(200)
+                    self.send_header("Content-Type", "text/event-stream")
+                    self.send_header("Connection", "close")
+                    self.end_headers()
+                    try:
+                        for token in tokens:
+                            chunk = {"choices": [{"index": 0, "delta": {"content": token}}]}
+                            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+                            if delay:
+                                time.sleep(delay / count)
+                        if (request.get("stream_options") or {}).get("include_usage"):
+                            chunk = {"choices": [], "usage": usage}
+                            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+                        self.wfile.write(b"data: [DONE]\n\n")
+                    except (BrokenPipeError, ConnectionResetError):
+                        pass  # 客户端提前关闭了流
+                    self.close_connection = True
+                    return
+
+                time.sleep(delay)
+                response = {
+                    "id": "mock",
+                    "object": "chat.completion",
+                    "model": request.get("model"),
+                    "choices": [
+                        {
+                            "index": 0,
+                            "message": {"role": "assistant", "content": "".join(tokens)},
+                            "finish_reason": "stop",
+                        }
+                    ],
+                    "usage": usage,
+                }
+                self._send(200, json.dumps(response).encode("utf-8"), "application/json")
+
+        return Handler
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="本地 OpenAI 兼容的模拟 LLM 服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.05, help="每个请求的延迟（秒）")
+    parser.add_argument("--token-rate", type=float, default=2000, help="生成速度（token/秒）")
+    parser.add_argument("--completion-tokens", type=int, default=200)
+    args = parser.parse_args()
+
+    server = MockLLMServer(
+        args.host, args.port, args.latency, args.token_rate, args.completion_tokens
+    )
+    print(f"Mock LLM server listening on {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
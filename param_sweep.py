@@ -0,0 +1,172 @@
+import heapq
+import itertools
+import os
+import random
+import sys
+import time
+from multiprocessing import Pool, shared_memory
+
+import numpy as np
+import pandas as pd
+
+from backtest import run_backtest
+from indicator_utils import (
+    calculate_macd,
+    calculate_moving_average,
+    generate_signal_codes,
+)
+
+# 默认搜索空间：crypto_chart 中写死的窗口（MA 20，MACD 12/26/9）附近
+DEFAULT_GRID = {
+    "ma_window": range(10, 55, 5),
+    "short_window": range(6, 18, 2),
+    "long_window": range(20, 44, 4),
+    "signal_window": range(5, 15, 2),
+}
+
+
+def _valid(params):
+    return params["short_window"] < params["long_window"]
+
+
+def grid_params(grid=DEFAULT_GRID):
+    """网格搜索：枚举所有组合（跳过 short_window >= long_window 的组合）。"""
+    keys = list(grid)
+    for values in itertools.product(*(grid[key] for key in keys)):
+        params = dict(zip(keys, values))
+        if _valid(params):
+            yield params
+
+
+def random_params(space=DEFAULT_GRID, n=1000, seed=None, max_attempts=None):
+    """
+    随机搜索：从每个维度的候选值中独立抽样 n 个有效组合。
+
+    最多抽样 ``max_attempts`` 次（默认 100 * n），有效组合太少（例如所有
+    short_window 都不小于 long_window）时抛出 ValueError，而不是一直循环。
+    """
+    rng = random.Random(seed)
+    keys = list(space)
+    choices = {key: list(space[key]) for key in keys}
+    max_attempts = 100 * n if max_attempts is None else max_attempts
+    count = 0
+    for _ in range(max_attempts):
+        if count >= n:
+            return
+        params = {key: rng.choice(choices[key]) for key in keys}
+        if _valid(params):
+            count += 1
+            yield params
+    if count < n:
+        raise ValueError(
+            f"Only {count} of {n} valid parameter sets found in {max_attempts} draws."
+        )
+
+
+# 每个工作进程在初始化时挂载共享内存中的收盘价，之后的任务只传参数
+_worker = {}
+
+
+def _init_worker(shm_name, length, backtest_kwargs):
+    shm = shared_memory.SharedMemory(name=shm_name)
+    close = np.ndarray((length,), dtype=np.float64, buffer=shm.buf)
+    _worker["shm"] = shm  # 保持引用，防止共享内存被提前关闭
+    _worker["data"] = pd.DataFrame({"close": pd.Series(close, copy=False)}, copy=False)
+    _worker["backtest_kwargs"] = backtest_kwargs
+
+
+def _evaluate(params):
+    data = _worker["data"]
+    columns = {
+        "close": data["close"],
+        "MA": calculate_moving_average(data, params["ma_window"]),
+    }
+    columns["MACD"], columns["Signal"], _ = calculate_macd(
+        data, params["short_window"], params["long_window"], params["signal_window"]
+    )
+    result = run_backtest(
+        columns, codes=generate_signal_codes(columns), **_worker["backtest_kwargs"]
+    )
+    result.pop("equity")
+    return {**params, **result}
+
+
+def iter_sweep(
+    data,
+    param_sets,
+    processes=None,
+    chunksize=8,
+    principal=10,
+    risk_ratio=0.1,
+    fee_rate=0.0,
+):
+    """
+    在进程池中评估每组参数，按完成顺序逐个返回结果。
+
+    收盘价只复制一次到共享内存，工作进程直接映射这块内存，不会为每个任务 pickle 数据。
+    """
+    close = np.ascontiguousarray(np.asarray(data["close"], dtype=np.float64))
+    shm = shared_memory.SharedMemory(create=True, size=max(close.nbytes, 1))
+    try:
+        np.ndarray(close.shape, dtype=np.float64, buffer=shm.buf)[:] = close
+        backtest_kwargs = {
+            "principal": principal,
+            "risk_ratio": risk_ratio,
+            "fee_rate": fee_rate,
+        }
+        with Pool(
+            processes or os.cpu_count(),
+            initializer=_init_worker,
+            initargs=(shm.name, len(close), backtest_kwargs),
+        ) as pool:
+            yield from pool.imap_unordered(_evaluate, param_sets, chunksize=chunksize)
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+def run_sweep(data, param_sets, metric="return", top=20, report_every=100, **kwargs):
+    """
+    运行参数搜索并返回按 ``metric`` 从高到低排序的 DataFrame。
+
+    运行过程中每完成 ``report_every`` 组参数打印一次当前排名前 ``top`` 的结果。
+    其余参数传给 ``iter_sweep``。
+    """
+    results = []
+    leaders = []  # (metric, 序号, 结果) 组成的小顶堆，只保留前 top 名
+    started = time.perf_counter()
+    for i, result in enumerate(iter_sweep(data, param_sets, **kwargs), 1):
+        results.append(result)
+        entry = (result[metric], i, result)
+        if len(leaders) < top:
+            heapq.heappush(leaders, entry)
+        else:
+            heapq.heappushpop(leaders, entry)
+        if report_every and i % report_every == 0:
+            elapsed = time.perf_counter() - started
+            best = pd.DataFrame([r for _, _, r in sorted(leaders, reverse=True)])
+            print(f"\n{i} combinations evaluated in {elapsed:.1f}s, current top {top}:")
+            print(best.to_string(index=False))
+
+    if not results:
+        return pd.DataFrame()
+    table = pd.DataFrame(results).sort_values(metric, ascending=False)
+    return table.reset_index(drop=True)
+
+
+# 示例用法：python param_sweep.py BTC/USDT 1m 2024-01-01 [random 样本数]
+if __name__ == "__main__":
+    import ccxt
+
+    from candle_store import backfill_crypto_data
+
+    ticker = sys.argv[1] if len(sys.argv) > 1 else "BTC/USDT"
+    timeframe = sys.argv[2] if len(sys.argv) > 2 else "1m"
+    start = sys.argv[3] if len(sys.argv) > 3 else "2024-01-01"
+    samples = int(sys.argv[4]) if len(sys.argv) > 4 else None
+
+    crypto_data = backfill_crypto_data(ccxt.binance(), ticker, timeframe, start)
+    param_sets = random_params(n=samples) if samples else grid_params()
+    table = run_sweep(crypto_data, param_sets)
+    print(f"\nRanking of parameter sets for {ticker} {timeframe}:")
+    print(table.head(20).to_string(index=False))
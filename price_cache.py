@@ -0,0 +1,270 @@
+import json
+import os
+import sqlite3
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_CACHE_PATH = os.getenv("PRICE_CACHE_PATH", "price_cache.sqlite")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS series (
+    source TEXT NOT NULL,
+    ticker TEXT NOT NULL,
+    columns TEXT NOT NULL,
+    dtypes TEXT NOT NULL,
+    tz TEXT,
+    index_unit TEXT NOT NULL,
+    index_name TEXT,
+    covered_start TEXT NOT NULL,
+    covered_end TEXT NOT NULL,
+    PRIMARY KEY (source, ticker)
+);
+CREATE TABLE IF NOT EXISTS bars (
+    source TEXT NOT NULL,
+    ticker TEXT NOT NULL,
+    ts INTEGER NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (source, ticker, ts)
+);
+"""
+
+# 除权除息会改变复权后的历史价格，出现这些列的非零值时整段重新下载
+_CORPORATE_ACTION_COLUMNS = ("Dividends", "Stock Splits")
+
+
+def _to_date(value):
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return pd.Timestamp(value).date()
+
+
+class PriceHistoryCache:
+    """
+    yfinance 日线行情的本地 SQLite 缓存。
+
+    每个 (source, ticker) 记录已经下载过的日期区间 [covered_start, covered_end)。
+    再次请求时只下载缺失的部分：
+
+    - 向后补数据时从倒数第二根已存K线开始请求，用重叠的那根K线校验历史是否变化
+      （复权价格会因为新的分红/拆股而整体改变），不一致或新数据里有分红/拆股时
+      整段重新下载，保证缓存结果与一次全新下载完全相同；
+    - 请求的起始日期早于缓存时，补上前面缺失的一段。
+
+    分红/拆股列（Dividends、Stock Splits）只有 ``fetch`` 返回它们时才能检查：
+    ``Ticker.history`` 默认返回，``yf.download`` 需要 ``actions=True``。没有这两列的
+    数据源只能靠重叠K线的比对发现复权变化。
+
+    ``source`` 用来区分不同的下载方式（例如 ``yf.download`` 与 ``Ticker.history``
+    的列不同），``fetch(start, end)`` 负责实际下载并返回以日期为索引的 DataFrame。
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH):
+        self.path = path
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:  # 正常结束时提交，异常时回滚
+                yield conn
+        finally:
+            conn.close()
+
+    def _load_meta(self, conn, source, ticker):
+        row = conn.execute(
+            "SELECT columns, dtypes, tz, index_unit, index_name, covered_start, covered_end "
+            "FROM series WHERE source = ? AND ticker = ?",
+            (source, ticker),
+        ).fetchone()
+        if row is None:
+            return None
+        columns, dtypes, tz, index_unit, index_name, covered_start, covered_end = row
+        return {
+            "columns": json.loads(columns),
+            "dtypes": json.loads(dtypes),
+            "tz": tz,
+            "index_unit": index_unit,
+            "index_name": index_name,
+            "covered_start": date.fromisoformat(covered_start),
+            "covered_end": date.fromisoformat(covered_end),
+        }
+
+    def _save_meta(self, conn, source, ticker, meta):
+        conn.execute(
+            "INSERT OR REPLACE INTO series VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                source,
+                ticker,
+                json.dumps(meta["columns"]),
+                json.dumps(meta["dtypes"]),
+                meta["tz"],
+                meta["index_unit"],
+                meta["index_name"],
+                meta["covered_start"].isoformat(),
+                meta["covered_end"].isoformat(),
+            ),
+        )
+
+    @staticmethod
+    def _frame_meta(frame, covered_start, covered_end):
+        tz = getattr(frame.index, "tz", None)
+        return {
+            "columns": [str(column) for column in frame.columns],
+            "dtypes": [str(dtype) for dtype in frame.dtypes],
+            "tz": str(tz) if tz is not None else None,
+            "index_unit": pd.DatetimeIndex(frame.index).unit,
+            "index_name": frame.index.name,
+            "covered_start": covered_start,
+            "covered_end": covered_end,
+        }
+
+    @staticmethod
+    def _timestamps(index):
+        index = pd.DatetimeIndex(index)
+        if index.tz is not None:
+            index = index.tz_convert("UTC").tz_localize(None)
+        return index.as_unit("ns").asi8
+
+    def _write_bars(self, conn, source, ticker, frame):
+        # json 对 float 使用最短往返表示，读回来的值与下载时完全一致
+        rows = zip(self._timestamps(frame.index).tolist(), frame.to_numpy().tolist())
+        conn.executemany(
+            "INSERT OR REPLACE INTO bars VALUES (?, ?, ?, ?)",
+            ((source, ticker, ts, json.dumps(values)) for ts, values in rows),
+        )
+
+    def _read_bars(self, conn, source, ticker, meta, start=None, end=None):
+        query = "SELECT ts, data FROM bars WHERE source = ? AND ticker = ?"
+        params = [source, ticker]
+        if start is not None:
+            query += " AND ts >= ?"
+            params.append(self._day_start_ns(start, meta["tz"]))
+        if end is not None:
+            query += " AND ts < ?"
+            params.append(self._day_start_ns(end, meta["tz"]))
+        rows = conn.execute(query + " ORDER BY ts", params).fetchall()
+
+        index = pd.to_datetime([ts for ts, _ in rows], unit="ns").as_unit(
+            meta["index_unit"]
+        )
+        if meta["tz"] is not None:
+            index = index.tz_localize("UTC").tz_convert(meta["tz"])
+        index.name = meta["index_name"]
+        frame = pd.DataFrame(
+            [json.loads(data) for _, data in rows], index=index, columns=meta["columns"]
+        )
+        return frame.astype(dict(zip(meta["columns"], meta["dtypes"])))
+
+    @staticmethod
+    def _day_start_ns(day, tz):
+        timestamp = pd.Timestamp(day)
+        if tz is not None:
+            timestamp = timestamp.tz_localize(tz).tz_convert("UTC").tz_localize(None)
+        return timestamp.as_unit("ns").value
+
+    def _replace_all(self, conn, source, ticker, frame, start, end):
+        conn.execute(
+            "DELETE FROM bars WHERE source = ? AND ticker = ?", (source, ticker)
+        )
+        self._write_bars(conn, source, ticker, frame)
+        meta = self._frame_meta(frame, start, end)
+        self._save_meta(conn, source, ticker, meta)
+        return meta
+
+    @staticmethod
+    def _has_corporate_actions(frame):
+        for column in _CORPORATE_ACTION_COLUMNS:
+            if column in frame.columns and (frame[column].fillna(0) != 0).any():
+                return True
+        return False
+
+    @staticmethod
+    def _same_bar(stored, fetched):
+        if list(stored.index) != list(fetched.index):
+            return False
+        return np.allclose(
+            stored.to_numpy(dtype=float),
+            fetched[stored.columns].to_numpy(dtype=float),
+            rtol=1e-9,
+            atol=0,
+            equal_nan=True,
+        )
+
+    def get(self, source, ticker, start, end, fetch):
+        """返回 [start, end) 的日线数据，按需调用 ``fetch(start, end)`` 补齐缺失部分。"""
+        today = date.today()
+        start = _to_date(start)
+        end = _to_date(end) or today + timedelta(days=1)
+        # 今天的K线可能还没有收盘，已覆盖区间最多记到今天（不含）
+        covered_end = min(end, today)
+
+        with self._connect() as conn:
+            meta = self._load_meta(conn, source, ticker)
+            if meta is None:
+                frame = fetch(start, end)
+                if frame is None or frame.empty:
+                    return frame
+                meta = self._replace_all(conn, source, ticker, frame, start, covered_end)
+                return self._read_bars(conn, source, ticker, meta, start, end)
+
+            new_start = min(start, meta["covered_start"])
+            new_end = max(covered_end, meta["covered_end"])
+
+            if start < meta["covered_start"]:
+                head = fetch(start, meta["covered_start"])
+                if head is not None and not head.empty:
+                    self._write_bars(conn, source, ticker, head)
+
+            if end > meta["covered_end"]:
+                stored = self._read_bars(conn, source, ticker, meta)
+                # 从倒数第二根（确定已收盘的）K线开始请求，用它校验历史是否变化
+                overlap = stored.iloc[-2:-1]
+                if len(overlap):
+                    fetch_start = overlap.index[0].date()
+                else:
+                    fetch_start = meta["covered_end"]
+                tail = fetch(fetch_start, end)
+                if tail is not None and not tail.empty:
+                    new_rows = tail.loc[~tail.index.isin(overlap.index)]
+                    changed = len(overlap) and not self._same_bar(
+                        overlap, tail.loc[tail.index.isin(overlap.index)]
+                    )
+                    if changed or self._has_corporate_actions(new_rows):
+                        # 复权后的历史价格变了，整段重新下载
+                        frame = fetch(new_start, end)
+                        if frame is None or frame.empty:
+                            # 重新下载失败时保留原有缓存，下次再校验
+                            print(f"{ticker}: full refetch returned no data, keeping cache")
+                            meta["covered_start"] = new_start
+                            self._save_meta(conn, source, ticker, meta)
+                            return self._read_bars(conn, source, ticker, meta, start, end)
+                        meta = self._replace_all(
+                            conn, source, ticker, frame, new_start, new_end
+                        )
+                        return self._read_bars(conn, source, ticker, meta, start, end)
+                    self._write_bars(conn, source, ticker, tail)
+
+            meta["covered_start"] = new_start
+            meta["covered_end"] = new_end
+            self._save_meta(conn, source, ticker, meta)
+            return self._read_bars(conn, source, ticker, meta, start, end)
+
+
+_default_cache = None
+
+
+def cached_price_history(source, ticker, start, end, fetch):
+    """使用默认缓存文件（环境变量 PRICE_CACHE_PATH）的便捷入口。"""
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = PriceHistoryCache()
+    return _default_cache.get(source, ticker, start, end, fetch)
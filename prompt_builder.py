@@ -0,0 +1,281 @@
+import math
+import os
+import re
+
+# 默认的提示词 token 上限，可以用环境变量 PROMPT_TOKEN_LIMIT 调整
+DEFAULT_PROMPT_TOKENS = int(os.getenv("PROMPT_TOKEN_LIMIT", "6000"))
+
+# 财报中最有参考价值的科目，挑选行时优先保留（按 yfinance 的行名）
+KEY_FINANCIAL_ROWS = (
+    "Total Revenue",
+    "Gross Profit",
+    "Operating Income",
+    "EBITDA",
+    "Net Income",
+    "Diluted EPS",
+    "Free Cash Flow",
+    "Total Assets",
+    "Total Liabilities Net Minority Interest",
+    "Stockholders Equity",
+    "Total Debt",
+    "Net Debt",
+    "Cash And Cash Equivalents",
+    "Working Capital",
+)
+
+_SENTENCE_END = re.compile(r"(?<=[.!?。！？])\s+")
+
+
+def estimate_tokens(text):
+    """快速估算 token 数：英文文本大约每 4 个字符一个 token。"""
+    return (len(text) + 3) // 4
+
+
+def compact_number(value):
+    """把大数字压缩成 1.23B、45.6M 这样的形式，节省 token。"""
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return str(value)
+    if math.isnan(value):
+        return "-"
+    magnitude = abs(value)
+    for threshold, suffix in ((1e12, "T"), (1e9, "B"), (1e6, "M"), (1e3, "K")):
+        if magnitude >= threshold:
+            return f"{value / threshold:.3g}{suffix}"
+    if magnitude >= 100 or value == int(value):
+        return f"{value:.0f}"
+    return f"{value:.3g}"
+
+
+def _format_label(label):
+    # 财报的列是报告期的 Timestamp，只保留到日期
+    if hasattr(label, "strftime"):
+        return label.strftime("%Y-%m-%d")
+    return str(label)
+
+
+def select_frame(frame, max_rows, max_columns, priority_rows=KEY_FINANCIAL_ROWS):
+    """
+    从财报 DataFrame（行是科目，列是报告期）中挑出最相关的部分。
+
+    保留最近的 ``max_columns`` 个报告期；行优先取 ``priority_rows`` 中存在的科目，
+    其余按最近一期数值的绝对值从大到小补足 ``max_rows`` 行。全为空的行会被去掉。
+    """
+    frame = frame.dropna(how="all")
+    columns = sorted(frame.columns, reverse=True)[:max_columns]
+    frame = frame[columns]
+
+    rows = [row for row in priority_rows if row in frame.index][:max_rows]
+    if len(rows) < max_rows and len(columns):
+        latest = frame[columns[0]].drop(index=rows, errors="ignore")
+        latest = latest.apply(lambda v: abs(float(v)) if v == v else -1.0)
+        rows += list(latest.sort_values(ascending=False).index[: max_rows - len(rows)])
+    return frame.loc[rows]
+
+
+def format_frame(frame, compact=True):
+    """把 DataFrame 渲染成文本，数字压缩，日期列只保留日期。"""
+    if frame is None or frame.empty:
+        return "N/A"
+    frame = frame.rename(columns=_format_label, index=_format_label)
+    if compact:
+        frame = frame.map(compact_number)
+    return frame.to_string()
+
+
+def fit_frame(frame, budget, priority_rows=KEY_FINANCIAL_ROWS, max_rows=40, max_columns=4):
+    """逐步减少行数和报告期数，直到渲染结果不超过 ``budget`` 个 token。"""
+    if frame is None or frame.empty:
+        return "N/A"
+    rows, columns = min(max_rows, len(frame.index)), min(max_columns, len(frame.columns))
+    while True:
+        text = format_frame(select_frame(frame, rows, columns, priority_rows))
+        if estimate_tokens(text) <= budget or (rows <= 1 and columns <= 1):
+            return text
+        # 先减少行，行数已经很少时再减少报告期
+        if rows > 8 or columns <= 1:
+            rows = max(1, int(rows * 0.75))
+        else:
+            columns -= 1
+
+
+def fit_rows(frame, budget, keep="last"):
+    """
+    按整行截断表格（例如价格历史），直到渲染结果不超过 ``budget`` 个 token。
+
+    保留表头和列对齐；``keep="last"`` 保留最近的行，``"first"`` 保留最前面的行。
+    """
+    if frame is None or frame.empty:
+        return "N/A"
+    rows = len(frame)
+    while True:
+        text = (frame.tail(rows) if keep == "last" else frame.head(rows)).to_string()
+        tokens = estimate_tokens(text)
+        if tokens <= budget or rows <= 1:
+            return text
+        rows = max(1, min(rows - 1, int(rows * budget / tokens)))
+
+
+def trim_text(text, budget):
+    """
+    把文本截断到 ``budget`` 个 token 以内。
+
+    只用于连续的文字（新闻正文等）：空白会被合并成单个空格，表格请用
+    ``fit_rows``。新闻正文通常开头最重要，所以按句子保留开头部分（抽取式摘要），
+    末尾加上省略号表示内容被截断。
+    """
+    text = " ".join(text.split())
+    if estimate_tokens(text) <= budget:
+        return text
+    max_chars = max(0, budget * 4 - 3)
+    kept = []
+    length = 0
+    for sentence in _SENTENCE_END.split(text):
+        if length + len(sentence) + 1 > max_chars:
+            break
+        kept.append(sentence)
+        length += len(sentence) + 1
+    if not kept:
+        return text[:max_chars] + "..."
+    return " ".join(kept) + " ..."
+
+
+def _allocate(needs, weights, available):
+    """
+    按权重分配 token 预算；需要的比分到的少的部分，剩余预算再分给其他部分。
+    """
+    budgets = [0] * len(needs)
+    pending = [i for i, need in enumerate(needs) if need > 0]
+    while pending and available > 0:
+        total_weight = sum(weights[i] for i in pending)
+        shares = {i: available * weights[i] / total_weight for i in pending}
+        satisfied = [i for i in pending if needs[i] <= shares[i]]
+        if not satisfied:
+            for i in pending:
+                budgets[i] = int(shares[i])
+            break
+        for i in satisfied:
+            budgets[i] = needs[i]
+            available -= needs[i]
+            pending.remove(i)
+    return budgets
+
+
+class PromptBuilder:
+    """
+    按 token 预算拼装提示词。
+
+    固定文本（说明、问题）原样保留；其余各部分按权重分享剩余的预算，
+    财报表格会挑选最相关的行和最近的报告期，价格历史等表格按整行截断，
+    新闻正文按句子截断。
+    所有内容都放得下时不做任何裁剪。
+
+    用法::
+
+        builder = PromptBuilder(max_tokens=6000)
+        builder.add_frame("Balance Sheet", balance_sheet)
+        builder.add_articles("News articles", articles)
+        builder.add_fixed("----\\n\\nNow, ...")
+        messages = builder.build()
+    """
+
+    def __init__(self, max_tokens=DEFAULT_PROMPT_TOKENS):
+        self.max_tokens = max_tokens
+        self._parts = []
+
+    def add_fixed(self, text):
+        self._parts.append({"kind": "fixed", "text": text})
+        return self
+
+    def add_text(self, title, text, weight=1.0):
+        self._parts.append(
+            {"kind": "text", "title": title, "text": text or "", "weight": weight}
+        )
+        return self
+
+    def add_table(self, title, frame, weight=1.0, keep="last"):
+        """按行排列的表格（例如价格历史），超出预算时按整行截断，见 ``fit_rows``。"""
+        self._parts.append(
+            {"kind": "table", "title": title, "frame": frame, "weight": weight, "keep": keep}
+        )
+        return self
+
+    def add_frame(self, title, frame, weight=2.0, priority_rows=KEY_FINANCIAL_ROWS):
+        self._parts.append(
+            {
+                "kind": "frame",
+                "title": title,
+                "frame": frame,
+                "weight": weight,
+                "priority_rows": priority_rows,
+            }
+        )
+        return self
+
+    def add_articles(self, title, articles, weight=3.0):
+        """
+        ``articles`` 是 ``(header, text)`` 列表，header 例如 "Title: ...\\nDate: ..."，
+        text 是正文。预算在各篇文章之间平均分配。
+        """
+        self._parts.append(
+            {"kind": "articles", "title": title, "articles": articles, "weight": weight}
+        )
+        return self
+
+    @staticmethod
+    def _render_articles(articles, budget=None):
+        if budget is None:
+            bodies = [text for _, text in articles]
+        else:
+            overhead = sum(estimate_tokens(header) + 4 for header, _ in articles)
+            needs = [estimate_tokens(text) for _, text in articles]
+            budgets = _allocate(needs, [1] * len(articles), max(0, budget - overhead))
+            bodies = [
+                trim_text(text, share) for (_, text), share in zip(articles, budgets)
+            ]
+        return "".join(
+            f"\n\n---\n\n{header}\nText: {body}"
+            for (header, _), body in zip(articles, bodies)
+        ).strip()
+
+    def _render(self, part, budget=None):
+        kind = part["kind"]
+        if kind == "fixed":
+            return part["text"]
+        if kind == "text":
+            body = part["text"] if budget is None else trim_text(part["text"], budget)
+        elif kind == "table":
+            frame = part["frame"]
+            if budget is None:
+                body = "N/A" if frame is None or frame.empty else frame.to_string()
+            else:
+                body = fit_rows(frame, budget, part["keep"])
+        elif kind == "frame":
+            if budget is None:
+                body = format_frame(part["frame"], compact=False)
+            else:
+                body = fit_frame(part["frame"], budget, part["priority_rows"])
+        else:
+            body = self._render_articles(part["articles"], budget)
+        return f"{part['title']}:\n{body}"
+
+    def build(self):
+        full = [self._render(part) for part in self._parts]
+        if estimate_tokens("\n\n".join(full)) <= self.max_tokens:
+            return "\n\n".join(full)
+
+        # 超出预算：固定文本和标题先扣除，剩下的按权重分给各部分
+        flexible = [i for i, part in enumerate(self._parts) if part["kind"] != "fixed"]
+        overhead = sum(
+            estimate_tokens(full[i]) for i, part in enumerate(self._parts) if part["kind"] == "fixed"
+        ) + sum(estimate_tokens(self._parts[i]["title"]) + 2 for i in flexible)
+        budgets = _allocate(
+            [estimate_tokens(full[i]) for i in flexible],
+            [self._parts[i]["weight"] for i in flexible],
+            max(0, self.max_tokens - overhead),
+        )
+        rendered = list(full)
+        for i, budget in zip(flexible, budgets):
+            rendered[i] = self._render(self._parts[i], budget)
+        return "\n\n".join(rendered)
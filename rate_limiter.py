@@ -0,0 +1,227 @@
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+import metrics
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS buckets (
+    model TEXT PRIMARY KEY,
+    requests REAL NOT NULL,
+    tokens REAL NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS waiters (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    model TEXT NOT NULL,
+    heartbeat REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS waiters_model ON waiters (model, id);
+"""
+
+
+def parse_limits(spec):
+    """
+    解析 "gpt-4=500:30000,gpt-4o-mini=5000:2000000" 形式的配置，
+    返回 {model: (每分钟请求数, 每分钟 token 数)}。
+    """
+    limits = {}
+    for item in filter(None, (part.strip() for part in (spec or "").split(","))):
+        model, _, values = item.partition("=")
+        rpm, _, tpm = values.partition(":")
+        limits[model.strip()] = (float(rpm), float(tpm or "inf"))
+    return limits
+
+
+class RateLimiter:
+    """
+    按模型限制每分钟请求数（RPM）和每分钟 token 数（TPM）的令牌桶。
+
+    桶的状态保存在 SQLite 中，同一台机器上的多个进程共享同一份额度。调用方
+    按到达顺序排队（先来先得），只有队首的请求可以扣减额度，额度不够时
+    等待补充，不会失败。崩溃的进程留下的排队记录会在心跳超时后被清理。
+
+    Args:
+        path (str): SQLite 文件路径。
+        limits (dict): {model: (rpm, tpm)}，没有列出的模型使用 ``default``。
+        default (tuple): 默认的 (rpm, tpm)，None 表示不限速。
+        poll_interval (float): 排队时检查的最长间隔（秒）。
+        stale_after (float): 排队记录多久没有心跳就视为已失效（秒）。
+    """
+
+    def __init__(
+        self,
+        path="rate_limit.sqlite",
+        limits=None,
+        default=None,
+        poll_interval=0.05,
+        stale_after=30.0,
+    ):
+        self.path = path
+        self.limits = limits or {}
+        self.default = default
+        self.poll_interval = poll_interval
+        self.stale_after = stale_after
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    @contextmanager
+    def _transaction(self, conn):
+        # IMMEDIATE：开始事务时就拿到写锁，读-改-写不会和其他进程交错
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def limit_for(self, model):
+        return self.limits.get(model, self.default)
+
+    def _refill(self, conn, model, rpm, tpm, now):
+        row = conn.execute(
+            "SELECT requests, tokens, updated FROM buckets WHERE model = ?", (model,)
+        ).fetchone()
+        if row is None:
+            # 新的桶是满的：允许一分钟额度的突发
+            return rpm, tpm
+        requests, tokens, updated = row
+        elapsed = max(0.0, now - updated)
+        return (
+            min(rpm, requests + elapsed * rpm / 60),
+            min(tpm, tokens + elapsed * tpm / 60),
+        )
+
+    def _save(self, conn, model, requests, tokens, now):
+        conn.execute(
+            "INSERT OR REPLACE INTO buckets VALUES (?, ?, ?, ?)",
+            (model, requests, tokens, now),
+        )
+
+    def acquire(self, model, tokens):
+        """
+        为一次请求扣减 1 个请求额度和 ``tokens`` 个 token 额度，必要时排队等待。
+
+        返回实际扣减的 token 数（超过 TPM 的请求按 TPM 扣减，否则会永远等待），
+        请求完成后可以用 ``settle`` 按实际用量退还多扣的部分。
+        """
+        limit = self.limit_for(model)
+        if limit is None:
+            return 0
+        rpm, tpm = limit
+        tokens = min(float(tokens), tpm)
+        started = time.monotonic()
+
+        with self._connect() as conn:
+            ticket = self._enqueue(conn, model)
+            try:
+                last_beat = time.time()
+                while True:
+                    now = time.time()
+                    if now - last_beat > self.stale_after / 3:
+                        # 心跳；如果排队记录已被当作失效清理（例如进程长时间暂停），重新排队
+                        updated = conn.execute(
+                            "UPDATE waiters SET heartbeat = ? WHERE id = ?", (now, ticket)
+                        ).rowcount
+                        if not updated:
+                            ticket = self._enqueue(conn, model)
+                        last_beat = now
+                    head = conn.execute(
+                        "SELECT MIN(id) FROM waiters WHERE model = ? AND heartbeat >= ?",
+                        (model, now - self.stale_after),
+                    ).fetchone()[0]
+                    wait = self.poll_interval
+                    if head == ticket:
+                        wait = self._take(conn, model, ticket, rpm, tpm, tokens)
+                        if wait is None:
+                            break
+                    time.sleep(min(wait, self.poll_interval))
+            except BaseException:
+                conn.execute("DELETE FROM waiters WHERE id = ?", (ticket,))
+                raise
+
+        waited = time.monotonic() - started
+        metrics.observe("llm_rate_limit_wait_seconds", waited, model=model)
+        return tokens
+
+    def _enqueue(self, conn, model):
+        return conn.execute(
+            "INSERT INTO waiters (model, heartbeat) VALUES (?, ?)", (model, time.time())
+        ).lastrowid
+
+    def _take(self, conn, model, ticket, rpm, tpm, tokens):
+        # 队首的请求扣减额度：成功时返回 None，否则返回还需要等待的秒数
+        now = time.time()
+        with self._transaction(conn):
+            conn.execute(
+                "DELETE FROM waiters WHERE model = ? AND heartbeat < ?",
+                (model, now - self.stale_after),
+            )
+            available_requests, available_tokens = self._refill(conn, model, rpm, tpm, now)
+            if available_requests >= 1 and available_tokens >= tokens:
+                self._save(
+                    conn, model, available_requests - 1, available_tokens - tokens, now
+                )
+                conn.execute("DELETE FROM waiters WHERE id = ?", (ticket,))
+                return None
+        # 按补充速度算出还要等多久
+        request_wait = max(0.0, 1 - available_requests) * 60 / rpm
+        token_wait = max(0.0, tokens - available_tokens) * 60 / tpm
+        return max(request_wait, token_wait)
+
+    def settle(self, model, reserved, actual):
+        """请求完成后按实际 token 用量退还多扣的额度。"""
+        limit = self.limit_for(model)
+        if limit is None or actual is None or actual >= reserved:
+            return
+        rpm, tpm = limit
+        with self._connect() as conn, self._transaction(conn):
+            now = time.time()
+            requests, tokens = self._refill(conn, model, rpm, tpm, now)
+            self._save(conn, model, requests, min(tpm, tokens + reserved - actual), now)
+
+
+_default_limiter = None
+_default_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter():
+    """
+    按环境变量创建的默认限速器，没有配置任何限额时返回 None。
+
+    LLM_RATE_LIMITS：按模型的限额，例如 "gpt-4=500:30000,gpt-4o=5000:800000"
+    （每分钟请求数:每分钟 token 数）；
+    API_RPM / API_TPM：没有单独配置的模型使用的默认限额；
+    LLM_RATE_LIMIT_PATH：共享状态的 SQLite 文件（默认 rate_limit.sqlite）。
+    """
+    global _default_limiter
+    if _default_limiter is None:
+        limits = parse_limits(os.getenv("LLM_RATE_LIMITS"))
+        default = None
+        if os.getenv("API_RPM") or os.getenv("API_TPM"):
+            default = (
+                float(os.getenv("API_RPM") or "inf"),
+                float(os.getenv("API_TPM") or "inf"),
+            )
+        if not limits and default is None:
+            return None
+        with _default_limiter_lock:
+            if _default_limiter is None:
+                _default_limiter = RateLimiter(
+                    os.getenv("LLM_RATE_LIMIT_PATH", "rate_limit.sqlite"),
+                    limits=limits,
+                    default=default,
+                )
+    return _default_limiter
@@ -0,0 +1,81 @@
+import os
+import pickle
+import re
+import sys
+import threading
+from datetime import datetime
+
+# 运行级别（不属于某个股票）的检查点，例如生成的股票列表
+RUN_SCOPE = "_run"
+
+
+def resolve_run_id(argv=None):
+    """
+    确定本次运行的 ID：命令行第一个参数优先，其次是环境变量 ANALYSIS_RUN_ID，
+    都没有时按当前时间新建一个。用同一个 ID 重新运行会从检查点继续。
+    """
+    argv = sys.argv[1:] if argv is None else argv
+    if argv:
+        return argv[0]
+    return os.getenv("ANALYSIS_RUN_ID") or datetime.now().strftime("%Y%m%d-%H%M%S")
+
+
+def _safe_name(name):
+    return re.sub(r"[^A-Za-z0-9._-]", "_", name)
+
+
+class RunCheckpoint:
+    """
+    一次分析运行的检查点目录，每个股票、每个阶段的结果保存为一个 pickle 文件::
+
+        runs/<run_id>/<ticker>/<stage>.pkl
+
+    用同一个 run_id 重新运行时，已完成的阶段直接读取结果，只执行剩下的阶段。
+    文件先写到临时文件再原子替换，中途崩溃或 Ctrl-C 不会留下损坏的检查点；
+    每个线程使用自己的临时文件，多个线程同时保存不需要加锁。
+
+    Args:
+        run_id (str): 运行 ID。
+        root (str): 所有运行目录的根目录，可用环境变量 ANALYSIS_RUN_DIR 指定。
+    """
+
+    def __init__(self, run_id, root=None):
+        self.run_id = run_id
+        self.root = root or os.getenv("ANALYSIS_RUN_DIR", "runs")
+        self.path = os.path.join(self.root, _safe_name(run_id))
+        os.makedirs(self.path, exist_ok=True)
+
+    def _file(self, ticker, stage):
+        return os.path.join(self.path, _safe_name(ticker), _safe_name(stage) + ".pkl")
+
+    def has(self, ticker, stage):
+        return os.path.exists(self._file(ticker, stage))
+
+    def load(self, ticker, stage):
+        with open(self._file(ticker, stage), "rb") as f:
+            return pickle.load(f)
+
+    def save(self, ticker, stage, value):
+        path = self._file(ticker, stage)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+    def call(self, ticker, stage, func, *args, **kwargs):
+        """
+        返回该阶段已保存的结果；没有检查点时执行 ``func`` 并保存结果。
+
+        结果为 None（例如 LLM 请求失败）时不保存，下次运行会重新执行。
+        """
+        if self.has(ticker, stage):
+            try:
+                return self.load(ticker, stage)
+            except (OSError, pickle.UnpicklingError, EOFError):
+                # 检查点不可读时当作没有检查点
+                pass
+        value = func(*args, **kwargs)
+        if value is not None:
+            self.save(ticker, stage, value)
+        return value
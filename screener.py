@@ -0,0 +1,174 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import yfinance as yf
+
+import metrics
+from indicator_kernels import bollinger_bands, macd, rolling_mean
+
+# 综合评分中各项指标的权重（对横截面 z-score 加权），波动率是惩罚项
+DEFAULT_WEIGHTS = {
+    "momentum_126": 1.0,
+    "momentum_21": 0.5,
+    "trend": 0.5,
+    "macd_state": 0.5,
+    "bb_position": -0.25,
+    "volatility": -0.5,
+}
+
+
+def load_universe(path):
+    """从文件读取股票池：每行一个代码，或 CSV 的第一列；忽略空行和 # 注释。"""
+    tickers = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            ticker = line.split(",")[0].strip().upper()
+            if ticker and not ticker.startswith("#") and ticker != "SYMBOL":
+                tickers.append(ticker)
+    return list(dict.fromkeys(tickers))
+
+
+def download_prices(tickers, period="1y", chunk_size=200):
+    """
+    批量下载日线行情，返回 (close, volume) 两个 DataFrame（行是日期，列是股票）。
+
+    每 ``chunk_size`` 个股票一次 ``yf.download`` 请求；没有数据的股票不出现在结果中。
+    """
+    closes, volumes = [], []
+    for i in range(0, len(tickers), chunk_size):
+        chunk = tickers[i : i + chunk_size]
+        with metrics.span("yfinance_request", dataset="screen_download"):
+            data = yf.download(
+                chunk,
+                period=period,
+                interval="1d",
+                group_by="column",
+                auto_adjust=True,
+                progress=False,
+                threads=True,
+            )
+        if data is None or data.empty:
+            continue
+        close, volume = data["Close"], data["Volume"]
+        if isinstance(close, pd.Series):
+            # 只有一个股票时 yfinance 可能返回单列
+            close, volume = close.to_frame(chunk[0]), volume.to_frame(chunk[0])
+        closes.append(close)
+        volumes.append(volume)
+    if not closes:
+        return pd.DataFrame(), pd.DataFrame()
+    close = pd.concat(closes, axis=1).dropna(axis=1, how="all")
+    volume = pd.concat(volumes, axis=1).reindex(columns=close.columns)
+    return close, volume
+
+
+def _zscore(values):
+    std = values.std()
+    if not std or np.isnan(std):
+        return values * 0.0
+    return (values - values.mean()) / std
+
+
+def compute_screen_metrics(close, volume=None, ma_window=20, bb_window=20):
+    """
+    对所有股票同时计算筛选指标，返回每个股票一行的 DataFrame。
+
+    MA、布林带和 MACD 用 indicator_kernels 对整个收盘价矩阵一次算出。
+
+    列：
+        momentum_21 / momentum_126：最近 21 / 126 个交易日的收益率；
+        volatility：最近 63 个交易日的年化波动率；
+        trend：收盘价相对 MA 的偏离；
+        bb_position：收盘价在布林带中的位置（0 为下轨，1 为上轨）；
+        macd_state：MACD 柱相对价格的大小（正为多头）；
+        macd_cross：最近一根K线 MACD 上穿（1）/ 下穿（-1）信号线；
+        dollar_volume：最近 21 个交易日的平均成交额；
+        history：有收盘价的交易日数，少于 2 天的股票没有可用的指标，
+        ``screen`` 会把它们排除。
+    """
+    if close.empty:
+        return pd.DataFrame(columns=["price", "history"])
+    # 内核的输入是 (股票数 × 时间)，结果转回与 close 相同的 (时间 × 股票)
+    values = close.to_numpy(dtype=np.float64).T
+
+    def frame(result):
+        return pd.DataFrame(result.T, index=close.index, columns=close.columns)
+
+    ma = frame(rolling_mean(values, ma_window))
+    upper, lower = map(frame, bollinger_bands(values, bb_window))
+    macd_line, signal, macd_hist = map(frame, macd(values))
+
+    last = close.ffill().iloc[-1]
+    returns = close.pct_change(fill_method=None)
+    band_width = (upper.iloc[-1] - lower.iloc[-1]).replace(0, np.nan)
+    above = macd_line > signal
+    if len(close) >= 2:
+        crossed = above.iloc[-1].astype(int) - above.iloc[-2].astype(int)
+    else:
+        # 只有一根K线（例如刚上市的股票）：没有上一根可比较
+        crossed = pd.Series(0, index=close.columns)
+
+    table = pd.DataFrame(
+        {
+            "price": last,
+            "momentum_21": last / close.shift(21).iloc[-1] - 1,
+            "momentum_126": last / close.shift(126).iloc[-1] - 1,
+            "volatility": returns.iloc[-63:].std() * np.sqrt(252),
+            "trend": last / ma.iloc[-1] - 1,
+            "bb_position": (last - lower.iloc[-1]) / band_width,
+            "macd_state": macd_hist.iloc[-1] / last,
+            "macd_cross": crossed,
+            "history": close.notna().sum(),
+        }
+    )
+    if volume is not None and not volume.empty:
+        table["dollar_volume"] = (close * volume).iloc[-21:].mean()
+    return table
+
+
+def score_screen(table, weights=DEFAULT_WEIGHTS):
+    """按横截面 z-score 加权求和得到综合评分，缺失的指标按 0（平均水平）处理。"""
+    score = pd.Series(0.0, index=table.index)
+    for column, weight in weights.items():
+        score += weight * _zscore(table[column]).fillna(0.0)
+    return score
+
+
+def screen(
+    tickers,
+    top_k=5,
+    period="1y",
+    min_history=130,
+    min_price=1.0,
+    min_dollar_volume=1e6,
+    weights=DEFAULT_WEIGHTS,
+):
+    """
+    从股票池中筛选出综合评分最高的 ``top_k`` 个股票。
+
+    先过滤掉历史太短、价格太低或成交额太小的股票，再按 ``score_screen`` 排序。
+
+    Returns:
+        pd.DataFrame: 前 ``top_k`` 个股票的指标和评分，按评分从高到低排列。
+    """
+    close, volume = download_prices(list(tickers), period)
+    if close.empty:
+        return pd.DataFrame()
+    table = compute_screen_metrics(close, volume)
+    mask = (table["history"] >= max(2, min_history)) & (table["price"] >= min_price)
+    if "dollar_volume" in table:
+        mask &= table["dollar_volume"] >= min_dollar_volume
+    table = table[mask]
+    table = table.assign(score=score_screen(table, weights))
+    return table.sort_values("score", ascending=False).head(top_k)
+
+
+# 示例用法：python screener.py universe.txt [top_k]
+if __name__ == "__main__":
+    universe = load_universe(sys.argv[1])
+    top_k = int(sys.argv[2]) if len(sys.argv) > 2 else int(os.getenv("SCREEN_TOP_K", "5"))
+    result = screen(universe, top_k)
+    print(f"Top {top_k} of {len(universe)} tickers:")
+    print(result.round(4).to_string())
@@ -2,11 +2,22 @@ import pandas as pd
 import matplotlib.pyplot as plt
 import yfinance as yf
 
+from price_cache import cached_price_history
 
-# 获取股票数据
-def get_stock_data(ticker, start, end):
-    data = yf.download(ticker, start=start, end=end)
-    return data
+
+# 获取股票数据，默认经过本地缓存，只下载缓存中缺失的日期
+def get_stock_data(ticker, start, end, use_cache=True):
+    def fetch(start, end):
+        # actions=True 带上分红/拆股列，缓存据此发现需要重新下载的复权价格
+        data = yf.download(ticker, start=start, end=end, actions=True)
+        # 新版 yfinance 对单个股票也返回 (Price, Ticker) 两级列名
+        if isinstance(data.columns, pd.MultiIndex):
+            data.columns = data.columns.get_level_values(0)
+        return data
+
+    if not use_cache:
+        return fetch(start, end)
+    return cached_price_history("download", ticker, start, end, fetch)
 
 
 # 计算移动平均线
@@ -24,13 +35,14 @@ def calculate_bollinger_bands(data, window):
 
 
 # 绘制图表
-def plot_stock_data(data, ticker, ma_window=20, bb_window=20):
+# show=False 时不弹出窗口，只返回 Figure（例如在服务器上配合 Agg 后端保存图片）
+def plot_stock_data(data, ticker, ma_window=20, bb_window=20, show=True):
     # 计算指标
     data["MA"] = calculate_moving_average(data, ma_window)
     data["Upper Band"], data["Lower Band"] = calculate_bollinger_bands(data, bb_window)
 
     # 绘制价格和指标
-    plt.figure(figsize=(14, 7))
+    fig = plt.figure(figsize=(14, 7))
     plt.plot(data["Close"], label="Close Price", color="black")
     plt.plot(data["MA"], label=f"MA {ma_window}", color="blue")
     plt.plot(data["Upper Band"], label="Upper Bollinger Band", color="red")
@@ -46,7 +58,9 @@ def plot_stock_data(data, ticker, ma_window=20, bb_window=20):
     plt.xlabel("Date")
     plt.ylabel("Price")
     plt.legend(loc="best")
-    plt.show()
+    if show:
+        plt.show()
+    return fig
 
 
 # 主函数
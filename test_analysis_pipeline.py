@@ -0,0 +1,63 @@
+import pandas as pd
+import pytest
+
+import analysis_pipeline
+from analysis_pipeline import AnalysisPipeline
+
+
+@pytest.fixture
+def fake_stages(monkeypatch):
+    """
+    代替各阶段的网络/LLM 调用；返回的字典指定哪些股票的哪个 LLM 阶段
+    返回 None（模拟 ask_AI 请求失败）。
+    """
+    failing = {}
+
+    def llm(stage):
+        def call(ticker, *args):
+            return None if failing.get(ticker) == stage else f"{stage} of {ticker}"
+
+        return call
+
+    monkeypatch.setattr(
+        analysis_pipeline,
+        "get_stock_data",
+        lambda ticker, years: (pd.DataFrame({"Close": [1.0]}), None, None, []),
+    )
+    monkeypatch.setattr(analysis_pipeline, "get_analyst_ratings", lambda ticker: "Buy")
+    monkeypatch.setattr(
+        analysis_pipeline, "get_industry_analysis", llm("get_industry_analysis")
+    )
+    monkeypatch.setattr(
+        analysis_pipeline, "get_sentiment_analysis", llm("get_sentiment_analysis")
+    )
+    monkeypatch.setattr(analysis_pipeline, "get_final_analysis", llm("get_final_analysis"))
+    monkeypatch.setattr(
+        analysis_pipeline, "get_current_prices", lambda tickers: {t: 10.0 for t in tickers}
+    )
+    return failing
+
+
+def test_run_collects_analyses(fake_stages):
+    run = AnalysisPipeline().run(["AAA", "BBB"])
+
+    assert run["analyses"] == {
+        "AAA": "get_final_analysis of AAA",
+        "BBB": "get_final_analysis of BBB",
+    }
+    assert run["prices"] == {"AAA": 10.0, "BBB": 10.0}
+    assert run["failures"] == {}
+
+
+@pytest.mark.parametrize(
+    "stage", ["get_industry_analysis", "get_sentiment_analysis", "get_final_analysis"]
+)
+def test_llm_stage_returning_none_fails_ticker(fake_stages, stage):
+    fake_stages["BBB"] = stage
+
+    run = AnalysisPipeline().run(["AAA", "BBB"])
+
+    assert set(run["analyses"]) == {"AAA"}
+    assert set(run["results"]) == {"AAA"}
+    assert run["failures"]["BBB"].stage == stage
+    assert isinstance(run["failures"]["BBB"].error, ValueError)
@@ -0,0 +1,129 @@
+import json
+import re
+
+import pandas as pd
+import pytest
+
+import batch_analysis
+from batch_analysis import ask_AI_batch, parse_batch_response, run_batched
+
+
+class ScriptedLLM:
+    """
+    代替 ask_AI：按顺序返回预先写好的回复，并记录每次请求的键和参数。
+
+    回复可以是字符串，也可以是 ``keys -> 字符串`` 的函数。
+    """
+
+    def __init__(self, *replies):
+        self.replies = list(replies)
+        self.calls = []
+
+    def __call__(self, system_prompt, messages, max_tokens=2000, use_cache=True, **kwargs):
+        keys = json.loads(re.search(r"item keys: (\[.*?\])", messages).group(1))
+        self.calls.append({"keys": keys, "messages": messages, "use_cache": use_cache})
+        reply = self.replies.pop(0) if self.replies else None
+        return reply(keys) if callable(reply) else reply
+
+
+def answer_all(keys):
+    return json.dumps({key: f"analysis of {key}" for key in keys})
+
+
+def test_parse_batch_response_tolerates_fences_and_drops_bad_values():
+    text = 'Sure:\n```json\n{"A": "good", "B": "", "C": 3, "Z": "extra"}\n```'
+    assert parse_batch_response(text, ["A", "B", "C"]) == {"A": "good"}
+    assert parse_batch_response('{"A": "cut off', ["A"]) == {}
+    assert parse_batch_response('["A", "B"]', ["A", "B"]) == {}
+    assert parse_batch_response(None, ["A"]) == {}
+
+
+def test_ask_AI_batch_retries_only_missing_keys_without_cache(monkeypatch):
+    llm = ScriptedLLM(json.dumps({"A": "a1", "C": 7}), answer_all)
+    monkeypatch.setattr(batch_analysis, "ask_AI", llm)
+
+    results = ask_AI_batch("system", {"A": "pa", "B": "pb", "C": "pc"}, batch_size=3)
+
+    assert results == {"A": "a1", "B": "analysis of B", "C": "analysis of C"}
+    assert [call["keys"] for call in llm.calls] == [["A", "B", "C"], ["B", "C"]]
+    assert [call["use_cache"] for call in llm.calls] == [True, False]
+
+
+def test_ask_AI_batch_gives_up_on_malformed_replies(monkeypatch):
+    llm = ScriptedLLM("not json", '{"A": ', None)
+    monkeypatch.setattr(batch_analysis, "ask_AI", llm)
+
+    results = ask_AI_batch("system", {"A": "pa", "B": "pb"}, batch_size=2, max_attempts=3)
+
+    assert results == {"A": None, "B": None}
+    assert len(llm.calls) == 3
+
+
+def test_ask_AI_batch_splits_items_into_batches(monkeypatch):
+    llm = ScriptedLLM(answer_all, answer_all, answer_all)
+    monkeypatch.setattr(batch_analysis, "ask_AI", llm)
+
+    results = ask_AI_batch("system", {key: key for key in "ABCDE"}, batch_size=2)
+
+    assert set(results) == set("ABCDE")
+    assert sorted(len(call["keys"]) for call in llm.calls) == [1, 2, 2]
+
+
+class FakeTickerData:
+    def __init__(self, info):
+        self.info = info
+
+
+@pytest.fixture
+def fake_market(monkeypatch):
+    infos = {
+        "AAA": {"industry": "Chips", "sector": "Tech"},
+        "BBB": {"industry": "Chips", "sector": "Tech"},
+        "CCC": {},  # 没有行业信息
+    }
+    news = [{"link": "u1", "title": "t", "providerPublishTime": 1700000000}]
+    monkeypatch.setattr(
+        batch_analysis,
+        "get_stock_data",
+        lambda ticker, years: (pd.DataFrame({"Close": [1.0]}), None, None, news),
+    )
+    monkeypatch.setattr(batch_analysis, "get_analyst_ratings", lambda ticker: "Buy")
+    monkeypatch.setattr(batch_analysis, "get_article_texts", lambda articles: {"u1": "text"})
+    monkeypatch.setattr(
+        batch_analysis, "get_ticker_data", lambda ticker: FakeTickerData(infos[ticker])
+    )
+    monkeypatch.setattr(
+        batch_analysis, "get_current_prices", lambda tickers: {t: 10.0 for t in tickers}
+    )
+
+
+def test_run_batched_fails_ticker_without_industry(monkeypatch, fake_market):
+    llm = ScriptedLLM(answer_all, answer_all, answer_all)
+    monkeypatch.setattr(batch_analysis, "ask_AI", llm)
+
+    run = run_batched(["AAA", "BBB", "CCC"], batch_size=5)
+
+    assert set(run["analyses"]) == {"AAA", "BBB"}
+    assert run["failures"]["CCC"].stage == "get_industry_analysis"
+    assert isinstance(run["failures"]["CCC"].error, KeyError)
+    # 行业分析只请求一次 (Chips, Tech)，最终分析不包含失败的股票
+    assert llm.calls[1]["keys"] == ["Chips / Tech"]
+    assert llm.calls[2]["keys"] == ["AAA", "BBB"]
+    assert all("seconds" not in result for result in run["results"].values())
+
+
+def test_run_batched_fails_ticker_missing_from_final_reply(monkeypatch, fake_market):
+    def final_without_bbb(keys):
+        return json.dumps({key: f"analysis of {key}" for key in keys if key != "BBB"})
+
+    llm = ScriptedLLM(
+        answer_all, answer_all, final_without_bbb, final_without_bbb, final_without_bbb
+    )
+    monkeypatch.setattr(batch_analysis, "ask_AI", llm)
+
+    run = run_batched(["AAA", "BBB"], batch_size=5)
+
+    assert run["analyses"] == {"AAA": "analysis of AAA"}
+    assert run["prices"] == {"AAA": 10.0}
+    assert run["failures"]["BBB"].stage == "get_final_analysis"
+    assert [call["keys"] for call in llm.calls[3:]] == [["BBB"], ["BBB"]]
@@ -0,0 +1,114 @@
+import asyncio
+
+import pytest
+
+from crypto_poller import CryptoPoller, TokenBucket
+
+MINUTE_MS = 60_000
+
+
+class FakeExchange:
+    """
+    确定性的本地假交易所：每个交易对的K线按分钟生成，收盘价为 100 + 序号。
+
+    记录每次请求的 (交易对, 事件循环时间)；``failures`` 指定每个交易对前几次
+    请求抛出异常，用于测试退避。
+    """
+
+    rateLimit = 50  # 毫秒，即每秒 20 次
+
+    def __init__(self, candles=50, failures=None):
+        self.candles = candles
+        self.failures = dict(failures or {})
+        self.calls = []
+
+    def _rows(self):
+        return [
+            [i * MINUTE_MS, 100.0 + i, 101.0 + i, 99.0 + i, 100.0 + i, 10.0]
+            for i in range(self.candles)
+        ]
+
+    async def fetch_ohlcv(self, symbol, timeframe="1m", since=None, limit=None):
+        self.calls.append((symbol, asyncio.get_running_loop().time()))
+        if self.failures.get(symbol, 0) > 0:
+            self.failures[symbol] -= 1
+            raise ConnectionError(f"{symbol} unavailable")
+        rows = self._rows()
+        if since is not None:
+            return [row for row in rows if row[0] >= since]
+        return rows[-(limit or 500) :]
+
+
+def test_token_bucket_paces_requests():
+    async def run():
+        bucket = TokenBucket(rate=20, capacity=1)
+        loop = asyncio.get_running_loop()
+        times = []
+
+        async def request():
+            await bucket.acquire()
+            times.append(loop.time())
+
+        await asyncio.gather(*(request() for _ in range(6)))
+        return times
+
+    times = asyncio.run(run())
+    gaps = [later - earlier for earlier, later in zip(times, times[1:])]
+    # 容量为 1：第一个请求立即通过，之后每 1/20 秒一个
+    assert all(gap >= 0.05 * 0.9 for gap in gaps)
+    assert times[-1] - times[0] == pytest.approx(0.25, abs=0.05)
+
+
+def test_poller_shares_bucket_across_symbols():
+    async def run():
+        exchange = FakeExchange()
+        symbols = [f"S{i}/USDT" for i in range(5)]
+        poller = CryptoPoller(
+            exchange, symbols, limit=50, bucket=TokenBucket.for_exchange(exchange)
+        )
+        results = await poller.poll_once()
+        return exchange, poller, results
+
+    exchange, poller, results = asyncio.run(run())
+    times = sorted(time for _, time in exchange.calls)
+    assert len(times) == 5
+    assert times[-1] - times[0] >= 4 * 0.05 * 0.9
+    assert all(info["current_price"] == 149.0 for info in results.values())
+    assert all(len(p.candles) == 50 for p in poller.pipelines.values())
+
+
+def test_poller_backs_off_failing_symbol():
+    async def run():
+        exchange = FakeExchange(failures={"BAD/USDT": 2})
+        poller = CryptoPoller(
+            exchange,
+            ["OK/USDT", "BAD/USDT"],
+            limit=50,
+            bucket=TokenBucket(rate=1000, capacity=10),
+            backoff=0.1,
+        )
+
+        def bad_calls():
+            return sum(symbol == "BAD/USDT" for symbol, _ in exchange.calls)
+
+        counts = []
+        await poller.poll_once()  # 第 1 次失败，暂停 0.1s
+        counts.append(bad_calls())
+        await poller.poll_once()  # 暂停期内不请求
+        counts.append(bad_calls())
+        await asyncio.sleep(0.12)
+        await poller.poll_once()  # 第 2 次失败，暂停翻倍为 0.2s
+        counts.append(bad_calls())
+        await asyncio.sleep(0.12)
+        await poller.poll_once()  # 仍在暂停期内
+        counts.append(bad_calls())
+        await asyncio.sleep(0.1)
+        results = await poller.poll_once()  # 成功，重置退避
+        counts.append(bad_calls())
+        return poller, counts, results
+
+    poller, counts, results = asyncio.run(run())
+    assert counts == [1, 1, 2, 2, 3]
+    assert results["BAD/USDT"] is not None
+    assert poller._failures == {}
+    assert len(poller.pipelines["OK/USDT"].candles) == 50
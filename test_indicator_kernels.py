@@ -0,0 +1,67 @@
+import numpy as np
+import pandas as pd
+import pytest
+from numpy.lib.stride_tricks import sliding_window_view
+
+from indicator_kernels import compute_indicators, rolling_mean, rolling_std
+from indicator_utils import add_indicators
+
+
+def random_prices(symbols, length, seed=0, scale=0.02, start=1000.0):
+    rng = np.random.default_rng(seed)
+    return start * np.exp(np.cumsum(rng.normal(0, scale, (symbols, length)), axis=1))
+
+
+def assert_matches_pandas(kernels, row, i=None, rtol=1e-9, atol=1e-9):
+    expected = add_indicators(pd.DataFrame({"close": row}))
+    for name, result in kernels.items():
+        result = result if i is None else result[i]
+        np.testing.assert_allclose(
+            result, expected[name].to_numpy(), rtol=rtol, atol=atol, err_msg=name
+        )
+
+
+def test_matches_pandas_with_missing_values():
+    symbols, length = 200, 500
+    prices = random_prices(symbols, length)
+    # 一部分股票上市较晚，另一部分中间停牌
+    prices[: symbols // 4, : length // 3] = np.nan
+    prices[symbols // 4 : symbols // 2, length // 2 : length // 2 + 5] = np.nan
+
+    kernels = compute_indicators(prices)
+    for i in range(symbols):
+        assert_matches_pandas(kernels, prices[i], i)
+
+
+def test_one_dimensional_input_keeps_shape():
+    row = random_prices(1, 100)[0]
+    kernels = compute_indicators(row)
+    assert all(result.shape == row.shape for result in kernels.values())
+    assert_matches_pandas(kernels, row)
+
+
+def test_all_missing_row_and_short_rows():
+    prices = random_prices(2, 10)
+    prices[1] = np.nan
+    assert np.isnan(rolling_mean(prices, 20)).all()
+    assert np.isnan(rolling_std(prices, 20)).all()
+    assert np.isnan(rolling_std(prices[:, :5], 3)[1]).all()
+
+
+@pytest.mark.parametrize("length", [525_600, 1_000_000])
+def test_long_row_bollinger_bands_stay_accurate(length):
+    # 一年（或更长）的 1 分钟K线，价格水平较高且跨越多个累积和分块
+    row = random_prices(1, length, seed=3, scale=0.001, start=30000.0)[0]
+    row[length // 2 : length // 2 + 30] = np.nan
+
+    mean = rolling_mean(row, 20)
+    std = rolling_std(row, 20)
+    expected = pd.Series(row).rolling(20)
+    np.testing.assert_allclose(mean, expected.mean().to_numpy(), rtol=1e-12)
+    # pandas 的增量算法本身在长序列上有约 1e-7 的相对误差
+    np.testing.assert_allclose(std, expected.std().to_numpy(), rtol=1e-6)
+
+    # 与逐窗口两遍计算的精确值对比
+    exact = np.full(length, np.nan)
+    exact[19:] = sliding_window_view(row, 20).std(axis=1, ddof=1)
+    np.testing.assert_allclose(std, exact, rtol=1e-8)
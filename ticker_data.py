@@ -0,0 +1,138 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import yfinance as yf
+
+import metrics
+
+# prefetch 默认预取的数据集（每个对应一次 Yahoo 请求）
+DEFAULT_PREFETCH = ("info", "balance_sheet", "financials", "news", "recommendations")
+
+
+class TickerData:
+    """
+    单个股票在一次运行中的数据门面。
+
+    info、balance_sheet、financials、news、recommendations 第一次访问时才请求，
+    之后直接返回同一份结果；多个线程同时访问同一个数据集时只会请求一次。
+    ``history`` 按参数缓存。所有分析阶段共用同一个对象，每个数据集对每个股票
+    最多请求一次。
+
+    Args:
+        symbol (str): 股票代码。
+    """
+
+    def __init__(self, symbol):
+        self.symbol = symbol
+        self.ticker = yf.Ticker(symbol)
+        self._lock = threading.Lock()
+        self._field_locks = {}
+        self._values = {}
+
+    def _load(self, name, loader):
+        if name in self._values:
+            return self._values[name]
+        with self._lock:
+            field_lock = self._field_locks.setdefault(name, threading.Lock())
+        with field_lock:
+            # 等待期间其他线程可能已经加载完成
+            if name not in self._values:
+                dataset = name if isinstance(name, str) else name[0]
+                with metrics.span("yfinance_request", dataset=dataset):
+                    self._values[name] = loader()
+        return self._values[name]
+
+    @property
+    def info(self):
+        return self._load("info", lambda: self.ticker.info)
+
+    @property
+    def balance_sheet(self):
+        return self._load("balance_sheet", lambda: self.ticker.balance_sheet)
+
+    @property
+    def financials(self):
+        return self._load("financials", lambda: self.ticker.financials)
+
+    @property
+    def news(self):
+        return self._load("news", lambda: self.ticker.news)
+
+    @property
+    def recommendations(self):
+        return self._load("recommendations", lambda: self.ticker.recommendations)
+
+    def history(self, **kwargs):
+        """``yf.Ticker.history`` 的缓存版本，相同参数只请求一次。"""
+        key = ("history",) + tuple(sorted((k, str(v)) for k, v in kwargs.items()))
+        return self._load(key, lambda: self.ticker.history(**kwargs))
+
+    def prefetch(self, fields=DEFAULT_PREFETCH):
+        """立即加载指定的数据集。"""
+        for field in fields:
+            getattr(self, field)
+        return self
+
+
+class TickerDataRegistry:
+    """
+    一次运行中所有股票的 TickerData，每个代码只创建一个对象。
+
+    Args:
+        max_workers (int): ``prefetch`` 同时进行的请求数。
+    """
+
+    def __init__(self, max_workers=8):
+        self.max_workers = max_workers
+        self._lock = threading.Lock()
+        self._tickers = {}
+
+    def get(self, symbol):
+        with self._lock:
+            data = self._tickers.get(symbol)
+            if data is None:
+                data = TickerData(symbol)
+                self._tickers[symbol] = data
+            return data
+
+    def prefetch(self, symbols, fields=DEFAULT_PREFETCH):
+        """
+        并发预取一组股票的数据集。
+
+        单个数据集请求失败时不抛出异常：分析阶段访问它时会重新请求，
+        由那个阶段处理错误。
+        """
+        jobs = [(self.get(symbol), field) for symbol in symbols for field in fields]
+
+        def load(job):
+            data, field = job
+            try:
+                getattr(data, field)
+            except Exception as e:
+                print(f"{data.symbol}: prefetch of {field} failed: {e!r}")
+
+        with ThreadPoolExecutor(self.max_workers, thread_name_prefix="prefetch") as pool:
+            list(pool.map(load, jobs))
+        return [self.get(symbol) for symbol in symbols]
+
+    def clear(self):
+        with self._lock:
+            self._tickers.clear()
+
+
+_registry = TickerDataRegistry()
+
+
+def get_ticker_data(symbol):
+    """返回当前运行中该股票共享的 TickerData。"""
+    return _registry.get(symbol)
+
+
+def prefetch_ticker_data(symbols, fields=DEFAULT_PREFETCH):
+    """并发预取一组股票的数据，返回对应的 TickerData 列表。"""
+    return _registry.prefetch(symbols, fields)
+
+
+def reset_ticker_data():
+    """丢弃已加载的数据，下一次运行会重新请求。"""
+    _registry.clear()